@@ -0,0 +1,334 @@
+"""
+Admission control for /submit: high-risk texts go first, low-priority traffic is
+rate limited per user and shed under load, and the high-priority lane has
+generous bounds of its own
+"""
+import heapq
+import io
+import itertools
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from analysis import active_rules
+from languages import fold_accents
+from matcher import KeywordMatcher
+from metrics import ADMISSION_REJECTIONS, ADMISSION_REQUEST_SECONDS, ADMISSION_WAIT_SECONDS, HTTP_REQUESTS
+
+HIGH_PRIORITY = 'high'
+NORMAL_PRIORITY = 'normal'
+
+
+class Overloaded(Exception):
+    """
+    A request turned away, to be answered with 429 and Retry-After
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"{reason}, retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class HighRiskPrefilter:
+    """
+    Flags texts containing a high-risk keyword or a #HighRisk tag keyword of the
+    active rules in any of their languages, or one of ``keywords`` when given.
+    It is one regex search over the lowercased text with accents folded away, and
+    uses the same substring semantics as the scorer, so every text the scorer
+    would rate high risk because of a keyword is flagged.
+    """
+
+    def __init__(self, keywords=None):
+        self._matcher = KeywordMatcher({'high_risk': sorted(keywords)}) if keywords is not None else None
+
+    def priority(self, text):
+        matcher = self._matcher or active_rules().high_risk_matcher
+        return HIGH_PRIORITY if matcher.contains_any(fold_accents(text.lower())) else NORMAL_PRIORITY
+
+
+class TokenBuckets:
+    """
+    A token bucket per user holding up to ``burst`` requests and refilled at
+    ``rate`` per second. The least recently seen users are forgotten beyond
+    ``max_users``, which only gives them a full bucket again. A rate of 0 turns
+    limiting off.
+    """
+
+    def __init__(self, rate, burst, max_users=10000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_users = max_users
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """
+        Take a token for ``key``. Returns 0 if there was one, otherwise the seconds until there is.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                while len(self._buckets) > self.max_users:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class PriorityGate:
+    """
+    Bounds how many submissions are processed at once. Any request may take one
+    of ``capacity`` slots, and ``reserved`` more slots are kept for high-priority
+    requests, so they start at once even while normal traffic fills the rest.
+    Waiting high-priority requests are always let in before waiting normal ones.
+
+    No request is queued without bound: a normal one arriving while
+    ``max_queue`` others wait, or waiting longer than ``queue_timeout`` seconds,
+    raises ``Overloaded``. High-priority ones get the more generous
+    ``max_high_queue`` and ``high_queue_timeout``, since the priority comes from
+    the unauthenticated body and a flood of texts with high-risk keywords must
+    not pile up either. A capacity of 0 turns the gate off.
+    """
+
+    def __init__(self, capacity, reserved=2, max_queue=32, queue_timeout=2.0, max_high_queue=64,
+                 high_queue_timeout=10.0):
+        self.capacity = capacity
+        self.reserved = reserved
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_high_queue = max_high_queue
+        self.high_queue_timeout = high_queue_timeout
+        self.active = 0
+        self.waiting = {HIGH_PRIORITY: 0, NORMAL_PRIORITY: 0}
+        self.admitted = {HIGH_PRIORITY: 0, NORMAL_PRIORITY: 0}
+        self.rejected = {'queue_full': 0, 'timeout': 0}
+        self.rejected_high = 0
+        # Moving average of the time a slot is held, for Retry-After estimates
+        self.service_seconds = 0.05
+        self._sequence = itertools.count()
+        self._queue = []
+        self._lock = threading.Lock()
+
+    def _limit(self, priority):
+        return self.capacity + (self.reserved if priority == HIGH_PRIORITY else 0)
+
+    def retry_after(self):
+        """
+        Whole seconds until the normal requests waiting now should have been served
+        """
+        return max(1, math.ceil(self.service_seconds * (self.waiting[NORMAL_PRIORITY] + 1) / max(1, self.capacity)))
+
+    def acquire(self, priority):
+        """
+        Take a slot, waiting for one if needed. Returns the seconds waited.
+        """
+        if self.capacity <= 0:
+            with self._lock:
+                self.admitted[priority] += 1
+            return 0.0
+        started = time.perf_counter()
+        with self._lock:
+            # Only start straight away if nobody who would go first is waiting
+            ahead = self.waiting[HIGH_PRIORITY] + (self.waiting[NORMAL_PRIORITY] if priority != HIGH_PRIORITY else 0)
+            if not ahead and self.active < self._limit(priority):
+                self.active += 1
+                self.admitted[priority] += 1
+                return 0.0
+            high = priority == HIGH_PRIORITY
+            if self.waiting[priority] >= (self.max_high_queue if high else self.max_queue):
+                self.rejected['queue_full'] += 1
+                self.rejected_high += high
+                raise Overloaded('queue_full', self.retry_after())
+            # [granted, cancelled, event]
+            waiter = [False, False, threading.Event()]
+            heapq.heappush(self._queue, (0 if priority == HIGH_PRIORITY else 1, next(self._sequence), priority, waiter))
+            self.waiting[priority] += 1
+
+        waiter[2].wait(self.high_queue_timeout if high else self.queue_timeout)
+        with self._lock:
+            if not waiter[0]:
+                # Left in the queue and skipped when its turn comes
+                waiter[1] = True
+                self.waiting[priority] -= 1
+                self.rejected['timeout'] += 1
+                self.rejected_high += high
+                raise Overloaded('timeout', self.retry_after())
+        return time.perf_counter() - started
+
+    def release(self, held_seconds=None):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self.active -= 1
+            if held_seconds is not None:
+                self.service_seconds += 0.1 * (held_seconds - self.service_seconds)
+            while self._queue:
+                _, _, priority, waiter = self._queue[0]
+                if waiter[1]:
+                    heapq.heappop(self._queue)
+                    continue
+                if self.active >= self._limit(priority):
+                    break
+                heapq.heappop(self._queue)
+                self.waiting[priority] -= 1
+                self.active += 1
+                self.admitted[priority] += 1
+                waiter[0] = True
+                waiter[2].set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'reserved': self.reserved,
+                'active': self.active,
+                'waitingHigh': self.waiting[HIGH_PRIORITY],
+                'waitingNormal': self.waiting[NORMAL_PRIORITY],
+                'admittedHigh': self.admitted[HIGH_PRIORITY],
+                'admittedNormal': self.admitted[NORMAL_PRIORITY],
+                'rejectedQueueFull': self.rejected['queue_full'],
+                'rejectedTimeout': self.rejected['timeout'],
+                'rejectedHigh': self.rejected_high,
+                'serviceSeconds': round(self.service_seconds, 4)
+            }
+
+
+class AdmissionController:
+    """
+    Classifies submissions with the high-risk prefilter, rate limits the normal
+    ones per user and lets them through the priority gate. High-priority
+    submissions are not rate limited per user, but each client address may only
+    send as many as ``high_buckets`` allows; the rest are handled as normal ones.
+    """
+
+    def __init__(self, gate, buckets, prefilter=None, high_buckets=None):
+        self.gate = gate
+        self.buckets = buckets
+        self.high_buckets = high_buckets if high_buckets is not None else TokenBuckets(rate=0, burst=1)
+        self.prefilter = prefilter or HighRiskPrefilter()
+        self.rate_limited = 0
+        self.demoted = 0
+
+    def priority(self, text, client=None):
+        """
+        The priority of a submission of ``text``, charged to ``client``'s
+        high-priority allowance when it has a high-risk keyword
+        """
+        priority = self.prefilter.priority(text)
+        if priority == HIGH_PRIORITY and client is not None and self.high_buckets.take(client):
+            self.demoted += 1
+            return NORMAL_PRIORITY
+        return priority
+
+    def check_rate(self, user_id):
+        """
+        Charge a normal submission to the user's bucket, raising ``Overloaded`` when it is empty
+        """
+        wait = self.buckets.take(user_id)
+        if wait:
+            self.rate_limited += 1
+            ADMISSION_REJECTIONS.inc(reason='rate_limited')
+            raise Overloaded('rate_limited', max(1, math.ceil(wait)))
+
+    @contextmanager
+    def admit(self, priority):
+        """
+        Hold a processing slot for the duration of the block
+        """
+        try:
+            waited = self.gate.acquire(priority)
+        except Overloaded as e:
+            ADMISSION_REJECTIONS.inc(reason=e.reason)
+            raise
+        ADMISSION_WAIT_SECONDS.observe(waited, priority=priority)
+        started = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            self.gate.release(time.perf_counter() - started)
+
+    def stats(self):
+        return dict(self.gate.stats(), rateLimited=self.rate_limited, trackedUsers=len(self.buckets),
+                    highDemoted=self.demoted, trackedClients=len(self.high_buckets))
+
+
+class AdmissionMiddleware:
+    """
+    WSGI middleware admitting ``POST path`` requests before Flask handles them.
+    Waiting for a slot here, ahead of routing, request hooks and token checks,
+    means queued normal submissions use no CPU while a high-risk one is served.
+
+    The request body is read once and handed on unchanged, with its priority
+    under ``admission.priority`` in the environ. A request turned away is
+    answered with 429 here, without calling the app, so it costs no token
+    check; it gets the CORS header and request count the app would have added.
+    """
+
+    def __init__(self, wsgi_app, controller, path='/submit', max_body=1024 * 1024):
+        self.wsgi_app = wsgi_app
+        self.controller = controller
+        self.path = path
+        self.max_body = max_body
+
+    def submitted_text(self, environ):
+        """
+        The 'text' field of a JSON body, or '' when there is none to read
+        """
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return ''
+        if not 0 < length <= self.max_body:
+            return ''
+        body = environ['wsgi.input'].read(length)
+        environ['wsgi.input'] = io.BytesIO(body)
+        try:
+            text = json.loads(body).get('text')
+        except (ValueError, AttributeError):
+            return ''
+        return text if isinstance(text, str) else ''
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') != self.path or environ.get('REQUEST_METHOD') != 'POST':
+            return self.wsgi_app(environ, start_response)
+        started = time.perf_counter()
+        priority = environ['admission.priority'] = self.controller.priority(self.submitted_text(environ),
+                                                                             environ.get('REMOTE_ADDR', ''))
+        try:
+            with self.controller.admit(priority):
+                # Flask buffers the small JSON responses of this endpoint, so the
+                # slot covers all the work
+                response = self.wsgi_app(environ, start_response)
+            ADMISSION_REQUEST_SECONDS.observe(time.perf_counter() - started, priority=priority)
+            return response
+        except Overloaded as e:
+            return self.reject(e, environ, start_response)
+
+    def reject(self, error, environ, start_response):
+        body = json.dumps({'error': 'Server busy, please retry', 'retryAfter': error.retry_after}).encode('utf-8')
+        headers = [('Content-Type', 'application/json'), ('Content-Length', str(len(body))),
+                   ('Retry-After', str(error.retry_after))]
+        # As flask-cors answers with CORS(app): any origin, echoed back when given
+        origin = environ.get('HTTP_ORIGIN')
+        headers += [('Access-Control-Allow-Origin', origin), ('Vary', 'Origin')] if origin else \
+            [('Access-Control-Allow-Origin', '*')]
+        start_response('429 Too Many Requests', headers)
+        HTTP_REQUESTS.inc(endpoint=self.path, method='POST', status='429')
+        return [body]
@@ -0,0 +1,354 @@
+"""
+Text analysis pipeline shared by tagging, emotion scoring and risk scoring
+"""
+import os
+
+from artifacts import load_scoring_tables
+from languages import ENGLISH, MultilingualAnalyzer, fold_accents
+from matcher import KeywordMatcher, plain_keyword
+from metrics import STAGE_SECONDS
+from rules import RuleBook, RuleSet, keyword_groups, merged_groups, read_rules, rules_path
+
+# Bump when the scoring logic changes. Changes to the rules file are picked up
+# by its digest, so cached scores are never reused across either.
+SCORING_REVISION = 3
+
+# The keyword tables and risk thresholds, from the versioned rules file
+_startup_document = read_rules(rules_path())
+
+# VADER sentiment analyzer and keyword matcher, from the prebuilt artifact when it is current
+analyzer, _startup_matcher = load_scoring_tables(keyword_groups(_startup_document))
+
+# The rules in effect, replaced by a newly compiled snapshot when the rules file changes
+rule_book = RuleBook(rules_path(), RuleSet(_startup_document, _startup_matcher),
+                     reload_interval=float(os.environ.get('RULES_RELOAD_INTERVAL', 5)))
+
+# Keyword tables of the rules loaded at start-up, without stem markers, for code that does not follow reloads
+MENTAL_HEALTH_TAGS = {tag: [plain_keyword(keyword) for keyword in keywords]
+                      for tag, keywords in _startup_document['tags'].items()}
+HIGH_RISK_KEYWORDS = [plain_keyword(keyword) for keyword in _startup_document['keywords']['high_risk']]
+MODERATE_RISK_KEYWORDS = [plain_keyword(keyword) for keyword in _startup_document['keywords']['moderate_risk']]
+
+
+def active_rules():
+    """
+    The rules in effect now. Scoring one text takes them once and uses that snapshot throughout.
+    """
+    return rule_book.current()
+
+
+def scoring_version(rules=None):
+    """
+    Identifies the scores produced by this scoring logic with ``rules`` (by default the active ones)
+    """
+    rules = rules or active_rules()
+    return f"{SCORING_REVISION}-{rules.digest[:12]}"
+
+
+def language_tables(rules, languages):
+    """
+    The keyword matcher, VADER analyzer and keyword context for texts in English
+    and ``languages`` (a sorted tuple of codes), built on first use and kept with
+    ``rules``. The matcher holds every language's keywords under the shared group
+    names, so a mixed-language text is still matched in one pass.
+    """
+    if not languages:
+        return rules.matcher, analyzer, rules.context
+
+    def build():
+        tables = [rules.languages[code] for code in languages]
+        lexicon = {}
+        for language in tables:
+            lexicon.update(language.sentiment)
+        negations = [word for language in tables for word in language.negations]
+        context = rules.context
+        if context is not None:
+            context = context.merged(negations, **{
+                key: [word for language in tables for word in language.context_words[name]]
+                for key, name in (('pseudo_negations', 'pseudoNegations'), ('scope_breaks', 'scopeBreaks'),
+                                  ('intensifiers', 'intensifiers'), ('diminishers', 'diminishers'))
+            })
+        return KeywordMatcher(merged_groups(rules, languages)), MultilingualAnalyzer(
+            analyzer, lexicon, negations, [elision for language in tables for elision in language.elisions]), context
+
+    return rules.compiled(languages, build)
+
+
+def match_keywords(text_lower, matcher, context):
+    """
+    The keywords found in a lowercase text and how much each group counts. With
+    a ``context`` keywords are matched as whole words (or stems) and weighed by the
+    words around them, otherwise matched as substrings and counted once each.
+    """
+    if context is None:
+        keywords = matcher.find_keywords(text_lower)
+        counts = {}
+        for keyword in keywords:
+            for group in matcher.keyword_groups[keyword]:
+                counts[group] = counts.get(group, 0) + 1
+        return keywords, counts
+    hits = matcher.find_hits(text_lower)
+    return {hit[0] for hit in hits}, context.counts(text_lower, hits)
+
+
+class TextFeatures:
+    """
+    Everything the scoring functions need from one submission, computed from a
+    single lowercase pass over the text with one snapshot of the rules. Texts
+    detected as (partly) French or Kinyarwanda are matched with accents folded
+    away against the tables of those languages too. Group counts are weighed
+    by negations and intensifiers near each keyword when the rules have a
+    context section. VADER scores are computed on first use.
+    """
+
+    def __init__(self, text, rules=None):
+        self.rules = rules = rules or active_rules()
+        self.text = text
+        self.text_lower = text.lower()
+        self.languages = rules.detector.detect(self.text_lower)
+        if self.languages:
+            self.text_lower = fold_accents(self.text_lower)
+        matcher, self._analyzer, context = language_tables(rules, self.languages)
+        self.keywords, self.counts = match_keywords(self.text_lower, matcher, context)
+        self._sentiment = None
+
+    @classmethod
+    def precomputed(cls, text, keywords, counts, sentiment, rules):
+        """
+        Features whose keywords, group counts and VADER scores were computed
+        elsewhere with ``rules``, e.g. for a whole batch of English texts at once
+        """
+        features = cls.__new__(cls)
+        features.rules = rules
+        features.text = text
+        features.text_lower = text.lower()
+        features.languages = ()
+        features._analyzer = analyzer
+        features.keywords = keywords
+        features.counts = counts
+        features._sentiment = sentiment
+        return features
+
+    @property
+    def sentiment(self):
+        if self._sentiment is None:
+            self._sentiment = self._analyzer.polarity_scores(self.text)
+        return self._sentiment
+
+    def count(self, group):
+        """
+        Number of distinct keywords of ``group`` found in the text, weighed by their context
+        """
+        return self.counts.get(group, 0)
+
+    def has(self, group):
+        return group in self.counts
+
+    @property
+    def tag_hits(self):
+        return [tag for tag in self.rules.tags if tag in self.counts]
+
+
+@STAGE_SECONDS.timed(stage='analyze_text')
+def analyze_text(text, rules=None):
+    """
+    Run the shared analysis stage once for a submission
+    """
+    return TextFeatures(text, rules)
+
+
+@STAGE_SECONDS.timed(stage='extract_mental_health_tags')
+def extract_mental_health_tags(text, features=None):
+    """
+    Extract context-aware mental health tags from text using enhanced keyword matching
+    and contextual analysis
+    """
+    if features is None:
+        features = analyze_text(text)
+    
+    # Basic keyword matching
+    detected_tags = features.tag_hits
+    
+    # Enhanced stress detection based on combinations
+    if features.has('stress'):
+        # Determine type of stress based on context
+        if features.has('school'):
+            if '#AcademicStress' not in detected_tags:
+                detected_tags.append('#AcademicStress')
+        elif features.has('work'):
+            detected_tags.append('#WorkStress')
+    
+    # Enhanced anxiety detection
+    if features.has('anxiety_symptoms'):
+        if '#Anxiety' not in detected_tags:
+            detected_tags.append('#Anxiety')
+    
+    # Relationship context enhancement
+    if features.has('conflict') and features.has('partner'):
+        if '#RelationshipStress' not in detected_tags:
+            detected_tags.append('#RelationshipStress')
+    
+    # Academic performance specific detection
+    if features.has('performance') and features.has('academic'):
+        if '#AcademicStress' not in detected_tags:
+            detected_tags.append('#AcademicStress')
+    
+    # Remove duplicates while preserving order
+    return list(dict.fromkeys(detected_tags))
+
+@STAGE_SECONDS.timed(stage='analyze_sentiment_and_emotions')
+def analyze_sentiment_and_emotions(text, features=None):
+    """
+    Enhanced sentiment and emotion analysis using VADER and contextual cues
+    """
+    if features is None:
+        features = analyze_text(text)
+    
+    # Get VADER scores
+    scores = features.sentiment
+    
+    # Extract basic emotions from compound score and text analysis
+    compound_score = scores['compound']
+    
+    # Initialize emotion scores
+    emotions = {
+        'joy': 0.0,
+        'sadness': 0.0,
+        'anger': 0.0,
+        'fear': 0.0,
+        'anxiety': 0.0
+    }
+    
+    # Joy indicators with intensity
+    joy_intensity = features.count('joy')
+    if joy_intensity > 0 or compound_score > 0.5:
+        emotions['joy'] = min(1.0, max(0.0, compound_score + (joy_intensity * 0.1)))
+    
+    # Sadness indicators with context
+    sadness_intensity = features.count('sadness')
+    if sadness_intensity > 0 or compound_score < -0.3:
+        emotions['sadness'] = min(1.0, abs(scores['neg']) + (sadness_intensity * 0.1))
+    
+    # Anger indicators
+    anger_intensity = features.count('anger')
+    if anger_intensity > 0:
+        emotions['anger'] = min(1.0, scores['neg'] + (anger_intensity * 0.1))
+    
+    # Fear indicators
+    fear_intensity = features.count('fear')
+    if fear_intensity > 0:
+        emotions['fear'] = min(1.0, abs(compound_score) if compound_score < 0 else 0.3 + (fear_intensity * 0.1))
+    
+    # Anxiety indicators with physical symptoms
+    anxiety_intensity = features.count('anxiety')
+    symptom_intensity = features.count('anxiety_physical')
+    
+    if anxiety_intensity > 0 or symptom_intensity > 0:
+        emotions['anxiety'] = min(1.0, abs(scores['neg']) + 0.2 + (anxiety_intensity * 0.1) + (symptom_intensity * 0.15))
+    
+    return scores, emotions
+
+@STAGE_SECONDS.timed(stage='determine_risk_level')
+def determine_risk_level(text, sentiment_scores, emotions, tags, features=None):
+    """
+    Enhanced risk assessment considering multiple factors including new tags
+    """
+    if features is None:
+        features = analyze_text(text)
+    
+    rules = features.rules
+    thresholds = rules.thresholds
+    
+    # Check for high-risk keywords or tags
+    high_risk_found = features.has('high_risk')
+    has_high_risk_tag = '#HighRisk' in tags
+    
+    if high_risk_found or has_high_risk_tag:
+        return 'high', ['suicidal ideation', 'self-harm risk', 'immediate intervention needed']
+    
+    # Check for moderate risk indicators
+    moderate_risk_found = features.has('moderate_risk')
+    
+    # Enhanced risk assessment based on sentiment, emotions, and tags
+    compound_score = sentiment_scores['compound']
+    max_negative_emotion = max([emotions['sadness'], emotions['anger'], emotions['fear'], emotions['anxiety']])
+    
+    # Consider multiple stress tags as risk escalation
+    stress_tags = [tag for tag in tags if tag in rules.stress_tags]
+    critical_tags = [tag for tag in tags if tag in rules.critical_tags]
+    
+    risk_factors = []
+    
+    # High risk conditions
+    high = thresholds['high']
+    moderate = thresholds['moderate']
+    if compound_score <= high['compound'] or max_negative_emotion >= high['negativeEmotion'] or \
+       len(stress_tags) >= high['stressTags'] or len(critical_tags) >= high['criticalTags']:
+        if moderate_risk_found or len(stress_tags) >= thresholds['severe']['stressTags']:
+            risk_factors.extend(['severe emotional distress', 'multiple stressors', 'crisis intervention recommended'])
+            return 'high', risk_factors
+        else:
+            risk_factors.extend(['significant emotional distress', 'professional support recommended'])
+            return 'high', risk_factors
+    
+    # Moderate risk conditions
+    elif (compound_score <= moderate['compound'] or max_negative_emotion >= moderate['negativeEmotion'] or 
+          moderate_risk_found or len(stress_tags) >= moderate['stressTags'] or
+          len(critical_tags) >= moderate['criticalTags']):
+        
+        if moderate_risk_found:
+            risk_factors.append('stress and mood indicators')
+        if max_negative_emotion >= moderate['negativeEmotion']:
+            risk_factors.append('elevated emotional distress')
+        if len(stress_tags) >= moderate['stressTags']:
+            risk_factors.append('multiple life stressors')
+        if len(critical_tags) >= moderate['criticalTags']:
+            risk_factors.append('concerning behavioral patterns')
+        
+        return 'moderate', risk_factors
+    
+    else:
+        if len(stress_tags) >= thresholds['low']['stressTags']:
+            risk_factors.append('manageable stress levels')
+        return 'low', risk_factors
+
+def score_text(text, rules=None):
+    """
+    Run every scoring stage for one text, with ``rules`` or the active rules. The
+    result holds only plain data so it can be sent back from a worker process.
+    """
+    return score_features(text, analyze_text(text, rules))
+
+
+def score_features(text, features):
+    """
+    Run the scoring stages that follow the shared analysis stage
+    """
+    tags = extract_mental_health_tags(text, features)
+    sentiment_scores, emotions = analyze_sentiment_and_emotions(text, features)
+    risk_level, risk_factors = determine_risk_level(text, sentiment_scores, emotions, tags, features)
+    return {
+        'tags': tags,
+        'sentiment_scores': sentiment_scores,
+        'emotions': emotions,
+        'risk_level': risk_level,
+        'risk_factors': risk_factors,
+        'rules_version': features.rules.version,
+        'languages': [ENGLISH, *features.languages]
+    }
+
+
+def scored_columns(scored):
+    """
+    The assessments table columns that hold a score
+    """
+    compound = scored['sentiment_scores']['compound']
+    return {
+        'sentiment_score': compound,
+        'emotions': scored['emotions'],
+        'risk_level': scored['risk_level'],
+        'risk_factors': scored['risk_factors'],
+        'tags': scored['tags'],
+        'confidence_score': abs(compound) + 0.1,
+        'rules_version': scored['rules_version']
+    }
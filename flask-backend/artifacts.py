@@ -0,0 +1,101 @@
+"""
+Prebuilt binary artifact with the VADER lexicons and the compiled keyword
+matcher, so a starting process neither parses the lexicon text files nor
+recomputes the matcher tables.
+
+Build it with:
+    python artifacts.py
+"""
+import hashlib
+import json
+import os
+import pickle
+from importlib.metadata import version, PackageNotFoundError
+
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from matcher import KeywordMatcher
+
+ARTIFACT_FORMAT = 2
+DEFAULT_ARTIFACT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lexicon.bin')
+
+
+def groups_digest(groups):
+    """
+    SHA-256 of the keyword groups, identifying the tables a matcher was built from
+    """
+    return hashlib.sha256(
+        json.dumps({name: list(keywords) for name, keywords in groups.items()}, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+
+def _vader_version():
+    try:
+        return version('vaderSentiment')
+    except PackageNotFoundError:
+        return None
+
+
+def artifact_path():
+    return os.environ.get('LEXICON_ARTIFACT', DEFAULT_ARTIFACT_PATH)
+
+
+def build_artifact(groups, path):
+    """
+    Build the lexicons and matcher the slow way and save them to ``path``
+    """
+    analyzer = SentimentIntensityAnalyzer()
+    payload = {
+        'format': ARTIFACT_FORMAT,
+        'groupsDigest': groups_digest(groups),
+        'vaderVersion': _vader_version(),
+        'lexicon': analyzer.lexicon,
+        'emojis': analyzer.emojis,
+        'matcher': KeywordMatcher(groups).state()
+    }
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as artifact:
+        pickle.dump(payload, artifact, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+    return payload
+
+
+def _analyzer_from_tables(lexicon, emojis):
+    # SentimentIntensityAnalyzer.__init__ only reads and parses the lexicon files
+    # into these two dicts; the raw file text it also keeps is never used again
+    analyzer = SentimentIntensityAnalyzer.__new__(SentimentIntensityAnalyzer)
+    analyzer.lexicon = lexicon
+    analyzer.emojis = emojis
+    analyzer.lexicon_full_filepath = ''
+    analyzer.emoji_full_filepath = ''
+    return analyzer
+
+
+def load_scoring_tables(groups, path=None):
+    """
+    Return ``(analyzer, matcher)`` for ``groups``, from the artifact when it was
+    built for these keyword tables and this VADER version, otherwise built from
+    scratch. The artifact is trusted like the code next to it.
+    """
+    path = path or artifact_path()
+    try:
+        with open(path, 'rb') as artifact:
+            payload = pickle.load(artifact)
+        if payload.get('format') != ARTIFACT_FORMAT or \
+           payload.get('groupsDigest') != groups_digest(groups) or \
+           payload.get('vaderVersion') != _vader_version():
+            print(f"Ignoring stale lexicon artifact {path}, rebuild it with 'python artifacts.py'")
+        else:
+            return (_analyzer_from_tables(payload['lexicon'], payload['emojis']),
+                    KeywordMatcher.from_state(payload['matcher']))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error loading lexicon artifact {path}: {e}")
+    return SentimentIntensityAnalyzer(), KeywordMatcher(groups)
+
+
+if __name__ == '__main__':
+    from rules import keyword_groups, read_rules, rules_path
+    path = artifact_path()
+    build_artifact(keyword_groups(read_rules(rules_path())), path)
+    print(f"Wrote {path} ({os.path.getsize(path)} bytes)")
@@ -0,0 +1,19 @@
+"""
+Async serving mode: the same Flask app behind an event-loop server.
+
+The event loop owns the connections and each request runs on a thread pool, so
+one process keeps many requests in flight while they wait on Supabase. Run with:
+    SERVING_MODE=async gunicorn -c gunicorn.conf.py
+or directly:
+    SERVING_MODE=async uvicorn asgi:application --port 5000
+"""
+import os
+
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+from app import app
+
+# Requests handled at the same time by one process
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 64))
+
+application = WSGIMiddleware(app, workers=ASGI_THREADS)
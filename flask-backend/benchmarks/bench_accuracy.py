@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Measure how well scoring tags and rates the hand-labelled submissions in
+corpus.LABELLED_TEXTS with the original keyword tables matched as plain
+substrings, and with the current tables and the default word and context
+matching (word boundaries, negations and intensifiers). Also times the current
+tables in both matching modes on a realistic corpus.
+
+Reported per mode: precision and recall per tag and per risk level, their
+macro F1, and how many texts were rated high that should not have been.
+Checks that word and context matching is at least as precise as substring
+matching, rates high and tags #HighRisk every high-risk text that substring
+matching does, and keeps ``--min-speed`` of its throughput. Exits with status 1 if a check fails.
+
+Run from the flask-backend directory:
+    python benchmarks/bench_accuracy.py
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RISK_LEVELS = ('low', 'moderate', 'high')
+
+
+def scores(expected, found, labels):
+    """
+    Precision, recall and F1 per label, from the expected and found label sets of each text
+    """
+    table = {}
+    for label in labels:
+        true_positives = sum(1 for want, got in zip(expected, found) if label in want and label in got)
+        predicted = sum(1 for got in found if label in got)
+        actual = sum(1 for want in expected if label in want)
+        precision = true_positives / predicted if predicted else 1.0
+        recall = true_positives / actual if actual else 1.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        table[label] = {'precision': round(precision, 3), 'recall': round(recall, 3), 'f1': round(f1, 3),
+                        'support': actual, 'predicted': predicted}
+    return table
+
+
+def macro_f1(table):
+    return round(sum(entry['f1'] for entry in table.values()) / len(table), 3)
+
+
+def evaluate(rules, labelled):
+    import analysis
+
+    scored = [analysis.score_text(text, rules) for text, _, _ in labelled]
+    expected_tags = [set(tags) for _, tags, _ in labelled]
+    found_tags = [set(result['tags']) for result in scored]
+    tags = sorted(set().union(*expected_tags, *found_tags))
+    tag_scores = scores(expected_tags, found_tags, tags)
+    risk_scores = scores([{risk} for _, _, risk in labelled], [{result['risk_level']} for result in scored],
+                         RISK_LEVELS)
+    return {
+        'tags': tag_scores,
+        'tagMacroF1': macro_f1(tag_scores),
+        'risk': risk_scores,
+        'riskMacroF1': macro_f1(risk_scores),
+        'riskAccuracy': round(sum(1 for (_, _, risk), result in zip(labelled, scored)
+                                  if result['risk_level'] == risk) / len(labelled), 3),
+        'falseHighRisk': [text for (text, _, risk), result in zip(labelled, scored)
+                          if result['risk_level'] == 'high' and risk != 'high'],
+        'missedHighRisk': [text for (text, _, risk), result in zip(labelled, scored)
+                           if risk == 'high' and result['risk_level'] != 'high'],
+        'foundHighRisk': [text for (text, _, risk), result in zip(labelled, scored)
+                          if risk == 'high' and result['risk_level'] == 'high' and '#HighRisk' in result['tags']],
+    }
+
+
+def throughputs(modes, texts, repeat=10):
+    """
+    Seconds per round for each mode, timed in turns so that a slow moment of the machine does not favour one mode
+    """
+    import analysis
+
+    rounds = {mode: [] for mode in modes}
+    for _ in range(repeat):
+        for mode, rules in modes.items():
+            rounds[mode].append(timeit.timeit(lambda: [analysis.score_text(text, rules) for text in texts], number=1))
+    return rounds
+
+
+def check(results, name, passed, detail):
+    results.append({'check': name, 'passed': bool(passed), 'detail': detail})
+
+
+def run(args, results, report):
+    import analysis
+    import legacy
+    from corpus import LABELLED_TEXTS, realistic_corpus
+    from rules import RuleSet, read_rules, rules_path
+
+    words_rules = analysis.active_rules()
+    modes = {'substrings': legacy.substring_rules(), 'words': words_rules}
+    for mode, rules in modes.items():
+        report[mode] = evaluate(rules, LABELLED_TEXTS)
+    # The cost of the matching mode alone, with the same tables on both sides
+    document = read_rules(rules_path())
+    current_substrings = RuleSet(dict(document, context=dict(document['context'], wordBoundaries=False)))
+    texts = realistic_corpus(args.size)
+    timed = throughputs({'substrings': current_substrings, 'words': words_rules}, texts)
+    for mode, rounds in timed.items():
+        report[mode]['textsPerSecond'] = round(len(texts) / min(rounds), 1)
+    # Compared round by round, as each pair of runs saw the same load on the machine
+    speed = statistics.median(before / after for before, after in zip(timed['substrings'], timed['words']))
+
+    substrings, words = report['substrings'], report['words']
+    for name, key in (('tags', 'tagMacroF1'), ('risk levels', 'riskMacroF1')):
+        check(results, f"{name} are rated at least as well", words[key] >= substrings[key],
+              f"macro F1 {substrings[key]} -> {words[key]}")
+    before, after = substrings['risk']['high'], words['risk']['high']
+    check(results, 'high risk is as precise', after['precision'] >= before['precision'],
+          f"precision {before['precision']} -> {after['precision']}, "
+          f"{len(substrings['falseHighRisk'])} -> {len(words['falseHighRisk'])} texts wrongly rated high")
+    # Per text, so a regression is not hidden by a gain elsewhere
+    dropped = [text for text in substrings['foundHighRisk'] if text not in words['foundHighRisk']]
+    check(results, 'no high risk is missed that substrings find', not dropped and after['recall'] >= before['recall'],
+          f"recall {before['recall']} -> {after['recall']}"
+          + ''.join(f"; dropped {text!r}" for text in dropped)
+          + ''.join(f"; missed {text!r}" for text in words['missedHighRisk']))
+    check(results, f"throughput stays above {args.min_speed:.0%} of substring matching", speed >= args.min_speed,
+          f"{substrings['textsPerSecond']} -> {words['textsPerSecond']} texts/s ({speed:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1000, help='texts in the throughput corpus')
+    parser.add_argument('--min-speed', type=float, default=0.8,
+                        help='share of the substring throughput word matching must keep')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    # The shipped rules, read once and not reloaded while measuring
+    os.environ.setdefault('RULES_RELOAD_INTERVAL', '0')
+    results = []
+    report = {}
+    run(args, results, report)
+
+    if args.json:
+        print(json.dumps({'report': report, 'checks': results}, indent=2))
+    else:
+        substrings, words = report['substrings'], report['words']
+        print(f"{'':20} {'substrings':>17} {'words':>17}")
+        print(f"{'':20} {'precision recall':>17} {'precision recall':>17}")
+        for section in ('tags', 'risk'):
+            for label in sorted(set(substrings[section]) | set(words[section])):
+                row = f"{label:20}"
+                for mode in (substrings, words):
+                    entry = mode[section].get(label)
+                    row += f" {entry['precision']:9.2f} {entry['recall']:6.2f}" if entry else f" {'-':>16}"
+                print(row)
+        for key in ('tagMacroF1', 'riskMacroF1', 'riskAccuracy', 'textsPerSecond'):
+            print(f"{key:20} {substrings[key]:>17} {words[key]:>17}")
+        for result in results:
+            print(f"{'ok  ' if result['passed'] else 'FAIL'} {result['check']}: {result['detail']}")
+    if not all(result['passed'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
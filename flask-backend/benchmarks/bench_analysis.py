@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Check that the shared analysis pipeline, with keywords matched as substrings,
+scores a fixed corpus exactly like the original per-function scans, then
+compare the cost of scoring one submission, also with the default word and
+context matching
+
+Run from the flask-backend directory:
+    python benchmarks/bench_analysis.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analysis
+import legacy
+from corpus import SAMPLE_TEXTS, synthetic_corpus
+
+
+def legacy_score(text):
+    tags = legacy.extract_mental_health_tags(text)
+    scores, emotions = legacy.analyze_sentiment_and_emotions(text)
+    risk_level, risk_factors = legacy.determine_risk_level(text, scores, emotions, tags)
+    return tags, scores, emotions, risk_level, risk_factors
+
+
+SUBSTRINGS = legacy.substring_rules()
+
+
+def pipeline_score(text, rules=SUBSTRINGS):
+    features = analysis.analyze_text(text, rules)
+    tags = analysis.extract_mental_health_tags(text, features)
+    scores, emotions = analysis.analyze_sentiment_and_emotions(text, features)
+    risk_level, risk_factors = analysis.determine_risk_level(text, scores, emotions, tags, features)
+    return tags, scores, emotions, risk_level, risk_factors
+
+
+def check_parity(texts):
+    mismatches = [text for text in texts if legacy_score(text) != pipeline_score(text)]
+    for text in mismatches[:5]:
+        print(f"MISMATCH: {text[:80]!r}")
+        print(f"  legacy:   {legacy_score(text)}")
+        print(f"  pipeline: {pipeline_score(text)}")
+    return not mismatches
+
+
+def main():
+    corpus = SAMPLE_TEXTS + synthetic_corpus(500)
+    if not check_parity(corpus):
+        sys.exit(1)
+    print(f"parity: {len(corpus)} texts scored identically")
+
+    old = min(timeit.repeat(lambda: [legacy_score(text) for text in corpus], number=1, repeat=3))
+    new = min(timeit.repeat(lambda: [pipeline_score(text) for text in corpus], number=1, repeat=3))
+    rules = analysis.active_rules()
+    words = min(timeit.repeat(lambda: [pipeline_score(text, rules) for text in corpus], number=1, repeat=3))
+    print(f"legacy:   {old / len(corpus) * 1e6:.1f} us/text")
+    print(f"pipeline: {new / len(corpus) * 1e6:.1f} us/text ({old / new:.2f}x)")
+    print(f"pipeline with word and context matching: {words / len(corpus) * 1e6:.1f} us/text ({old / words:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Measure batch scoring throughput of the process pool for 1, 2, 4 and 8 workers
+
+Run from the flask-backend directory:
+    python benchmarks/bench_batch.py [batch size]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import score_text
+from corpus import synthetic_corpus
+from scoring_pool import new_executor, score_texts
+
+WORKER_COUNTS = [1, 2, 4, 8]
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    texts = synthetic_corpus(size)
+    print(f"{size} texts, {os.cpu_count()} CPU(s)")
+
+    start = time.perf_counter()
+    for text in texts:
+        score_text(text)
+    inline = time.perf_counter() - start
+    print(f"{'inline':>8} {size / inline:>10.0f} texts/s")
+
+    for workers in WORKER_COUNTS:
+        with new_executor(workers) as executor:
+            # Warm the workers up so process start-up is not part of the timing
+            score_texts(texts[:workers * 4], executor)
+            start = time.perf_counter()
+            results = score_texts(texts, executor)
+            elapsed = time.perf_counter() - start
+        failed = sum(1 for _, error in results if error)
+        print(f"{workers:>8} {size / elapsed:>10.0f} texts/s ({failed} failed)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Time drill-down queries on the columnar analytics snapshot
+
+  1. build: loading N synthetic assessments into the snapshot
+  2. queries: p50 and max latency of typical admin questions (risk and tag
+     filters, date ranges, day and week series, tag co-occurrence)
+  3. correctness: a mixed query over a small snapshot, partly filled by add()
+     with out-of-order rows, checked against a brute-force count
+  4. persistence: a saved and reloaded snapshot answers the same
+  5. submissions during a refresh: add() and stats() while a rebuild and a sync
+     read a slow table must not wait on the reads, and every row is counted once
+
+Run from the flask-backend directory:
+    python benchmarks/bench_columnar.py --rows 1000000
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from analysis import MENTAL_HEALTH_TAGS
+from columnar import ColumnarSnapshot
+from rollups import EMOTIONS, parse_timestamp
+
+TAGS = list(MENTAL_HEALTH_TAGS)
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def synthetic_rows(count, seed, spread_minutes=None):
+    """
+    Assessments every 30 seconds from START, or at random minutes within ``spread_minutes``
+    """
+    rng = random.Random(seed)
+    for index in range(count):
+        if spread_minutes:
+            created_at = START + timedelta(minutes=rng.randrange(spread_minutes))
+        else:
+            created_at = START + timedelta(seconds=30 * index)
+        yield {
+            'id': index,
+            'created_at': created_at.isoformat(),
+            'risk_level': rng.choice(('low', 'low', 'moderate', 'high', None)),
+            'tags': rng.sample(TAGS, rng.randint(0, 3)),
+            'emotions': {emotion: rng.random() for emotion in EMOTIONS}
+        }
+
+
+def query_suite(span_days):
+    middle = START + timedelta(days=span_days / 2)
+    month = dict(start=middle, end=middle + timedelta(days=30))
+    return [
+        ('everything', {}),
+        ('high risk', dict(risk_levels=['high'])),
+        ('two tags, all', dict(tags=['#Anxiety', '#LowMood'])),
+        ('two tags, any + cooccurrence', dict(tags=['#Anxiety', '#LowMood'], tag_mode='any', cooccurrence=True)),
+        ('one month, daily + cooccurrence', dict(month, bucket='day', cooccurrence=True)),
+        ('one month, high risk, hourly', dict(month, risk_levels=['high'], bucket='hour')),
+        ('everything, weekly + cooccurrence', dict(bucket='week', cooccurrence=True)),
+    ]
+
+
+def time_queries(snapshot, suite, repeat):
+    results = []
+    for name, options in suite:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            answer = snapshot.query(**options)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        results.append({'query': name, 'count': answer['count'],
+                        'p50Ms': round(timings[len(timings) // 2] * 1000, 2),
+                        'maxMs': round(timings[-1] * 1000, 2)})
+    return results
+
+
+def check_against_brute_force(count=5000):
+    rows = list(synthetic_rows(count, seed=3, spread_minutes=60 * 24 * 60))
+    split = count * 3 // 5
+    snapshot = ColumnarSnapshot(lambda since: iter(rows[:split]), tags=TAGS)
+    snapshot.rebuild()
+    for row in rows[split:]:
+        snapshot.add(row)
+
+    start, end = START + timedelta(days=19), START + timedelta(days=40)
+    wanted_tags = {'#Anxiety', '#LowMood'}
+    answer = snapshot.query(start=start, end=end, risk_levels=['high', 'moderate'], tags=sorted(wanted_tags),
+                            tag_mode='any', bucket='day', cooccurrence=True)
+    chosen = [row for row in rows
+              if start <= parse_timestamp(row['created_at']) < end
+              and row['risk_level'] in ('high', 'moderate') and wanted_tags & set(row['tags'])]
+
+    problems = []
+    if answer['count'] != len(chosen):
+        problems.append(f"count {answer['count']} != {len(chosen)}")
+    days = collections.Counter(parse_timestamp(row['created_at']).date().isoformat() for row in chosen)
+    if {bucket['start'][:10]: bucket['count'] for bucket in answer['series']} != dict(days):
+        problems.append('daily series differs')
+    if answer['tagDistribution'] != dict(collections.Counter(tag for row in chosen for tag in row['tags'])):
+        problems.append('tag distribution differs')
+    pairs = collections.Counter((a, b) for row in chosen for a in row['tags'] for b in row['tags'] if a != b)
+    for (a, b), together in pairs.items():
+        if answer['cooccurrence']['matrix'][answer['cooccurrence']['tags'].index(a)][
+                answer['cooccurrence']['tags'].index(b)] != together:
+            problems.append(f"cooccurrence {a}/{b} differs")
+            break
+    for emotion in EMOTIONS:
+        expected = sum(row['emotions'][emotion] for row in chosen) / max(1, len(chosen))
+        if abs(answer['emotionAverages'][emotion] - expected) > 1e-4:
+            problems.append(f"{emotion} average differs")
+    return len(chosen), problems
+
+
+def check_add_during_refresh(count=2000, delay=0.0005):
+    """
+    The longest add() or stats() call made while a rebuild and then a sync read a
+    table that takes ``delay`` per row, and the problems with the rows counted
+    """
+    rows = list(synthetic_rows(count, seed=4))
+    added = list(synthetic_rows(200, seed=5, spread_minutes=60))
+    for index, row in enumerate(added):
+        row['id'] = f"added-{index}"
+        row['created_at'] = (START + timedelta(seconds=30 * count + index)).isoformat()
+
+    def fetch_rows(since):
+        # The added rows are stored before the read reaches the end of the table
+        for row in rows + added:
+            time.sleep(delay)
+            if since is None or parse_timestamp(row['created_at']) >= since:
+                yield row
+
+    snapshot = ColumnarSnapshot(fetch_rows, tags=TAGS)
+    waits = []
+    for refresh, extra in ((snapshot.rebuild, added[:100]), (snapshot.sync, added[100:])):
+        reader = threading.Thread(target=refresh)
+        reader.start()
+        time.sleep(delay * count / 4)
+        for row in extra:
+            started = time.perf_counter()
+            snapshot.add(row)
+            snapshot.stats()
+            waits.append(time.perf_counter() - started)
+        reader.join()
+    problems = []
+    if snapshot.size != count + len(added):
+        problems.append(f"{snapshot.size} rows counted, not {count + len(added)}")
+    return max(waits), problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='assessments in the snapshot')
+    parser.add_argument('--repeat', type=int, default=20, help='runs of each query')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    snapshot = ColumnarSnapshot(lambda since: synthetic_rows(args.rows, seed=1), tags=TAGS)
+    started = time.perf_counter()
+    snapshot.rebuild()
+    build_seconds = time.perf_counter() - started
+    queries = time_queries(snapshot, query_suite(args.rows * 30 / 86400), args.repeat)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'columns.npz')
+        snapshot.save(path)
+        reloaded = ColumnarSnapshot(None, tags=TAGS)
+        reloaded.load(path)
+        persisted = reloaded.query(risk_levels=['high'], bucket='week') == snapshot.query(risk_levels=['high'],
+                                                                                          bucket='week')
+    checked, problems = check_against_brute_force()
+    add_wait, refresh_problems = check_add_during_refresh()
+    # An add() that waited for the read would take about the whole read, seconds
+    if add_wait > 0.05:
+        refresh_problems.append(f"add() waited {add_wait * 1000:.0f} ms on a refresh")
+
+    results = {
+        'rows': args.rows,
+        'buildSeconds': round(build_seconds, 2),
+        'queries': queries,
+        'persisted': persisted,
+        'bruteForce': {'matched': checked, 'problems': problems},
+        'duringRefresh': {'maxAddMs': round(add_wait * 1000, 2), 'problems': refresh_problems},
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"build    {args.rows} rows in {results['buildSeconds']}s")
+        for query in queries:
+            print(f"query    {query['query']:<36} {query['count']:>8} rows  "
+                  f"p50 {query['p50Ms']:>7.2f} ms  max {query['maxMs']:>7.2f} ms")
+        print(f"reload   {'same answers' if persisted else 'DIFFERENT answers'}")
+        print(f"check    {checked} rows, {', '.join(problems) if problems else 'matches brute force'}")
+        print(f"refresh  longest add() {results['duringRefresh']['maxAddMs']} ms, "
+              f"{', '.join(refresh_problems) if refresh_problems else 'every row counted once'}")
+    if problems or refresh_problems or not persisted:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Measure and check French and Kinyarwanda scoring:
+
+  - detection: cost of the language detection every text goes through, and
+    its accuracy on labelled English, French, Kinyarwanda and mixed samples
+  - throughput: score_text texts/s on English, French, Kinyarwanda and mixed corpora
+  - lazy tables: scoring English builds no language tables; the first text in
+    another language builds them, timed and with their memory measured
+  - risk: suicidal ideation in French or Kinyarwanda is rated high, and is
+    flagged by the admission prefilter
+  - batches: BatchScorer gives the same results as score_text on a mixed batch
+
+Exits with status 1 if a check fails.
+
+Run from the flask-backend directory:
+    python benchmarks/bench_languages.py
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# (text, languages detected besides English, expected risk level or None)
+LABELLED_SAMPLES = [
+    ("Je suis tellement stressé par mes examens, je n'arrive plus à dormir.", ('fr',), None),
+    ("J'ai envie de mourir, je ne vaux rien pour personne.", ('fr',), 'high'),
+    ("Aujourd'hui c'était une bonne journée, je suis content de mes cours.", ('fr',), None),
+    ("Mes parents se disputent tout le temps à la maison et ça me rend triste.", ('fr',), None),
+    ("Je n'ai pas d'argent pour payer le loyer ce mois-ci.", ('fr',), None),
+    ("Je me sens seul depuis que je suis arrivé à l'université.", ('fr',), None),
+    ("Ma copine m’a quitté et je pleure tous les soirs.", ('fr',), None),
+    ("Je bois trop d'alcool le week-end pour oublier.", ('fr',), None),
+    ("J'ai des crises d'angoisse avant chaque partiel, le cœur qui bat très fort.", ('fr',), None),
+    ("Je veux en finir, je n'en peux plus.", ('fr',), 'high'),
+    ("Tout va bien, merci beaucoup pour votre aide.", ('fr',), None),
+    ("je suis epuise et decourage, je ne sais plus quoi faire avec mes notes", ('fr',), None),
+    ("Ndumva mfite agahinda kenshi kubera ibizamini.", ('rw',), None),
+    ("Ndashaka kwiyahura, nta mpamvu yo kubaho mfite.", ('rw',), 'high'),
+    ("Uyu munsi meze neza, ndishimye cyane.", ('rw',), None),
+    ("Nta mafaranga mfite yo kwishyura minerval ya kaminuza.", ('rw',), None),
+    ("Ababyeyi banjye bahora batongana mu rugo, bintera ubwoba.", ('rw',), None),
+    ("Ndi jyenyine kandi numva irungu ryinshi.", ('rw',), None),
+    ("Umukunzi wanjye twatandukanye none ndababaye cyane.", ('rw',), None),
+    ("Sinsinzira nijoro, mfite umunaniro mwinshi.", ('rw',), None),
+    ("Ndahangayitse cyane kubera amasomo menshi.", ('rw',), None),
+    ("Ntabwo nshaka gukomeza, ndihebye, ntacyo maze.", ('rw',), 'high'),
+    ("Murakoze cyane, ubu meze neza.", ('rw',), None),
+    ("Nywa inzoga nyinshi kugira ngo nibagirwe ibibazo.", ('rw',), None),
+    ("Ndumva mfite stress nyinshi because of my exams, sinsinzira.", ('rw',), None),
+    ("I'm so tired, je suis épuisé et je n'arrive pas à dormir.", ('fr',), None),
+    ("My family is struggling, nta mafaranga dufite yo kwishyura ishuri.", ('rw',), None),
+    ("Honestly ndashaka kwiyahura, I can't go on.", ('rw',), 'high'),
+]
+
+
+def corpus(samples, size, rng, length=400):
+    """
+    ``size`` journal-style texts of about ``length`` characters, each made of random samples
+    """
+    texts = []
+    for _ in range(size):
+        parts = []
+        while sum(len(part) + 1 for part in parts) < length:
+            parts.append(rng.choice(samples))
+        texts.append(' '.join(parts))
+    return texts
+
+
+def check(results, name, passed, detail):
+    results.append({'check': name, 'passed': bool(passed), 'detail': detail})
+
+
+def run(size, results, timings):
+    import analysis
+    from admission import HIGH_PRIORITY, HighRiskPrefilter
+    from corpus import SAMPLE_TEXTS, realistic_corpus
+    from rules import RuleSet, read_rules, rules_path
+    from vector_scoring import BatchScorer
+
+    rules = analysis.active_rules()
+    rng = random.Random(20)
+    by_language = {
+        code: [text for text, languages, _ in LABELLED_SAMPLES if languages == (code,)] for code in rules.languages
+    }
+    corpora = {
+        'en': realistic_corpus(size),
+        'fr': corpus(by_language['fr'][:12], size, rng),
+        'rw': corpus(by_language['rw'][:12], size, rng),
+        'mixed': corpus([text for text in SAMPLE_TEXTS if text] + by_language['fr'] + by_language['rw'], size, rng),
+    }
+
+    # Lazy tables: English first, in a process that has not seen another language yet
+    english = corpora['en']
+    started = time.perf_counter()
+    english_results = [analysis.score_text(text, rules) for text in english]
+    english_seconds = time.perf_counter() - started
+    built = rules.compiled_keys()
+    check(results, 'English scoring builds no language tables',
+          not built and all(result['languages'] == ['en'] for result in english_results),
+          f"tables built: {built or 'none'}")
+
+    loads = {}
+    for code in sorted(rules.languages):
+        text = by_language[code][0]
+        started = time.perf_counter()
+        analysis.score_text(text, rules)
+        first = time.perf_counter() - started
+        again = min(timeit.repeat(lambda: analysis.score_text(text, rules), number=20, repeat=3)) / 20
+        # Measured on a copy of the rules, since tracing memory slows down what it traces
+        copy = RuleSet(read_rules(rules_path()))
+        tracemalloc.start()
+        analysis.language_tables(copy, (code,))
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        loads[code] = {'firstTextMs': round(first * 1000, 1), 'laterTextMs': round(again * 1000, 2),
+                       'tablesKiB': round(memory / 1024)}
+    timings['lazyTables'] = loads
+    check(results, 'language tables are built on first use', sorted(rules.compiled_keys()) == [
+        (code,) for code in sorted(rules.languages)], ', '.join(
+        f"{code}: first text {load['firstTextMs']} ms ({load['tablesKiB']} KiB), then {load['laterTextMs']} ms"
+        for code, load in loads.items()))
+
+    # Detection
+    lowered = [text.lower() for text in english]
+    detect = rules.detector.detect
+    detect_us = min(timeit.repeat(lambda: [detect(text) for text in lowered], number=1, repeat=3)) / len(lowered) * 1e6
+    timings['detectUsPerText'] = round(detect_us, 1)
+    timings['englishUsPerText'] = round(english_seconds / len(english) * 1e6, 1)
+    wrong = [(text, detect(text.lower()), languages) for text, languages, _ in LABELLED_SAMPLES
+             if detect(text.lower()) != languages]
+    wrong += [(text, detect(text.lower()), ()) for text in SAMPLE_TEXTS if detect(text.lower())]
+    false_english = sum(1 for text in lowered if detect(text))
+    total = len(LABELLED_SAMPLES) + len(SAMPLE_TEXTS)
+    check(results, 'languages are detected', not wrong and not false_english,
+          f"{total - len(wrong)}/{total} labelled samples right, {false_english}/{len(lowered)} English texts "
+          f"taken for another language, {detect_us:.1f} us/text ({detect_us / timings['englishUsPerText']:.1%} "
+          f"of scoring)" + ''.join(f"; {text!r} detected as {got}, expected {expected}" for text, got, expected in wrong))
+
+    # Throughput
+    throughput = {}
+    for name, texts in corpora.items():
+        seconds = min(timeit.repeat(lambda: [analysis.score_text(text, rules) for text in texts], number=1, repeat=3))
+        throughput[name] = round(len(texts) / seconds, 1)
+    timings['textsPerSecond'] = throughput
+    check(results, 'other languages score at a similar rate', min(throughput.values()) >= 0.5 * throughput['en'],
+          ', '.join(f"{name} {rate} texts/s" for name, rate in throughput.items()))
+
+    # Risk
+    prefilter = HighRiskPrefilter()
+    missed = []
+    for text, _, risk in LABELLED_SAMPLES:
+        if risk is None:
+            continue
+        scored = analysis.score_text(text, rules)
+        if scored['risk_level'] != risk or prefilter.priority(text) != HIGH_PRIORITY:
+            missed.append(f"{text!r} rated {scored['risk_level']}")
+    check(results, 'suicidal ideation is rated high in every language', not missed,
+          '; '.join(missed) or f"{sum(1 for _, _, risk in LABELLED_SAMPLES if risk)} texts rated high and prefiltered")
+
+    # Batches
+    mixed = corpora['mixed'][:200]
+    batch = BatchScorer(rules).score(mixed)
+    differing = sum(1 for text, result in zip(mixed, batch) if result != analysis.score_text(text, rules))
+    check(results, 'batch scoring matches score_text on mixed batches', not differing,
+          f"{differing}/{len(mixed)} texts differ, "
+          f"{sum(1 for result in batch if len(result['languages']) > 1)} not only in English")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1000, help='texts per corpus')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    # The shipped rules, read once and not reloaded while measuring
+    os.environ.setdefault('RULES_RELOAD_INTERVAL', '0')
+    results = []
+    timings = {}
+    run(args.size, results, timings)
+
+    if args.json:
+        print(json.dumps({'timings': timings, 'checks': results}, indent=2))
+    else:
+        for result in results:
+            print(f"{'ok  ' if result['passed'] else 'FAIL'} {result['check']}: {result['detail']}")
+    if not all(result['passed'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Check and time the vectorized batch scorer and the bulk re-scoring job
+
+  1. parity: every text of a realistic corpus must score exactly like score_text
+  2. scoring: texts per second, one text at a time versus vectorized batches
+  3. job: a dry run and a real run of the re-scoring job over a seeded table in
+     the local Supabase stand-in, with part of the rows holding stale scores
+     and part only an outdated rules version, interrupted half way and resumed
+     from its checkpoint. Every row must carry the current rules version after.
+
+Run from the flask-backend directory:
+    python benchmarks/bench_rescore.py --texts 20000 --rows 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import fake_supabase
+from analysis import score_text, scored_columns
+from corpus import SAMPLE_TEXTS, realistic_corpus
+from rescore import Rescorer
+from vector_scoring import BatchScorer
+
+
+def check_parity(scorer, texts, batch_size):
+    mismatches = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        for text, scored in zip(batch, scorer.score(batch)):
+            if scored != score_text(text):
+                mismatches.append(text)
+    return mismatches
+
+
+def time_scoring(scorer, texts, batch_size):
+    started = time.perf_counter()
+    for text in texts:
+        score_text(text)
+    single = len(texts) / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        scorer.score(texts[start:start + batch_size])
+    batched = len(texts) / (time.perf_counter() - started)
+    return single, batched
+
+
+def seed_table(store, count, stale_fraction, seed=42):
+    """
+    Fill the assessments table with scored rows, ``stale_fraction`` of them with an outdated score
+    and as many again with the current score under an outdated rules version
+    """
+    rng = random.Random(seed)
+    texts = realistic_corpus(min(count, 5000), seed=seed)
+    scored = [scored_columns(score_text(text)) for text in texts]
+    now = datetime.now()
+    rows = []
+    for _ in range(count):
+        index = rng.randrange(len(texts))
+        columns = dict(scored[index])
+        draw = rng.random()
+        if draw < stale_fraction:
+            columns.update(risk_level='low', tags=[], sentiment_score=0.0, confidence_score=0.1,
+                           rules_version='previous')
+        elif draw < 2 * stale_fraction:
+            columns.update(rules_version='previous')
+        rows.append({
+            'id': str(uuid.uuid4()),
+            'user_id': f"user-{rng.randrange(1000)}",
+            'text_input': texts[index],
+            'created_at': (now - timedelta(minutes=rng.randrange(60 * 24 * 365))).isoformat(),
+            **columns
+        })
+    store.tables['assessments'] = rows
+
+
+def run_job(client, workdir, page_size, dry_run=False, **options):
+    rescorer = Rescorer(client, page_size=page_size, dry_run=dry_run,
+                        checkpoint_path=os.path.join(workdir, 'checkpoint.json'))
+    return rescorer.run(**options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--texts', type=int, default=20000, help='corpus size for the parity and scoring checks')
+    parser.add_argument('--rows', type=int, default=50000, help='assessments in the seeded table')
+    parser.add_argument('--stale', type=float, default=0.2, help='fraction of seeded rows with a stale score')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    from supabase import create_client
+
+    scorer = BatchScorer()
+    texts = realistic_corpus(args.texts) + [text for text in SAMPLE_TEXTS if text]
+    mismatches = check_parity(scorer, texts, args.batch_size)
+    single, batched = time_scoring(scorer, texts, args.batch_size)
+
+    server = fake_supabase.start()
+    client = create_client(f"http://127.0.0.1:{server.server_port}", fake_supabase.FAKE_KEY)
+    seed_table(server.store, args.rows, args.stale)
+    with tempfile.TemporaryDirectory() as workdir:
+        dry_run = run_job(client, workdir, args.page_size, dry_run=True)
+        interrupted = run_job(client, workdir, args.page_size, limit=args.rows // 2)
+        resumed = run_job(client, workdir, args.page_size, resume=True)
+        again = run_job(client, workdir, args.page_size, dry_run=True)
+    versions = {row['rules_version'] for row in server.store.tables['assessments']}
+
+    results = {
+        'parity': {'texts': len(texts), 'mismatches': len(mismatches), 'examples': mismatches[:5]},
+        'scoring': {'singleTextsPerSecond': round(single), 'batchedTextsPerSecond': round(batched),
+                    'speedup': round(batched / single, 2)},
+        'job': {
+            'rows': args.rows,
+            'dryRunChanged': dry_run['changed'],
+            'dryRunRowsPerSecond': dry_run['rowsPerSecond'],
+            'written': resumed['written'],
+            'stamped': resumed['stamped'],
+            'resumedFrom': interrupted['scanned'],
+            'rowsPerSecond': round(args.rows / (interrupted['seconds'] + resumed['seconds'])),
+            'changedAfterRun': again['changed'],
+            'outdatedAfterRun': again['stamped'],
+            'rulesVersions': sorted(versions),
+            'riskTransitions': dry_run['riskTransitions'],
+        },
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        parity, scoring, job = results['parity'], results['scoring'], results['job']
+        print(f"parity   {parity['texts']} texts, {parity['mismatches']} mismatches")
+        print(f"scoring  {scoring['singleTextsPerSecond']}/s one at a time, "
+              f"{scoring['batchedTextsPerSecond']}/s batched ({scoring['speedup']}x)")
+        print(f"dry run  {job['dryRunChanged']} of {job['rows']} rows would change "
+              f"({job['dryRunRowsPerSecond']:.0f} rows/s)")
+        print(f"rescore  {job['written']} rows written, {job['stamped']} of them only stamped, "
+              f"resumed after {job['resumedFrom']}, "
+              f"{job['rowsPerSecond']} rows/s, 1M rows in ~{1_000_000 / job['rowsPerSecond'] / 60:.1f} min")
+        print(f"after    {job['changedAfterRun']} rows still differ, {job['outdatedAfterRun']} with an old "
+              f"rules version, versions {', '.join(job['rulesVersions'])}")
+    job = results['job']
+    if mismatches or job['changedAfterRun'] or job['outdatedAfterRun'] or len(job['rulesVersions']) != 1:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
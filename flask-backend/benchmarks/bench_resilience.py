@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Check how the backend behaves while Supabase misbehaves, using faults injected
+into the local Supabase stand-in:
+
+  - flaky: 30% of database calls answer 503; retries hide nearly all of them
+  - coalescing: concurrent identical reads share one upstream request
+  - outage: every call fails; the circuit opens and requests fail fast with
+    503 and Retry-After, while /submit keeps working on recently verified
+    tokens and the write-behind spool
+  - recovery: once Supabase answers again a trial call closes the circuit
+  - stalls: hanging responses are cut off by the call timeouts
+
+Runs the app in-process with the Flask test client. Exits with status 1 if a
+check fails.
+
+Run from the flask-backend directory:
+    python benchmarks/bench_resilience.py
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import fake_supabase
+from load_test import percentile
+
+READ_TIMEOUT = 0.5
+TOTAL_TIMEOUT = 1.5
+BREAKER_RESET = 1.0
+
+
+def start_app(supabase_url, workdir):
+    """
+    Import the app configured for the stand-in, with short timeouts so the checks run quickly
+    """
+    os.environ.update(
+        SUPABASE_URL=supabase_url,
+        SUPABASE_KEY=fake_supabase.FAKE_KEY,
+        WRITE_BEHIND_SPOOL_DIR=os.path.join(workdir, 'spool'),
+        ROLLUP_SNAPSHOT_PATH=os.path.join(workdir, 'rollups.json'),
+        COLUMNAR_SNAPSHOT_PATH=os.path.join(workdir, 'columns.npz'),
+        SUBMIT_RATE_LIMIT='0',
+        # Every /assessments poll has to reach Supabase to be exposed to its faults
+        RESPONSE_CACHE_TTL='0',
+        TOKEN_CACHE_TTL='0.5',
+        SUPABASE_READ_TIMEOUT=str(READ_TIMEOUT),
+        SUPABASE_TOTAL_TIMEOUT=str(TOTAL_TIMEOUT),
+        SUPABASE_BREAKER_RESET=str(BREAKER_RESET),
+    )
+    os.chdir(BACKEND_DIR)
+    import app
+    return app
+
+
+def call(client, method, path, user='user-1', **kwargs):
+    started = time.perf_counter()
+    response = getattr(client, method)(path, headers={'Authorization': f"Bearer {user}"}, **kwargs)
+    return response, time.perf_counter() - started
+
+
+def check(results, name, passed, detail):
+    results.append({'check': name, 'passed': bool(passed), 'detail': detail})
+
+
+def run(app_module, store, results):
+    client = app_module.app.test_client()
+    transports = app_module.supabase_transports
+    for user in ('user-1', 'user-2'):
+        call(client, 'post', '/submit', user=user, json={'text': 'Feeling a bit tired today.'})
+    app_module.assessment_writer.flush()
+    if not transports:
+        check(results, 'setup', False, 'the Supabase client was not created')
+        return
+
+    # Flaky: a share of answers are gateway errors
+    store.set_faults(error_rate=0.3, path_prefix='/rest/v1/assessments', seed=1)
+    statuses = [call(client, 'get', '/assessments')[0].status_code for _ in range(100)]
+    store.set_faults()
+    rest = transports['rest'].stats()
+    upstream_errors = store.requests.get('fault error', 0) / (rest['requests'] - rest['coalesced'] + rest['retries'])
+    client_errors = 1 - statuses.count(200) / len(statuses)
+    # Three failed attempts in a row are left at 0.3 ** 3, under 3%
+    check(results, 'flaky reads are retried', client_errors <= 0.05 and rest['state'] == 'closed',
+          f"{upstream_errors:.0%} of upstream calls failed, {client_errors:.0%} of client reads, "
+          f"{rest['retries']} retries, circuit {rest['state']}")
+
+    # Coalescing: many identical reads at once
+    store.latency = 0.2
+    before = store.requests.get('GET assessments', 0)
+    coalesced_before = transports['rest'].stats()['coalesced']
+    statuses = []
+    barrier = threading.Barrier(32)
+
+    def read():
+        barrier.wait()
+        statuses.append(call(client, 'get', '/assessments')[0].status_code)
+
+    threads = [threading.Thread(target=read) for _ in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.latency = 0.0
+    upstream = store.requests.get('GET assessments', 0) - before
+    coalesced = transports['rest'].stats()['coalesced'] - coalesced_before
+    check(results, 'identical reads are coalesced', statuses.count(200) == 32 and upstream <= 4,
+          f"32 concurrent reads, {upstream} upstream requests, {coalesced} coalesced")
+
+    # Outage: everything fails until the circuit opens
+    time.sleep(0.6)  # let the token cache entries expire, so only stale ones are left
+    store.set_faults(error_rate=1.0)
+    for _ in range(10):
+        call(client, 'get', '/assessments')
+    rest = transports['rest'].stats()
+    check(results, 'circuit opens during an outage', rest['state'] == 'open', f"rest circuit {rest['state']}, "
+          f"{rest['trips']} trips")
+
+    timings = []
+    answers = []
+    for _ in range(20):
+        response, seconds = call(client, 'get', '/assessments')
+        timings.append(seconds)
+        answers.append((response.status_code, response.headers.get('Retry-After')))
+    p99 = percentile(timings, 0.99) * 1000
+    check(results, 'open circuit fails fast with 503',
+          all(status == 503 and retry for status, retry in answers) and p99 < 50,
+          f"statuses {sorted(set(status for status, _ in answers))}, Retry-After {answers[-1][1]}, p99 {p99:.1f} ms")
+
+    response, seconds = call(client, 'post', '/submit', json={'text': 'I feel hopeless and alone.'})
+    queued = app_module.assessment_writer.stats()
+    check(results, 'submissions continue on stale tokens', response.status_code == 200,
+          f"/submit answered {response.status_code} in {seconds * 1000:.0f} ms, token cache stale hits "
+          f"{app_module.token_cache.stats()['staleHits']}, writer {json.dumps(queued)}")
+
+    response, _ = call(client, 'get', '/assessments', user='user-unknown')
+    check(results, 'unverifiable tokens get 503, not 401', response.status_code == 503,
+          f"new token answered {response.status_code}")
+
+    # Recovery: a trial call after the reset timeout closes the circuit
+    store.set_faults()
+    time.sleep(BREAKER_RESET + 0.1)
+    response, _ = call(client, 'get', '/assessments')
+    rest = transports['rest'].stats()
+    check(results, 'circuit closes once Supabase recovers', response.status_code == 200 and rest['state'] == 'closed',
+          f"/assessments answered {response.status_code}, rest circuit {rest['state']}")
+
+    # Stalls: no request waits longer than the total timeout (plus backoff)
+    store.set_faults(stall_rate=1.0, stall_seconds=5.0, path_prefix='/rest/v1/assessments')
+    response, seconds = call(client, 'get', '/assessments')
+    store.set_faults()
+    check(results, 'stalled calls are cut off', response.status_code == 503 and seconds < TOTAL_TIMEOUT + 1.0,
+          f"/assessments answered {response.status_code} after {seconds:.2f}s (total timeout {TOTAL_TIMEOUT}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    supabase = fake_supabase.start()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = start_app(f"http://127.0.0.1:{supabase.server_port}", workdir)
+        run(app_module, supabase.store, results)
+        app_module.assessment_writer.flush()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(f"{'ok  ' if result['passed'] else 'FAIL'} {result['check']}: {result['detail']}")
+    if not all(result['passed'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Measure hot reloads of the scoring rules file and what the rules indirection
+costs a request, and check that reloads are safe under load:
+
+  - reload time: reading, validating and compiling the rules file
+  - per-request overhead: looking up the active rules, and scoring with them
+    against scoring with a snapshot held by the caller
+  - swaps under load: scoring threads keep running while the rules flip between
+    two versions; every result must match the version it reports, and nothing
+    may fail
+  - bad files: a broken file, or changed rules with the same version, leave the
+    last good rules in effect
+
+Exits with status 1 if a check fails.
+
+Run from the flask-backend directory:
+    python benchmarks/bench_rules.py
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from rules import DEFAULT_RULES_PATH
+
+# Scored moderate by the shipped rules, high once the canary keyword is added
+CANARY_TEXT = "I keep thinking about disappearing forever, I am so tired."
+CANARY_KEYWORD = 'disappearing forever'
+
+
+def write_rules(path, document):
+    # Written to a temporary file and moved into place, like a deploy should
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as rules_file:
+        json.dump(document, rules_file)
+    os.replace(temporary, path)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def check(results, name, passed, detail):
+    results.append({'check': name, 'passed': bool(passed), 'detail': detail})
+
+
+def run(path, base, canary, texts, duration, threads, results, timings):
+    import analysis
+    rule_book = analysis.rule_book
+
+    # Reload time
+    seconds = []
+    for index in range(10):
+        write_rules(path, dict(base if index % 2 else canary))
+        started = time.perf_counter()
+        rule_book.reload()
+        seconds.append(time.perf_counter() - started)
+    timings['reloadMs'] = {'p50': round(percentile(seconds, 0.5) * 1000, 1), 'max': round(max(seconds) * 1000, 1)}
+    check(results, 'reloads install the new version', rule_book.reloads == 10 and rule_book.last_error is None,
+          f"{rule_book.reloads} reloads, reload p50 {timings['reloadMs']['p50']} ms, max {timings['reloadMs']['max']} ms")
+
+    # Per-request overhead
+    rules = analysis.active_rules()
+    lookup_ns = min(timeit.repeat(analysis.active_rules, number=100000, repeat=5)) / 100000 * 1e9
+    sample = texts[:500]
+    held = min(timeit.repeat(lambda: [analysis.score_text(text, rules) for text in sample], number=1, repeat=5))
+    active = min(timeit.repeat(lambda: [analysis.score_text(text) for text in sample], number=1, repeat=5))
+    timings['activeRulesNs'] = round(lookup_ns, 1)
+    timings['scoreUsHeld'] = round(held / len(sample) * 1e6, 1)
+    timings['scoreUsActive'] = round(active / len(sample) * 1e6, 1)
+    check(results, 'rules lookup is cheap', lookup_ns < 2000,
+          f"active_rules() {lookup_ns:.0f} ns, score_text {timings['scoreUsActive']} us/text with the lookup, "
+          f"{timings['scoreUsHeld']} us/text with a held snapshot")
+
+    # Swaps under load
+    def score_for(seconds, swap):
+        stop = time.perf_counter() + seconds
+        outcomes = {'scored': 0, 'errors': [], 'mismatches': 0, 'versions': set()}
+        lock = threading.Lock()
+
+        def worker(offset):
+            index = offset
+            scored = errors = mismatches = 0
+            versions = set()
+            while time.perf_counter() < stop:
+                try:
+                    result = analysis.score_text(CANARY_TEXT if index % 4 == 0 else texts[index % len(texts)])
+                except Exception as e:
+                    with lock:
+                        outcomes['errors'].append(repr(e))
+                    errors += 1
+                    continue
+                if index % 4 == 0:
+                    expected = 'high' if result['rules_version'] == canary['version'] else 'moderate'
+                    mismatches += result['risk_level'] != expected
+                versions.add(result['rules_version'])
+                scored += 1
+                index += threads
+            with lock:
+                outcomes['scored'] += scored
+                outcomes['mismatches'] += mismatches
+                outcomes['versions'] |= versions
+
+        workers = [threading.Thread(target=worker, args=(offset,)) for offset in range(threads)]
+        for thread in workers:
+            thread.start()
+        swaps = 0
+        while swap and time.perf_counter() < stop:
+            write_rules(path, dict(base if swaps % 2 else canary))
+            rule_book.reload()
+            swaps += 1
+            time.sleep(0.05)
+        for thread in workers:
+            thread.join()
+        outcomes['swaps'] = swaps
+        return outcomes
+
+    steady = score_for(duration, swap=False)
+    churn = score_for(duration, swap=True)
+    timings['textsPerSecondSteady'] = round(steady['scored'] / duration, 1)
+    timings['textsPerSecondSwapping'] = round(churn['scored'] / duration, 1)
+    check(results, 'swaps under load are consistent',
+          not churn['errors'] and not churn['mismatches'] and len(churn['versions']) == 2,
+          f"{churn['swaps']} swaps, {churn['scored']} texts scored with versions {sorted(churn['versions'])}, "
+          f"{churn['mismatches']} scored unlike their version, {len(churn['errors'])} errors, "
+          f"{timings['textsPerSecondSwapping']} texts/s against {timings['textsPerSecondSteady']} without swaps")
+
+    # Bad files
+    good = analysis.active_rules()
+    with open(path, 'w', encoding='utf-8') as rules_file:
+        rules_file.write('{"version": "broken", "tags": ')
+    broken = rule_book.reload()
+    write_rules(path, dict(copy.deepcopy(canary if good.version == base['version'] else base),
+                           version=good.version))
+    unbumped = rule_book.reload()
+    check(results, 'bad files keep the last good rules',
+          not broken and not unbumped and analysis.active_rules() is good and rule_book.failed_reloads == 2,
+          f"still on {analysis.active_rules().version}, last error: {rule_book.last_error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds of scoring with and without swaps')
+    parser.add_argument('--threads', type=int, default=4, help='scoring threads')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    with open(DEFAULT_RULES_PATH, encoding='utf-8') as rules_file:
+        base = json.load(rules_file)
+    canary = copy.deepcopy(base)
+    canary['version'] = f"{base['version']}-canary"
+    canary['keywords']['high_risk'].append(CANARY_KEYWORD)
+
+    results = []
+    timings = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'rules.json')
+        shutil.copy(DEFAULT_RULES_PATH, path)
+        for name in base.get('languages', {}).values():
+            shutil.copy(os.path.join(BACKEND_DIR, name), workdir)
+        # The reloads are driven from here rather than by the file watcher
+        os.environ.update(RULES_PATH=path, RULES_RELOAD_INTERVAL='0')
+        from corpus import realistic_corpus
+        run(path, base, canary, realistic_corpus(2000), args.duration, args.threads, results, timings)
+
+    if args.json:
+        print(json.dumps({'timings': timings, 'checks': results}, indent=2))
+    else:
+        for result in results:
+            print(f"{'ok  ' if result['passed'] else 'FAIL'} {result['check']}: {result['detail']}")
+    if not all(result['passed'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Measure cold start and per-worker memory with and without the prebuilt lexicon
+artifact and app preloading
+
+For each configuration this reports:
+  - the time to import the app in a fresh interpreter
+  - the time until gunicorn answers /health
+  - the time until every worker reports ready on /ready
+  - the average RSS, PSS and private memory of a worker after it has scored some texts
+
+PSS divides shared pages between the processes sharing them, so it shows what a
+worker really adds. Linux only.
+
+Run from the flask-backend directory (build the artifact first with python artifacts.py):
+    python benchmarks/bench_startup.py --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import fake_supabase
+from artifacts import DEFAULT_ARTIFACT_PATH
+from corpus import SAMPLE_TEXTS
+
+MISSING_ARTIFACT = os.path.join(BACKEND_DIR, 'no-such-artifact.bin')
+
+CONFIGURATIONS = {
+    'baseline': {'PRELOAD_APP': 'false', 'LEXICON_ARTIFACT': MISSING_ARTIFACT},
+    'artifact': {'PRELOAD_APP': 'false', 'LEXICON_ARTIFACT': DEFAULT_ARTIFACT_PATH},
+    'artifact+preload': {'PRELOAD_APP': 'true', 'LEXICON_ARTIFACT': DEFAULT_ARTIFACT_PATH},
+}
+
+
+def import_seconds(env, repeat=3):
+    """
+    Fastest of ``repeat`` imports of the app in a fresh interpreter
+    """
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c', 'import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)'],
+            cwd=BACKEND_DIR, env=env)
+        timings.append(float(output.decode().strip().splitlines()[-1]))
+    return min(timings)
+
+
+def memory_kb(pid):
+    """
+    Rss, Pss and private (Private_Clean + Private_Dirty) memory of a process in KB
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def get_json(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'null')
+    except OSError:
+        return None, None
+
+
+def measure(name, env, port, workers):
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                               cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first_response = None
+        ready_pids = set()
+        deadline = started + 60
+        while len(ready_pids) < workers and time.perf_counter() < deadline:
+            status, body = get_json(f"{base}/ready")
+            if status is not None and first_response is None:
+                first_response = time.perf_counter() - started
+            if status == 200:
+                ready_pids.add(body['pid'])
+            else:
+                time.sleep(0.02)
+        all_ready = time.perf_counter() - started if len(ready_pids) >= workers else None
+
+        # Score some texts in every worker so the memory figures include a warm scoring path
+        for index in range(workers * 20):
+            request = urllib.request.Request(
+                f"{base}/submit", method='POST',
+                data=json.dumps({'text': SAMPLE_TEXTS[index % len(SAMPLE_TEXTS)] or 'Fine.'}).encode(),
+                headers={'Authorization': f"Bearer user-{index}", 'Content-Type': 'application/json'})
+            try:
+                urllib.request.urlopen(request, timeout=10).read()
+            except OSError:
+                pass
+
+        children = [int(pid) for pid in open(f"/proc/{process.pid}/task/{process.pid}/children").read().split()]
+        memory = [memory_kb(pid) for pid in children]
+        master = memory_kb(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+
+    def average(key):
+        return sum(item[key] for item in memory) / len(memory) / 1024 if memory else None
+
+    return {
+        'importSeconds': import_seconds(env),
+        'firstResponseSeconds': first_response,
+        'allWorkersReadySeconds': all_ready,
+        'workers': len(memory),
+        'workerRssMb': average('rss'),
+        'workerPssMb': average('pss'),
+        'workerPrivateMb': average('private'),
+        'masterRssMb': master['rss'] / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--mode', default='sync', choices=['sync', 'async'])
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--configs', nargs='+', default=list(CONFIGURATIONS), choices=list(CONFIGURATIONS))
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    if not os.path.exists(DEFAULT_ARTIFACT_PATH):
+        sys.exit(f"{DEFAULT_ARTIFACT_PATH} is missing, build it with: python artifacts.py")
+
+    supabase = fake_supabase.start()
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.configs:
+            env = dict(
+                os.environ,
+                PORT=str(args.port),
+                SERVING_MODE=args.mode,
+                WEB_CONCURRENCY=str(args.workers),
+                SUPABASE_URL=f"http://127.0.0.1:{supabase.server_port}",
+                SUPABASE_KEY=fake_supabase.FAKE_KEY,
+                WRITE_BEHIND_SPOOL_DIR=os.path.join(workdir, f"spool-{name}"),
+                ROLLUP_SNAPSHOT_PATH=os.path.join(workdir, 'rollups.json'),
+                **CONFIGURATIONS[name]
+            )
+            results[name] = measure(name, env, args.port, args.workers)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.workers} {args.mode} workers")
+    print(f"{'':<18} {'import s':>9} {'health s':>9} {'ready s':>8} {'RSS MB':>7} {'PSS MB':>7} {'private MB':>11}")
+    for name, result in results.items():
+        print(f"{name:<18} {result['importSeconds']:>9.2f} {result['firstResponseSeconds'] or 0:>9.2f} "
+              f"{result['allWorkersReadySeconds'] or 0:>8.2f} {result['workerRssMb']:>7.1f} "
+              f"{result['workerPssMb']:>7.1f} {result['workerPrivateMb']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
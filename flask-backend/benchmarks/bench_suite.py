@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the scoring engine and the HTTP endpoints.
+
+  micro   times each scoring stage over a synthetic corpus with realistic lengths
+  e2e     drives a mix of /submit, /assessments and /admin/analytics against the
+          local Supabase stand-in
+  replay  replays an anonymized request trace recorded with TRACE_LOG_PATH
+
+Every run reports throughput, p50/p95/p99 latency and peak RSS, and can save its
+results as JSON. With --baseline it exits with status 1 when a throughput, latency
+or memory figure is worse than the baseline by more than --threshold.
+
+Run from the flask-backend directory:
+    python benchmarks/bench_suite.py micro --save-baseline baseline-micro.json
+    python benchmarks/bench_suite.py micro --baseline baseline-micro.json --threshold 0.2
+    python benchmarks/bench_suite.py e2e --concurrency 16 --duration 10 --output e2e.json
+    python benchmarks/bench_suite.py replay trace.jsonl --speed 2
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import queue
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import analysis
+import fake_supabase
+from corpus import realistic_corpus
+from load_test import percentile, run_load, send, start_backend, summarize_samples
+from traces import load_trace
+
+ADMIN_ID = 'admin'
+
+# Latency changes smaller than this are timer and scheduler noise, not regressions
+NOISE_FLOOR = {'Us': 2.0, 'Ms': 1.0}
+
+
+def peak_rss_mb(pid=None):
+    """
+    Peak resident memory of this process, or of ``pid`` and its child processes
+    together (Linux only, None elsewhere)
+    """
+    if pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    pids = [pid]
+    try:
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                with open(f"/proc/{entry}/stat") as stat:
+                    # The parent pid is the second field after the parenthesized command name
+                    if int(stat.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        pids.append(int(entry))
+    except OSError:
+        pass
+    total = 0
+    for process in pids:
+        try:
+            with open(f"/proc/{process}/status") as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+        except OSError:
+            if process == pid:
+                return None
+    return total / 1024
+
+
+def time_calls(func, calls):
+    """
+    Call ``func(*args)`` for every argument tuple and summarize the per-call times
+    """
+    clock = time.perf_counter
+    timings = []
+    for args in calls:
+        started = clock()
+        func(*args)
+        timings.append(clock() - started)
+    total = sum(timings)
+    return {
+        'calls': len(timings),
+        'opsPerSecond': len(timings) / total if total else 0.0,
+        'p50Us': percentile(timings, 0.50) * 1e6,
+        'p95Us': percentile(timings, 0.95) * 1e6,
+        'p99Us': percentile(timings, 0.99) * 1e6,
+    }
+
+
+def run_micro(args):
+    texts = realistic_corpus(args.texts, seed=args.seed)
+    stages = {}
+
+    def record(name, result):
+        # Keep the fastest round, the one least disturbed by the rest of the machine
+        if name not in stages or result['opsPerSecond'] > stages[name]['opsPerSecond']:
+            stages[name] = result
+
+    for _ in range(args.rounds):
+        # Fresh features every round, since they cache their VADER scores
+        features = [analysis.analyze_text(text) for text in texts]
+        tags = [analysis.extract_mental_health_tags(text, f) for text, f in zip(texts, features)]
+        fresh = [analysis.analyze_text(text) for text in texts]
+        record('analyze_text', time_calls(analysis.analyze_text, [(text,) for text in texts]))
+        record('extract_mental_health_tags', time_calls(
+            analysis.extract_mental_health_tags, list(zip(texts, features))))
+        record('analyze_sentiment_and_emotions', time_calls(
+            analysis.analyze_sentiment_and_emotions, list(zip(texts, fresh))))
+        scored = [analysis.analyze_sentiment_and_emotions(text, f) for text, f in zip(texts, fresh)]
+        record('determine_risk_level', time_calls(analysis.determine_risk_level, [
+            (text, scores, emotions, tag_list, f)
+            for text, (scores, emotions), tag_list, f in zip(texts, scored, tags, fresh)
+        ]))
+        record('score_text', time_calls(analysis.score_text, [(text,) for text in texts]))
+
+    lengths = sorted(len(text) for text in texts)
+    return {
+        'corpus': {'texts': len(texts), 'seed': args.seed, 'medianLength': lengths[len(lengths) // 2],
+                   'p95Length': percentile(lengths, 0.95)},
+        'stages': stages,
+        'peakRssMb': peak_rss_mb(),
+    }
+
+
+def seed_assessments(store, user_ids, per_user, seed=42):
+    """
+    Fill the stand-in's assessments table with scored history for each user
+    """
+    texts = realistic_corpus(min(500, len(user_ids) * per_user), seed=seed)
+    scored = [analysis.score_text(text) for text in texts]
+    rng = random.Random(seed)
+    now = datetime.now()
+    rows = []
+    for user_id in user_ids:
+        for _ in range(per_user):
+            index = rng.randrange(len(texts))
+            result = scored[index]
+            compound = result['sentiment_scores']['compound']
+            rows.append({
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'text_input': texts[index],
+                'sentiment_score': compound,
+                'emotions': result['emotions'],
+                'risk_level': result['risk_level'],
+                'risk_factors': result['risk_factors'],
+                'tags': result['tags'],
+                'confidence_score': abs(compound) + 0.1,
+                'created_at': (now - timedelta(minutes=rng.randrange(60 * 24 * 60))).isoformat()
+            })
+    with store.lock:
+        store.tables['assessments'].extend(rows)
+
+
+def start_environment(args, workdir, admins=(ADMIN_ID,)):
+    supabase = fake_supabase.start(latency=args.latency_ms / 1000, admins=admins)
+    supabase_url = f"http://127.0.0.1:{supabase.server_port}"
+    backend = start_backend(args.mode, args.port, supabase_url, workdir)
+    return supabase, backend
+
+
+def stop_backend(backend):
+    backend.terminate()
+    backend.wait()
+
+
+def mixed_requests(mix, users, texts):
+    """
+    Build requests for ``run_load`` that cycle through the endpoints in ``mix``
+    proportions, as the users in ``users``
+    """
+    pattern = [endpoint for endpoint, weight in mix.items() for _ in range(weight)]
+
+    def make_request(client, sequence):
+        endpoint = pattern[(client + sequence) % len(pattern)]
+        user_id = users[(client * 7 + sequence) % len(users)]
+        headers = {'Authorization': f"Bearer user-{user_id}"}
+        if endpoint == 'submit':
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps({'text': texts[(client * 31 + sequence) % len(texts)]})
+            return 'POST', '/submit', body, headers
+        if endpoint == 'assessments':
+            return 'GET', '/assessments?limit=20&fields=id,riskLevel,tags,timestamp', None, headers
+        headers['Authorization'] = f"Bearer user-{ADMIN_ID}"
+        return 'GET', '/admin/analytics', None, headers
+    return make_request
+
+
+def run_e2e(args):
+    mix = {}
+    for part in args.mix.split(','):
+        endpoint, _, weight = part.partition('=')
+        mix[endpoint.strip()] = int(weight or 1)
+    users = [f"u{index}" for index in range(args.users)]
+    texts = realistic_corpus(1000, seed=args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        supabase, backend = start_environment(args, workdir)
+        seed_assessments(supabase.store, users, args.history, seed=args.seed)
+        try:
+            # One untimed pass so first-request set-up is not part of the figures
+            run_load(args.port, mixed_requests(mix, users, texts), 1, 1.0)
+            result = run_load(args.port, mixed_requests(mix, users, texts), args.concurrency, args.duration)
+            result['peakRssMb'] = peak_rss_mb(backend.pid)
+        finally:
+            stop_backend(backend)
+            supabase.shutdown()
+    result['mix'] = mix
+    return result
+
+
+def trace_request(entry):
+    """
+    Turn one trace entry into ``(method, path, body, headers)``
+    """
+    path = entry['path']
+    if entry.get('query'):
+        path += '?' + urlencode(entry['query'])
+    headers = {}
+    if entry.get('user'):
+        headers['Authorization'] = f"Bearer user-{entry['user']}"
+    body = None
+    if entry.get('body') is not None:
+        body = json.dumps(entry['body'])
+        headers['Content-Type'] = 'application/json'
+    return entry['method'], path, body, headers
+
+
+def replay(port, entries, concurrency, speed):
+    """
+    Send the trace's requests at their recorded offsets, divided by ``speed``
+    (0 sends them as fast as the clients allow). Latency is measured from when a
+    request was due, so requests delayed by a backed-up server count as slow.
+    """
+    due = queue.Queue(maxsize=concurrency * 4)
+    samples = []
+    lock = threading.Lock()
+
+    def worker():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local_samples = []
+        while True:
+            item = due.get()
+            if item is None:
+                break
+            scheduled, (method, path, body, headers) = item
+            connection, status = send(connection, port, method, path, body, headers)
+            local_samples.append((f"{method} {path.split('?')[0]}", time.perf_counter() - scheduled, status))
+        connection.close()
+        with lock:
+            samples.extend(local_samples)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    for entry in entries:
+        scheduled = started + entry['offset'] / speed if speed else time.perf_counter()
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        due.put((scheduled, trace_request(entry)))
+    for _ in threads:
+        due.put(None)
+    for thread in threads:
+        thread.join()
+    return summarize_samples(samples, time.perf_counter() - started)
+
+
+def run_replay(args):
+    entries = load_trace(args.trace)
+    if not entries:
+        sys.exit(f"{args.trace} has no requests")
+    users = sorted({entry['user'] for entry in entries if entry.get('user')})
+    admins = sorted({entry['user'] for entry in entries
+                     if entry.get('user') and entry['path'].startswith('/admin/')})
+    with tempfile.TemporaryDirectory() as workdir:
+        supabase, backend = start_environment(args, workdir, admins=admins)
+        seed_assessments(supabase.store, users, args.history, seed=args.seed)
+        try:
+            result = replay(args.port, entries, args.concurrency, args.speed)
+            result['peakRssMb'] = peak_rss_mb(backend.pid)
+        finally:
+            stop_backend(backend)
+            supabase.shutdown()
+    result['trace'] = {'path': os.path.basename(args.trace), 'requests': len(entries),
+                       'users': len(users), 'recordedSeconds': entries[-1]['offset']}
+    return result
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def regressions(results, baseline, threshold):
+    """
+    Compare figures present in both runs. Throughput may not drop, and latency and
+    memory may not grow, by more than ``threshold`` as a fraction of the baseline.
+    """
+    current = flatten(results)
+    found = []
+    for name, expected in flatten(baseline).items():
+        actual = current.get(name)
+        if actual is None or not expected:
+            continue
+        if name.endswith('PerSecond'):
+            change = (expected - actual) / expected
+        elif name.endswith('RssMb'):
+            change = (actual - expected) / expected
+        elif name.endswith(('Ms', 'Us')):
+            if actual - expected < NOISE_FLOOR[name[-2:]]:
+                continue
+            change = (actual - expected) / expected
+        else:
+            continue
+        if change > threshold:
+            found.append((name, expected, actual, change))
+    return found
+
+
+def print_table(results):
+    rows = results.get('stages') or dict(results.get('endpoints', {}), all=results)
+    unit = 'us' if 'stages' in results else 'ms'
+    rate = 'ops/s' if 'stages' in results else 'req/s'
+    print(f"{'':<32} {rate:>10} {'p50 ' + unit:>10} {'p95 ' + unit:>10} {'p99 ' + unit:>10}")
+    for name, row in rows.items():
+        suffix = 'Us' if unit == 'us' else 'Ms'
+        throughput = row.get('opsPerSecond', row.get('requestsPerSecond'))
+        print(f"{name:<32} {throughput:>10.1f} {row['p50' + suffix]:>10.1f} "
+              f"{row['p95' + suffix]:>10.1f} {row['p99' + suffix]:>10.1f}")
+    if results.get('peakRssMb') is not None:
+        print(f"peak RSS: {results['peakRssMb']:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--baseline', help='fail if the results regress against this results file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed regression, e.g. 0.2 for 20%%')
+    parser.add_argument('--save-baseline', help='also write the results to this baseline file')
+    parser.add_argument('--seed', type=int, default=42)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    micro = commands.add_parser('micro', help='scoring stage microbenchmarks')
+    micro.add_argument('--texts', type=int, default=2000)
+    micro.add_argument('--rounds', type=int, default=3)
+
+    for name, help_text in (('e2e', 'mixed endpoint load test'), ('replay', 'replay a recorded trace')):
+        command = commands.add_parser(name, help=help_text)
+        if name == 'replay':
+            command.add_argument('trace', help='trace file written with TRACE_LOG_PATH')
+            command.add_argument('--speed', type=float, default=1.0, help='replay speed-up, 0 for as fast as possible')
+        else:
+            command.add_argument('--duration', type=float, default=10.0)
+            command.add_argument('--users', type=int, default=50)
+            command.add_argument('--mix', default='submit=6,assessments=3,analytics=1',
+                                 help='relative weights of submit, assessments and analytics')
+        command.add_argument('--concurrency', type=int, default=16)
+        command.add_argument('--history', type=int, default=40, help='seeded assessments per user')
+        command.add_argument('--mode', default='sync', choices=['sync', 'async'])
+        command.add_argument('--latency-ms', type=float, default=20.0, help='simulated Supabase round-trip')
+        command.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    runners = {'micro': run_micro, 'e2e': run_e2e, 'replay': run_replay}
+    document = {
+        'suite': args.command,
+        'timestamp': datetime.now().isoformat(),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count(), 'scoringVersion': analysis.scoring_version()},
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('output', 'json', 'baseline', 'save_baseline', 'threshold')},
+        'results': runners[args.command](args),
+    }
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(document, output, indent=2)
+    if args.json:
+        print(json.dumps(document, indent=2))
+    else:
+        print_table(document['results'])
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('suite') != args.command:
+            sys.exit(f"{args.baseline} is a {baseline.get('suite')} baseline, not {args.command}")
+        found = regressions(document['results'], baseline['results'], args.threshold)
+        for name, expected, actual, change in found:
+            print(f"REGRESSION {name}: {expected:.2f} -> {actual:.2f} ({change:+.0%})", file=sys.stderr)
+        if found:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
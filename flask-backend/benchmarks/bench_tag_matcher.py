@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Benchmark the single-pass tag matcher against the original per-keyword scan,
+with keywords matched as substrings like the original
+
+Run from the flask-backend directory:
+    python benchmarks/bench_tag_matcher.py
+"""
+import itertools
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analysis
+import legacy
+from corpus import make_text
+
+SIZES = [100, 10_000, 1_000_000]
+
+# The legacy scan stops early once a keyword is found, so it is fastest on
+# keyword-dense text and slowest on text with no keywords at all
+DENSITIES = [0.05, 0.0]
+
+
+def main():
+    rules = legacy.substring_rules()
+    rng = random.Random(42)
+    print(f"{'density':>8} {'size':>10} {'legacy (ms)':>12} {'matcher (ms)':>13} {'speedup':>8}")
+    for density, size in itertools.product(DENSITIES, SIZES):
+        text = make_text(size, rng, density)
+        assert legacy.extract_mental_health_tags(text) == \
+            analysis.extract_mental_health_tags(text, analysis.analyze_text(text, rules))
+        number = max(1, 100_000 // size)
+        old = min(timeit.repeat(lambda: legacy.extract_mental_health_tags(text), number=number, repeat=5)) / number
+        new = min(timeit.repeat(lambda: analysis.extract_mental_health_tags(text, analysis.analyze_text(text, rules)),
+                                number=number, repeat=5)) / number
+        print(f"{density:>8} {size:>10} {old * 1000:>12.3f} {new * 1000:>13.3f} {old / new:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Check the verified-token cache against the local Supabase stand-in, which
+verifies JWT access tokens with a known signing secret:
+
+  - miss: a new token is verified with the Supabase auth API once
+  - hit: the same token again is answered without a network call
+  - wrong secret: a token signed with another secret is refused, and a cached
+    one that no longer verifies locally is checked with Supabase again
+  - expired: a token is not served from the cache past its ``exp``
+
+Runs the app in-process with the Flask test client. Exits with status 1 if a check fails.
+
+Run from the flask-backend directory:
+    python benchmarks/bench_token_cache.py
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import jwt
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import fake_supabase
+
+JWT_SECRET = 'bench-signing-secret'
+
+
+def start_app(supabase_url, workdir):
+    os.environ.update(
+        SUPABASE_URL=supabase_url,
+        SUPABASE_KEY=fake_supabase.FAKE_KEY,
+        SUPABASE_JWT_SECRET=JWT_SECRET,
+        WRITE_BEHIND_SPOOL_DIR=os.path.join(workdir, 'spool'),
+        ROLLUP_SNAPSHOT_PATH=os.path.join(workdir, 'rollups.json'),
+        COLUMNAR_SNAPSHOT_PATH=os.path.join(workdir, 'columns.npz'),
+        SUBMIT_RATE_LIMIT='0',
+        RESPONSE_CACHE_TTL='0',
+        TOKEN_CACHE_TTL='60',
+    )
+    os.chdir(BACKEND_DIR)
+    import app
+    return app
+
+
+def token(user_id, secret=JWT_SECRET, expires_in=3600):
+    return jwt.encode({'sub': user_id, 'aud': 'authenticated', 'exp': int(time.time() + expires_in)}, secret,
+                      algorithm='HS256')
+
+
+def check(results, name, passed, detail):
+    results.append({'check': name, 'passed': bool(passed), 'detail': detail})
+
+
+def run(app_module, store, results):
+    client = app_module.app.test_client()
+    cache = app_module.token_cache
+
+    def get(access_token):
+        """
+        The status of an /assessments request and the auth calls it made
+        """
+        before = store.requests.get('auth', 0)
+        response = client.get('/assessments', headers={'Authorization': f"Bearer {access_token}"})
+        return response.status_code, store.requests.get('auth', 0) - before
+
+    # Miss, then hit
+    valid = token('student-1')
+    misses = cache.stats()['misses']
+    status, calls = get(valid)
+    check(results, 'a new token is verified with Supabase', status == 200 and calls == 1
+          and cache.stats()['misses'] == misses + 1, f"answered {status} after {calls} auth calls")
+    hits = cache.stats()['hits']
+    status, calls = get(valid)
+    check(results, 'a repeat token makes no network call', status == 200 and calls == 0
+          and cache.stats()['hits'] == hits + 1, f"answered {status} after {calls} auth calls")
+
+    # Wrong signing secret
+    forged = token('student-2', secret='another-secret')
+    answers = [get(forged) for _ in range(2)]
+    check(results, 'a token signed with another secret is refused and not cached',
+          all(status == 401 and calls == 1 for status, calls in answers),
+          ', '.join(f"answered {status} after {calls} auth calls" for status, calls in answers))
+    # As if Supabase had accepted it under a signing secret that has since been rotated
+    cache.put(forged, {'id': 'student-2'})
+    status, calls = get(forged)
+    check(results, 'a cached token that fails the local signature check is verified again',
+          status == 401 and calls == 1, f"answered {status} after {calls} auth calls")
+
+    # Expiry
+    status, calls = get(token('student-3', expires_in=-10))
+    check(results, 'an expired token is refused', status == 401 and calls == 1,
+          f"answered {status} after {calls} auth calls")
+    expiring = token('student-4', expires_in=2)
+    first = get(expiring)
+    time.sleep(max(0.0, jwt.decode(expiring, options={'verify_signature': False})['exp'] - time.time()) + 1.1)
+    status, calls = get(expiring)
+    check(results, 'a cached token is not used past its exp', first[0] == 200 and status == 401 and calls == 1,
+          f"answered {first[0]} before exp, then {status} after {calls} auth calls")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    supabase = fake_supabase.start(jwt_secret=JWT_SECRET)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = start_app(f"http://127.0.0.1:{supabase.server_port}", workdir)
+        run(app_module, supabase.store, results)
+        app_module.assessment_writer.flush()
+    supabase.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(f"{'ok  ' if result['passed'] else 'FAIL'} {result['check']}: {result['detail']}")
+    if not all(result['passed'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Fixed and synthetic text corpora shared by the benchmark scripts
+"""
+import math
+import random
+
+from analysis import active_rules
+
+# Hand-written submissions covering every tag, risk level and emotion branch
+SAMPLE_TEXTS = [
+    "I'm failing my exams and I feel so stressed about my grades this semester.",
+    "I can't afford tuition this year and the bills keep piling up.",
+    "My heart racing before every class, I can't breathe when the professor calls on me.",
+    "I feel sad and empty, crying every night, everything seems hopeless.",
+    "I'm so lonely, I have no friends at university and I feel isolated.",
+    "I haven't slept in days, insomnia is making me exhausted and tired.",
+    "Sometimes I want to die, I think everyone would be better off dead without me.",
+    "My boyfriend and I had another argument and a fight about trust issues.",
+    "My parents keep pressuring me, the family expectations are a heavy burden.",
+    "I hate my body, I feel fat and ugly every time I look in the mirror.",
+    "Any mistake feels like failure, I'm never good enough for my high standards.",
+    "Too much to do, the deadline is tomorrow and I'm behind schedule again.",
+    "I've been drinking a lot at every party just to escape and feel numb.",
+    "Who am I? I feel lost and confused about my purpose and identity.",
+    "Work stress and pressure at my job are getting to me.",
+    "I'm struggling in my course and having difficulty keeping up with the subject.",
+    "Today was a wonderful day, I'm so happy and excited about the trip!",
+    "I am thrilled and delighted, I love my new friends.",
+    "I'm angry and frustrated, I feel furious and annoyed all the time.",
+    "I'm afraid and scared, terrified of what will happen, so nervous.",
+    "I feel anxious and tense, restless and uneasy, sweating and shaking.",
+    "I can't cope anymore, I'm breaking down and falling apart.",
+    "Nothing much happened today. I had lunch and went for a walk.",
+    "I'm not hopeless anymore, therapy has really helped me.",
+    "The saddle on my bike broke on the way to the testing centre.",
+    "Pressure at school from the student council, college applications are due.",
+    "I feel worthless and want to give up, no future for me.",
+    "I'm stressed out about money, rent and my loan payments.",
+    "The weather is nice and the coffee is great.",
+    "",
+]
+
+# Submissions labelled by hand with the tags a counsellor would give them and
+# their risk level. Many are traps for plain substring matching: keywords
+# inside other words, negated or hedged keywords, and keywords that are only
+# mentioned in passing. A high-risk keyword is rated high even when negated,
+# so that a counsellor reads every mention of suicide or self-harm.
+LABELLED_TEXTS = [
+    # Keywords inside other words
+    ("The saddle on my bike broke on the way to the testing centre.", (), 'low'),
+    ("I downloaded the lecture notes and made a nice average lunch.", (), 'low'),
+    ("My father's friend lent me his lawnmower for the weekend.", (), 'low'),
+    ("Give me a moment, I'm finishing the homework for tomorrow.", (), 'low'),
+    ("We watched a documentary about the cardinal and the pope.", (), 'low'),
+    ("Whatever happens, the team meets on Thursday for practice.", (), 'low'),
+    ("I bought a new lamp, the shadows in my room look different now.", (), 'low'),
+    ("The professor posted the slides about underground water.", (), 'low'),
+    # Negated and hedged keywords
+    ("I'm not hopeless anymore, therapy has really helped me.", ('#HighRisk',), 'high'),
+    ("I don't feel worthless now that I have a job I like.", ('#HighRisk',), 'high'),
+    ("I never thought about suicide, I just need help with my exams.", ('#HighRisk', '#AcademicStress'), 'high'),
+    ("I am not sad today, I'm actually happy with how things went.", (), 'low'),
+    ("No panic this week, the breathing exercises are working.", (), 'low'),
+    ("I'm not anxious about the presentation, I prepared well.", ('#AcademicStress',), 'low'),
+    ("I wasn't scared at all during the interview.", (), 'low'),
+    ("Without fear I told my parents about my grades.", ('#AcademicStress',), 'low'),
+    ("I'm no longer depressed, I finally sleep well and see friends.", (), 'low'),
+    ("I don't want to give up on my degree, I just need a tutor.", ('#HighRisk',), 'high'),
+    ("Not hopeless, just tired after a long week of exams.", ('#HighRisk', '#SleepDeprived', '#AcademicStress'),
+     'high'),
+    ("I can't stop crying since my grandmother died.", ('#LowMood',), 'moderate'),
+    # Genuine risk, sometimes with a negation nearby
+    ("I'm not okay and I want to die.", ('#HighRisk',), 'high'),
+    ("I have been cutting myself again and I feel worthless.", ('#HighRisk',), 'high'),
+    ("There is no point anymore, I can't go on like this.", ('#HighRisk',), 'high'),
+    ("I keep thinking about killing myself, nobody would care.", ('#HighRisk',), 'high'),
+    ("I'm suicidal and I don't know who to tell.", ('#HighRisk',), 'high'),
+    ("Everyone would be better off dead without me, no future for me.", ('#HighRisk',), 'high'),
+    ("I don't think I can live like this, I feel so hopeless and worthless.", ('#HighRisk', '#LowMood'), 'high'),
+    ("I have thought about ending it all after failing my exams.", ('#HighRisk', '#AcademicStress'), 'high'),
+    ("I've been hurting myself, it's the only way I feel something.", ('#HighRisk',), 'high'),
+    ("I want to kill myself, I can't do this anymore.", ('#HighRisk',), 'high'),
+    ("I have never felt so hopeless in my life", ('#HighRisk', '#LowMood'), 'high'),
+    ("There is no reason not to kill myself", ('#HighRisk',), 'high'),
+    ("Never been more suicidal", ('#HighRisk',), 'high'),
+    ("not a day goes by without wanting to kill myself", ('#HighRisk',), 'high'),
+    ("I would never hurt myself but lately I feel like giving up", ('#HighRisk',), 'high'),
+    # Inflected high-risk wording
+    ("I have been self harming again", ('#HighRisk',), 'high'),
+    ("thinking about suicides lately", ('#HighRisk',), 'high'),
+    ("I feel worthlessly small", ('#HighRisk',), 'high'),
+    ("no pointless", ('#HighRisk',), 'high'),
+    ("I feel hopelessly lost and alone", ('#HighRisk', '#LowMood', '#SocialAnxiety', '#Identity'), 'high'),
+    ("My suicidal thoughts came back after the exams.", ('#HighRisk', '#AcademicStress'), 'high'),
+    ("I keep self-harming when things get bad at home.", ('#HighRisk', '#FamilyIssues'), 'high'),
+    # Intensified and softened distress
+    ("I'm extremely anxious and terrified before every exam.", ('#Anxiety', '#AcademicStress'), 'high'),
+    ("I feel so incredibly sad and empty, crying all the time.", ('#LowMood',), 'high'),
+    ("I'm a little nervous about the quiz tomorrow.", ('#Anxiety', '#AcademicStress'), 'low'),
+    ("Slightly tired today, but the lecture was good.", ('#SleepDeprived',), 'low'),
+    ("I'm really really depressed and hopeless, everything hurts.", ('#LowMood', '#HighRisk'), 'high'),
+    ("A bit worried about money, rent is due next week.", ('#FinancialStress', '#Anxiety'), 'moderate'),
+    ("I feel very lonely and isolated since I moved to campus.", ('#SocialAnxiety',), 'moderate'),
+    ("My panic attacks are getting worse, my heart racing every night.", ('#Anxiety',), 'high'),
+    # Plain distress and everyday life
+    ("I'm failing my exams and I feel so stressed about my grades this semester.", ('#AcademicStress',), 'moderate'),
+    ("I can't afford tuition this year and the bills keep piling up.", ('#FinancialStress',), 'moderate'),
+    ("I haven't slept in days, insomnia is making me exhausted.", ('#SleepDeprived',), 'moderate'),
+    ("My boyfriend and I had another argument about trust issues.", ('#RelationshipStress',), 'moderate'),
+    ("My parents keep pressuring me, the family expectations are a heavy burden.",
+     ('#FamilyIssues', '#Perfectionism'), 'moderate'),
+    ("I hate my body, I feel fat and ugly every time I look in the mirror.", ('#BodyImage',), 'moderate'),
+    ("I've been drinking a lot at every party just to escape.", ('#SubstanceUse',), 'moderate'),
+    ("Who am I? I feel lost and confused about my purpose.", ('#Identity',), 'moderate'),
+    ("Too much to do, the deadline is tomorrow and I'm behind schedule again.",
+     ('#TimeManagement', '#AcademicStress'), 'moderate'),
+    ("Today was a wonderful day, I'm so happy and excited about the trip!", (), 'low'),
+    ("Nothing much happened today. I had lunch and went for a walk.", (), 'low'),
+    ("The weather is nice and the coffee is great.", (), 'low'),
+    ("I'm feeling sad and unhappy because my friend moved away.", ('#LowMood', '#SocialAnxiety'), 'moderate'),
+    ("The panic in my chest before the midterm makes me shake.", ('#Anxiety', '#AcademicStress'), 'moderate'),
+    ("My mom is sick and I worry about paying the hospital bills.", ('#FamilyIssues', '#FinancialStress',
+                                                                     '#Anxiety'), 'moderate'),
+    ("Studying all night again, I'm so tired and my grades are still low.",
+     ('#AcademicStress', '#SleepDeprived', '#LowMood'), 'moderate'),
+]
+
+
+def make_text(size, rng, density):
+    """
+    Journal-style text of ``size`` characters where ``density`` of the words are
+    known keywords and the rest are neutral filler
+    """
+    keywords = sorted(active_rules().matcher.keyword_groups)
+    filler = [
+        'i', 'feel', 'today', 'really', 'my', 'about', 'because', 'everything', 'the',
+        'and', 'with', 'was', 'of', 'it', 'that', 'this', 'week', 'again', 'just', 'think'
+    ]
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(keywords) if rng.random() < density else rng.choice(filler)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:size]
+
+
+def synthetic_corpus(count, seed=42):
+    """
+    Reproducible mix of the sample texts and generated texts of varied length
+    """
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            texts.append(rng.choice(SAMPLE_TEXTS))
+        else:
+            texts.append(make_text(rng.randint(20, 2000), rng, rng.choice([0.0, 0.02, 0.05, 0.1])))
+    return texts
+
+
+def realistic_corpus(count, seed=42, median_length=280):
+    """
+    Reproducible submissions with a log-normal length distribution like journal
+    entries: mostly a few sentences, with a long tail of multi-paragraph texts.
+    Each text mixes hand-written sentences with generated ones.
+    """
+    rng = random.Random(seed)
+    sentences = [text for text in SAMPLE_TEXTS if text]
+    texts = []
+    for _ in range(count):
+        length = min(8000, max(10, int(rng.lognormvariate(math.log(median_length), 0.9))))
+        parts = []
+        size = 0
+        while size < length:
+            if rng.random() < 0.4:
+                part = rng.choice(sentences)
+            else:
+                part = make_text(rng.randint(40, 160), rng, rng.choice([0.0, 0.02, 0.05])).capitalize() + '.'
+            parts.append(part)
+            size += len(part) + 1
+        text = ' '.join(parts)
+        if len(text) > length:
+            # Cut at the last word boundary before the target length
+            text = text[:length].rsplit(' ', 1)[0]
+        texts.append(text)
+    return texts
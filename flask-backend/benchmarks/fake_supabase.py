@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Local in-memory stand-in for the parts of Supabase the backend uses: the auth
+``/auth/v1/user`` endpoint and PostgREST reads and writes under ``/rest/v1``.
+Every request can be delayed to model the network round-trip to Supabase, and
+faults can be injected: 503 answers, dropped connections and stalled responses,
+for all requests or only those under a path prefix (``store.set_faults``).
+
+Run on its own with:
+    python benchmarks/fake_supabase.py --port 54321 --latency-ms 20 --error-rate 0.1
+and point the backend at it with SUPABASE_URL=http://127.0.0.1:54321.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import jwt
+
+# Service role style key accepted by supabase-py's key format check
+FAKE_KEY = 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.ZmFrZQ'
+
+_FILTER = re.compile(r'^(eq|neq|gt|gte|lt|lte)\.(.*)$')
+
+
+def _matches(row, column, operator, value):
+    current = row.get(column)
+    if current is None:
+        return False
+    current = str(current)
+    return {
+        'eq': current == value,
+        'neq': current != value,
+        'gt': current > value,
+        'gte': current >= value,
+        'lt': current < value,
+        'lte': current <= value,
+    }[operator]
+
+
+class FakeSupabase:
+    """
+    Table storage and request counters shared by the handler threads
+    """
+
+    def __init__(self, latency=0.0, admins=(), jwt_secret=None):
+        self.latency = latency
+        # When set, JWT access tokens must be signed with it and not expired, like real Supabase ones
+        self.jwt_secret = jwt_secret
+        self.tables = {'assessments': [], 'referrals': [], 'profiles': []}
+        self.requests = {}
+        self.lock = threading.Lock()
+        self.set_faults()
+        for user_id in admins:
+            self.tables['profiles'].append({'user_id': user_id, 'role': 'admin'})
+
+    def set_faults(self, error_rate=0.0, drop_rate=0.0, stall_rate=0.0, stall_seconds=5.0, path_prefix='', seed=None):
+        """
+        Inject faults into requests whose path starts with ``path_prefix``: a
+        fraction answered 503, dropped without an answer, or stalled for
+        ``stall_seconds`` before the answer. Called without arguments it clears them.
+        """
+        with self.lock:
+            self.faults = {'error_rate': error_rate, 'drop_rate': drop_rate, 'stall_rate': stall_rate,
+                           'stall_seconds': stall_seconds, 'path_prefix': path_prefix}
+            self.random = random.Random(seed)
+
+    def fault_for(self, path):
+        """
+        The fault to inject into a request: 'error', 'drop', 'stall' or None
+        """
+        with self.lock:
+            faults = self.faults
+            if not path.startswith(faults['path_prefix']):
+                return None
+            roll = self.random.random()
+        for fault in ('error', 'drop', 'stall'):
+            rate = faults[f"{fault}_rate"]
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    def count(self, key):
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def select(self, table, params):
+        with self.lock:
+            rows = list(self.tables.setdefault(table, []))
+        order = None
+        limit = None
+        columns = '*'
+        for key, value in params:
+            if key == 'select':
+                columns = value
+            elif key == 'order':
+                order = value
+            elif key == 'limit':
+                limit = int(value)
+            elif key == 'or':
+                # Only used for keyset pagination, which the load tests do not exercise
+                continue
+            else:
+                match = _FILTER.match(value)
+                if match:
+                    rows = [row for row in rows if _matches(row, key, match.group(1), match.group(2))]
+        if order:
+            for part in reversed(order.split(',')):
+                column, _, direction = part.partition('.')
+                rows.sort(key=lambda row: str(row.get(column)), reverse=direction.startswith('desc'))
+        if limit is not None:
+            rows = rows[:limit]
+        if columns != '*':
+            wanted = [column.strip() for column in columns.split(',')]
+            rows = [{column: row.get(column) for column in wanted} for row in rows]
+        return rows
+
+    def write(self, table, rows, upsert):
+        with self.lock:
+            stored = self.tables.setdefault(table, [])
+            if upsert:
+                ids = {row.get('id') for row in rows}
+                stored[:] = [row for row in stored if row.get('id') not in ids]
+            stored.extend(rows)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeSupabase/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def store(self):
+        return self.server.store
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def _route(self, method):
+        # Always consume the body, or it would be read as the next request on this connection
+        body = self._body()
+        time.sleep(self.store.latency)
+        url = urlsplit(self.path)
+        params = parse_qsl(url.query, keep_blank_values=True)
+
+        fault = self.store.fault_for(url.path)
+        if fault:
+            self.store.count(f"fault {fault}")
+        if fault == 'error':
+            return self._send(503, {'message': 'Service unavailable'})
+        if fault == 'drop':
+            self.close_connection = True
+            return
+        if fault == 'stall':
+            time.sleep(self.store.faults['stall_seconds'])
+
+        if url.path == '/auth/v1/user':
+            self.store.count('auth')
+            token = (self.headers.get('Authorization') or '').replace('Bearer ', '', 1)
+            if not token or token == 'invalid':
+                return self._send(401, {'msg': 'Invalid token'})
+            if self.store.jwt_secret and token.count('.') == 2:
+                try:
+                    claims = jwt.decode(token, self.store.jwt_secret, algorithms=['HS256'],
+                                        options={'verify_aud': False})
+                except jwt.PyJWTError:
+                    return self._send(401, {'msg': 'Invalid token'})
+                user_id = claims.get('sub') or hashlib.sha1(token.encode()).hexdigest()
+            # Tokens of the form user-<id>[-anything] belong to that user
+            elif token.startswith('user-'):
+                user_id = token.split('-')[1]
+            else:
+                user_id = hashlib.sha1(token.encode()).hexdigest()
+            return self._send(200, {
+                'id': user_id, 'aud': 'authenticated', 'app_metadata': {}, 'user_metadata': {},
+                'created_at': '2025-01-01T00:00:00+00:00'
+            })
+
+        if url.path.startswith('/rest/v1/'):
+            table = url.path[len('/rest/v1/'):]
+            self.store.count(f"{method} {table}")
+            if method == 'GET':
+                rows = self.store.select(table, params)
+                if 'vnd.pgrst.object' in (self.headers.get('Accept') or ''):
+                    if len(rows) != 1:
+                        return self._send(406, {'message': 'JSON object requested, multiple (or no) rows returned'})
+                    return self._send(200, rows[0])
+                return self._send(200, rows)
+            if method in ('POST', 'PATCH'):
+                rows = body if isinstance(body, list) else [body]
+                upsert = 'merge-duplicates' in (self.headers.get('Prefer') or '')
+                self.store.write(table, rows, upsert)
+                return self._send(201, rows)
+
+        self._send(404, {'message': 'Not found'})
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def do_PATCH(self):
+        self._route('PATCH')
+
+
+def start(port=0, latency=0.0, admins=(), jwt_secret=None):
+    """
+    Start the stand-in on a background thread. Returns the server; its URL is
+    ``http://127.0.0.1:<server.server_port>`` and its data is ``server.store``.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    server.store = FakeSupabase(latency=latency, admins=admins, jwt_secret=jwt_secret)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--admin', action='append', default=[], help='user id to give the admin role')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered 503')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='fraction of connections dropped unanswered')
+    parser.add_argument('--stall-rate', type=float, default=0.0, help='fraction of requests stalled')
+    parser.add_argument('--stall-seconds', type=float, default=5.0)
+    args = parser.parse_args()
+    server = start(args.port, args.latency_ms / 1000, args.admin)
+    server.store.set_faults(args.error_rate, args.drop_rate, args.stall_rate, args.stall_seconds)
+    print(f"Fake Supabase on http://127.0.0.1:{server.server_port} (key {FAKE_KEY})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
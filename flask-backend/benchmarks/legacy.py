@@ -0,0 +1,298 @@
+"""
+Reference copy of the original scoring functions, used by the benchmarks to
+check that optimized paths return exactly the same results
+"""
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+from rules import RuleSet, read_rules, rules_path
+
+analyzer = SentimentIntensityAnalyzer()
+
+# The keyword tables as the original app.py defined them. Frozen here rather than read
+# from the rules file, so the parity checks also catch changes to the tables.
+HIGH_RISK_KEYWORDS = [
+    'suicide', 'kill myself', 'end it all', 'want to die', 'no point living',
+    'self harm', 'cut myself', 'hurt myself', 'worthless', 'hopeless',
+    'better off dead', 'no future', 'give up', 'can\'t go on'
+]
+
+MODERATE_RISK_KEYWORDS = [
+    'depressed', 'anxious', 'panic', 'overwhelmed', 'stressed', 'lonely',
+    'sad', 'worried', 'scared', 'angry', 'frustrated', 'tired', 'exhausted',
+    'can\'t cope', 'breaking down', 'falling apart'
+]
+
+# Enhanced and expanded context-aware mental health tags mapping
+MENTAL_HEALTH_TAGS = {
+    '#AcademicStress': [
+        'failing', 'grades', 'exam', 'test', 'assignment', 'coursework', 'study', 'studying',
+        'homework', 'class', 'classes', 'professor', 'academic', 'semester', 'deadline',
+        'gpa', 'marks', 'performance', 'behind in', 'catching up', 'workload', 'thesis',
+        'dissertation', 'research', 'presentation', 'quiz', 'midterm', 'final', 'paper'
+    ],
+    '#FinancialStress': [
+        'money', 'broke', 'financial', 'afford', 'expensive', 'cost', 'budget',
+        'debt', 'loan', 'tuition', 'fees', 'bills', 'payment', 'poverty',
+        'poor', 'economic', 'salary', 'income', 'scholarship', 'bursary',
+        'financial aid', 'rent', 'food costs', 'textbooks'
+    ],
+    '#Anxiety': [
+        'anxious', 'anxiety', 'panic', 'nervous', 'worry', 'worried', 'fear',
+        'scared', 'terrified', 'tense', 'restless', 'uneasy', 'apprehensive',
+        'overwhelmed', 'stressed out', 'racing thoughts', 'heart racing',
+        'breathing fast', 'sweating', 'shaking', 'trembling'
+    ],
+    '#LowMood': [
+        'sad', 'depressed', 'down', 'low', 'unhappy', 'miserable', 'gloomy',
+        'melancholy', 'dejected', 'discouraged', 'disappointed', 'blue',
+        'empty', 'numb', 'hopeless', 'despair', 'crying', 'tears'
+    ],
+    '#SocialAnxiety': [
+        'social', 'people', 'friends', 'lonely', 'isolated', 'alone', 'shy',
+        'awkward', 'embarrassed', 'judged', 'self-conscious', 'withdrawn',
+        'antisocial', 'introvert', 'relationships', 'fitting in', 'rejection',
+        'talking to people', 'making friends', 'social situations'
+    ],
+    '#SleepDeprived': [
+        'sleep', 'tired', 'exhausted', 'insomnia', 'can\'t sleep', 'sleepless',
+        'awake', 'restless nights', 'fatigue', 'drowsy', 'sleepy', 'no sleep',
+        'staying up', 'all night', 'sleep schedule', 'sleeping problems',
+        'nightmares', 'tossing', 'turning'
+    ],
+    '#HighRisk': [
+        'suicide', 'kill myself', 'end it all', 'want to die', 'no point',
+        'self harm', 'cut myself', 'hurt myself', 'worthless', 'hopeless',
+        'give up', 'can\'t go on', 'better off dead', 'no future',
+        'ending it', 'not worth living'
+    ],
+    '#RelationshipStress': [
+        'relationship', 'boyfriend', 'girlfriend', 'partner', 'breakup', 'broke up',
+        'heartbreak', 'dating', 'love', 'romantic', 'marriage', 'divorce',
+        'cheating', 'trust issues', 'fighting', 'argument', 'couples',
+        'commitment', 'jealousy', 'toxic relationship'
+    ],
+    '#FamilyIssues': [
+        'family', 'parents', 'mom', 'dad', 'mother', 'father', 'home', 'siblings',
+        'relatives', 'family problems', 'family conflict', 'family pressure',
+        'divorce', 'separation', 'abuse', 'neglect', 'toxic family',
+        'family expectations', 'disappointment'
+    ],
+    '#BodyImage': [
+        'fat', 'ugly', 'appearance', 'looks', 'weight', 'skinny', 'body',
+        'mirror', 'clothes', 'eating', 'diet', 'exercise', 'gym',
+        'self-image', 'confidence', 'attractive', 'beautiful', 'handsome'
+    ],
+    '#Perfectionism': [
+        'perfect', 'perfectionist', 'mistake', 'failure', 'not good enough',
+        'disappointing', 'high standards', 'expectations', 'flawless',
+        'error', 'wrong', 'mess up', 'control', 'obsessive'
+    ],
+    '#TimeManagement': [
+        'time', 'busy', 'schedule', 'deadline', 'rushing', 'late', 'procrastination',
+        'procrastinating', 'putting off', 'time management', 'overwhelmed',
+        'too much', 'not enough time', 'behind schedule'
+    ],
+    '#SubstanceUse': [
+        'drinking', 'alcohol', 'drugs', 'smoking', 'weed', 'marijuana',
+        'pills', 'medication', 'addiction', 'substance', 'high', 'drunk',
+        'party', 'escape', 'numb', 'cope'
+    ],
+    '#Identity': [
+        'identity', 'who am i', 'purpose', 'meaning', 'direction', 'lost',
+        'confused', 'identity crisis', 'belonging', 'values', 'beliefs',
+        'sexuality', 'gender', 'race', 'culture', 'religion'
+    ]
+}
+
+# The lists the functions below spell out inline, under their rules file group names
+CONTEXT_KEYWORDS = {
+    'stress': ['stress', 'pressure', 'burden', 'weight', 'heavy'],
+    'school': ['school', 'university', 'college', 'student'],
+    'work': ['work', 'job', 'career', 'employment'],
+    'anxiety_symptoms': ['heart racing', "can't breathe", 'panic attack', 'shaking'],
+    'conflict': ['fight', 'argument', 'conflict'],
+    'partner': ['boyfriend', 'girlfriend', 'partner', 'relationship'],
+    'performance': ['failing', 'behind', 'struggling', 'difficulty'],
+    'academic': ['class', 'course', 'subject', 'study', 'exam'],
+    'joy': ['happy', 'excited', 'great', 'wonderful', 'amazing', 'love', 'joy', 'pleased', 'thrilled', 'delighted'],
+    'sadness': ['sad', 'depressed', 'down', 'unhappy', 'disappointed', 'lonely', 'empty', 'numb'],
+    'anger': ['angry', 'mad', 'furious', 'irritated', 'frustrated', 'hate', 'rage', 'annoyed'],
+    'fear': ['afraid', 'scared', 'terrified', 'worried', 'nervous', 'frightened'],
+    'anxiety': ['anxious', 'panic', 'overwhelmed', 'stressed', 'tense', 'restless', 'uneasy'],
+    'anxiety_physical': ['racing heart', "can't breathe", 'sweating', 'shaking'],
+}
+
+
+def substring_rules():
+    """
+    The rules file with the original keyword tables, matched as plain substrings
+    with no negation or intensity weighing and no other languages, which is what
+    these functions do
+    """
+    document = read_rules(rules_path())
+    keywords = dict(CONTEXT_KEYWORDS, high_risk=HIGH_RISK_KEYWORDS, moderate_risk=MODERATE_RISK_KEYWORDS)
+    return RuleSet(dict(document, version=f"{document['version']}-original", tags=MENTAL_HEALTH_TAGS,
+                        keywords=keywords, languages={},
+                        context=dict(document.get('context', {}), wordBoundaries=False)))
+
+
+def extract_mental_health_tags(text):
+    """
+    Extract context-aware mental health tags from text using enhanced keyword matching
+    and contextual analysis
+    """
+    text_lower = text.lower()
+    detected_tags = []
+    
+    # Basic keyword matching
+    for tag, keywords in MENTAL_HEALTH_TAGS.items():
+        if any(keyword in text_lower for keyword in keywords):
+            detected_tags.append(tag)
+    
+    # Contextual analysis for better tag assignment
+    words = text_lower.split()
+    
+    # Enhanced stress detection based on combinations
+    stress_indicators = ['stress', 'pressure', 'burden', 'weight', 'heavy']
+    if any(indicator in text_lower for indicator in stress_indicators):
+        # Determine type of stress based on context
+        if any(word in text_lower for word in ['school', 'university', 'college', 'student']):
+            if '#AcademicStress' not in detected_tags:
+                detected_tags.append('#AcademicStress')
+        elif any(word in text_lower for word in ['work', 'job', 'career', 'employment']):
+            detected_tags.append('#WorkStress')
+    
+    # Enhanced anxiety detection
+    anxiety_symptoms = ['heart racing', 'can\'t breathe', 'panic attack', 'shaking']
+    if any(symptom in text_lower for symptom in anxiety_symptoms):
+        if '#Anxiety' not in detected_tags:
+            detected_tags.append('#Anxiety')
+    
+    # Relationship context enhancement
+    if any(word in text_lower for word in ['fight', 'argument', 'conflict']) and \
+       any(word in text_lower for word in ['boyfriend', 'girlfriend', 'partner', 'relationship']):
+        if '#RelationshipStress' not in detected_tags:
+            detected_tags.append('#RelationshipStress')
+    
+    # Academic performance specific detection
+    performance_words = ['failing', 'behind', 'struggling', 'difficulty']
+    academic_context = ['class', 'course', 'subject', 'study', 'exam']
+    if any(perf in text_lower for perf in performance_words) and \
+       any(acad in text_lower for acad in academic_context):
+        if '#AcademicStress' not in detected_tags:
+            detected_tags.append('#AcademicStress')
+    
+    # Remove duplicates while preserving order
+    return list(dict.fromkeys(detected_tags))
+
+def analyze_sentiment_and_emotions(text):
+    """
+    Enhanced sentiment and emotion analysis using VADER and contextual cues
+    """
+    # Get VADER scores
+    scores = analyzer.polarity_scores(text)
+    
+    # Extract basic emotions from compound score and text analysis
+    compound_score = scores['compound']
+    
+    # Initialize emotion scores
+    emotions = {
+        'joy': 0.0,
+        'sadness': 0.0,
+        'anger': 0.0,
+        'fear': 0.0,
+        'anxiety': 0.0
+    }
+    
+    # Enhanced emotion detection based on keywords and context
+    text_lower = text.lower()
+    
+    # Joy indicators with intensity
+    joy_words = ['happy', 'excited', 'great', 'wonderful', 'amazing', 'love', 'joy', 'pleased', 'thrilled', 'delighted']
+    joy_intensity = sum(1 for word in joy_words if word in text_lower)
+    if joy_intensity > 0 or compound_score > 0.5:
+        emotions['joy'] = min(1.0, max(0.0, compound_score + (joy_intensity * 0.1)))
+    
+    # Sadness indicators with context
+    sadness_words = ['sad', 'depressed', 'down', 'unhappy', 'disappointed', 'lonely', 'empty', 'numb']
+    sadness_intensity = sum(1 for word in sadness_words if word in text_lower)
+    if sadness_intensity > 0 or compound_score < -0.3:
+        emotions['sadness'] = min(1.0, abs(scores['neg']) + (sadness_intensity * 0.1))
+    
+    # Anger indicators
+    anger_words = ['angry', 'mad', 'furious', 'irritated', 'frustrated', 'hate', 'rage', 'annoyed']
+    anger_intensity = sum(1 for word in anger_words if word in text_lower)
+    if anger_intensity > 0:
+        emotions['anger'] = min(1.0, scores['neg'] + (anger_intensity * 0.1))
+    
+    # Fear indicators
+    fear_words = ['afraid', 'scared', 'terrified', 'worried', 'nervous', 'frightened']
+    fear_intensity = sum(1 for word in fear_words if word in text_lower)
+    if fear_intensity > 0:
+        emotions['fear'] = min(1.0, abs(compound_score) if compound_score < 0 else 0.3 + (fear_intensity * 0.1))
+    
+    # Anxiety indicators with physical symptoms
+    anxiety_words = ['anxious', 'panic', 'overwhelmed', 'stressed', 'tense', 'restless', 'uneasy']
+    anxiety_symptoms = ['racing heart', 'can\'t breathe', 'sweating', 'shaking']
+    anxiety_intensity = sum(1 for word in anxiety_words if word in text_lower)
+    symptom_intensity = sum(1 for symptom in anxiety_symptoms if symptom in text_lower)
+    
+    if anxiety_intensity > 0 or symptom_intensity > 0:
+        emotions['anxiety'] = min(1.0, abs(scores['neg']) + 0.2 + (anxiety_intensity * 0.1) + (symptom_intensity * 0.15))
+    
+    return scores, emotions
+
+def determine_risk_level(text, sentiment_scores, emotions, tags):
+    """
+    Enhanced risk assessment considering multiple factors including new tags
+    """
+    text_lower = text.lower()
+    
+    # Check for high-risk keywords or tags
+    high_risk_found = any(keyword in text_lower for keyword in HIGH_RISK_KEYWORDS)
+    has_high_risk_tag = '#HighRisk' in tags
+    
+    if high_risk_found or has_high_risk_tag:
+        return 'high', ['suicidal ideation', 'self-harm risk', 'immediate intervention needed']
+    
+    # Check for moderate risk indicators
+    moderate_risk_found = any(keyword in text_lower for keyword in MODERATE_RISK_KEYWORDS)
+    
+    # Enhanced risk assessment based on sentiment, emotions, and tags
+    compound_score = sentiment_scores['compound']
+    max_negative_emotion = max([emotions['sadness'], emotions['anger'], emotions['fear'], emotions['anxiety']])
+    
+    # Consider multiple stress tags as risk escalation
+    stress_tags = [tag for tag in tags if tag in ['#AcademicStress', '#FinancialStress', '#Anxiety', '#LowMood', '#RelationshipStress', '#FamilyIssues']]
+    critical_tags = [tag for tag in tags if tag in ['#SubstanceUse', '#BodyImage', '#Perfectionism']]
+    
+    risk_factors = []
+    
+    # High risk conditions
+    if compound_score <= -0.7 or max_negative_emotion >= 0.8 or len(stress_tags) >= 4 or len(critical_tags) >= 2:
+        if moderate_risk_found or len(stress_tags) >= 3:
+            risk_factors.extend(['severe emotional distress', 'multiple stressors', 'crisis intervention recommended'])
+            return 'high', risk_factors
+        else:
+            risk_factors.extend(['significant emotional distress', 'professional support recommended'])
+            return 'high', risk_factors
+    
+    # Moderate risk conditions
+    elif (compound_score <= -0.4 or max_negative_emotion >= 0.5 or 
+          moderate_risk_found or len(stress_tags) >= 2 or len(critical_tags) >= 1):
+        
+        if moderate_risk_found:
+            risk_factors.append('stress and mood indicators')
+        if max_negative_emotion >= 0.5:
+            risk_factors.append('elevated emotional distress')
+        if len(stress_tags) >= 2:
+            risk_factors.append('multiple life stressors')
+        if len(critical_tags) >= 1:
+            risk_factors.append('concerning behavioral patterns')
+        
+        return 'moderate', risk_factors
+    
+    else:
+        if len(stress_tags) >= 1:
+            risk_factors.append('manageable stress levels')
+        return 'low', risk_factors
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Load-test the read endpoints dashboards poll, with the response cache off and on.
+
+Every round each user polls their /assessments history and each admin polls
+/admin/analytics, like the dashboards do, sending Accept-Encoding: gzip and
+the ETag of the last answer they got. A share of the users submit a new text
+in between. Reported per endpoint and mode: server CPU per request (the thread
+time the request took, which leaves out the Supabase stand-in's own thread),
+bytes the bodies would take uncompressed against the bytes sent, and how many
+answers were 304s.
+
+Also checks that a poll right after a submit sees the new assessment, that a
+cached, compressed body decodes to what the uncached endpoint returns, and
+that the cache saves CPU and bytes. Exits with status 1 if a check fails.
+
+Runs the app in-process with the Flask test client.
+
+Run from the flask-backend directory:
+    python benchmarks/load_dashboard.py --users 40 --rounds 30
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import fake_supabase
+from corpus import realistic_corpus
+
+ADMINS = ('admin1', 'admin2', 'admin3')
+
+
+def start_app(supabase_url, workdir):
+    os.environ.update(
+        SUPABASE_URL=supabase_url,
+        SUPABASE_KEY=fake_supabase.FAKE_KEY,
+        WRITE_BEHIND_SPOOL_DIR=os.path.join(workdir, 'spool'),
+        ROLLUP_SNAPSHOT_PATH=os.path.join(workdir, 'rollups.json'),
+        COLUMNAR_SNAPSHOT_PATH=os.path.join(workdir, 'columns.npz'),
+        SUBMIT_RATE_LIMIT='0',
+    )
+    os.chdir(BACKEND_DIR)
+    import app
+    return app
+
+
+def call(client, method, path, user, headers=None, **kwargs):
+    """
+    The response and the thread time the request took
+    """
+    started = time.thread_time()
+    response = getattr(client, method)(path, headers={'Authorization': f"Bearer user-{user}", **(headers or {})},
+                                       **kwargs)
+    return response, time.thread_time() - started
+
+
+def decoded(response):
+    body = response.get_data()
+    if response.headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+def check(results, name, passed, detail):
+    results.append({'check': name, 'passed': bool(passed), 'detail': detail})
+
+
+def poll(app_module, users, rounds, submit_share, texts, seed):
+    """
+    Run the polling rounds and return the figures per endpoint
+    """
+    client = app_module.app.test_client()
+    rng = random.Random(seed)
+    etags = {}
+    figures = {endpoint: {'requests': 0, 'cpu': 0.0, 'bodyBytes': 0, 'sentBytes': 0, 'notModified': 0, 'errors': 0}
+               for endpoint in ('/assessments', '/admin/analytics')}
+    latest_body = {}
+    for _ in range(rounds):
+        for user in users:
+            if rng.random() < submit_share:
+                call(client, 'post', '/submit', user, json={'text': rng.choice(texts)})
+        # Stored rows land in Supabase in the background, as between two real polls
+        app_module.assessment_writer.flush()
+        for endpoint, pollers in (('/assessments', users), ('/admin/analytics', ADMINS)):
+            for user in pollers:
+                headers = {'Accept-Encoding': 'gzip'}
+                if (endpoint, user) in etags:
+                    headers['If-None-Match'] = etags[(endpoint, user)]
+                response, cpu = call(client, 'get', endpoint, user, headers=headers)
+                entry = figures[endpoint]
+                entry['requests'] += 1
+                entry['cpu'] += cpu
+                if response.status_code == 304:
+                    entry['notModified'] += 1
+                    entry['bodyBytes'] += latest_body[(endpoint, user)]
+                elif response.status_code == 200:
+                    latest_body[(endpoint, user)] = len(json.dumps(decoded(response), separators=(',', ':')))
+                    entry['bodyBytes'] += latest_body[(endpoint, user)]
+                    entry['sentBytes'] += len(response.get_data())
+                else:
+                    entry['errors'] += 1
+                if response.headers.get('ETag'):
+                    etags[(endpoint, user)] = response.headers['ETag']
+    return {
+        endpoint: {
+            'requests': entry['requests'],
+            'errors': entry['errors'],
+            'cpuMsPerRequest': round(entry['cpu'] / entry['requests'] * 1000, 3),
+            'bodyBytes': entry['bodyBytes'],
+            'sentBytes': entry['sentBytes'],
+            'bytesSaved': entry['bodyBytes'] - entry['sentBytes'],
+            'notModified': entry['notModified'],
+        }
+        for endpoint, entry in figures.items()
+    }
+
+
+def run(app_module, args, results, report):
+    client = app_module.app.test_client()
+    cache = app_module.response_cache
+    texts = realistic_corpus(500)
+    users = [str(index) for index in range(args.users)]
+
+    # Histories to poll
+    rng = random.Random(1)
+    for user in users:
+        call(client, 'post', '/submit/batch', user, json={'texts': rng.sample(texts, args.history)})
+    app_module.assessment_writer.flush()
+
+    for mode, enabled in (('uncached', False), ('cached', True)):
+        cache.enabled = enabled
+        report[mode] = poll(app_module, users, args.rounds, args.submit_share, texts, seed=2)
+    report['responseCache'] = cache.stats()
+
+    for mode in ('uncached', 'cached'):
+        errors = sum(entry['errors'] for entry in report[mode].values())
+        check(results, f"{mode} polls succeed", not errors, f"{errors} errors")
+
+    # Fresh data after a write
+    user = users[0]
+    headers = {'Accept-Encoding': 'gzip'}
+    before = decoded(call(client, 'get', '/assessments', user, headers=headers)[0])
+    analytics_before = decoded(call(client, 'get', '/admin/analytics', ADMINS[0], headers=headers)[0])
+    call(client, 'post', '/submit', user, json={'text': texts[0]})
+    app_module.assessment_writer.flush()
+    after = decoded(call(client, 'get', '/assessments', user, headers=headers)[0])
+    analytics_after = decoded(call(client, 'get', '/admin/analytics', ADMINS[0], headers=headers)[0])
+    check(results, 'polls after a submit see it',
+          len(after) == len(before) + 1 and analytics_after['totalAssessments'] == analytics_before['totalAssessments'] + 1,
+          f"history {len(before)} -> {len(after)} assessments, analytics total "
+          f"{analytics_before['totalAssessments']} -> {analytics_after['totalAssessments']}")
+
+    # Cached and uncached bodies agree
+    cache.enabled = False
+    plain = {endpoint: call(client, 'get', endpoint, poller)[0].get_json()
+             for endpoint, poller in (('/assessments', user), ('/admin/analytics', ADMINS[0]))}
+    cache.enabled = True
+    mismatched = [endpoint for endpoint, body in plain.items()
+                  if decoded(call(client, 'get', endpoint, user if endpoint == '/assessments' else ADMINS[0],
+                                  headers=headers)[0]) != body]
+    check(results, 'cached bodies match uncached ones', not mismatched,
+          ', '.join(mismatched) or 'history and analytics identical')
+
+    for endpoint in ('/assessments', '/admin/analytics'):
+        uncached, cached = report['uncached'][endpoint], report['cached'][endpoint]
+        check(results, f"{endpoint} polls use less CPU and fewer bytes",
+              cached['cpuMsPerRequest'] < uncached['cpuMsPerRequest'] and cached['sentBytes'] < uncached['sentBytes'],
+              f"{uncached['cpuMsPerRequest']} -> {cached['cpuMsPerRequest']} ms CPU/request, "
+              f"{uncached['sentBytes']} -> {cached['sentBytes']} bytes sent of {cached['bodyBytes']}, "
+              f"{uncached['notModified']} -> {cached['notModified']} 304s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=40, help='users polling their history')
+    parser.add_argument('--history', type=int, default=30, help='assessments per user before polling starts')
+    parser.add_argument('--rounds', type=int, default=30, help='polling rounds per mode')
+    parser.add_argument('--submit-share', type=float, default=0.05, help='chance a user submits in a round')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    server = fake_supabase.start(admins=ADMINS)
+    results = []
+    report = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = start_app(f"http://127.0.0.1:{server.server_port}", workdir)
+        run(app_module, args, results, report)
+        app_module.assessment_writer.flush()
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps({'report': report, 'checks': results}, indent=2))
+    else:
+        for mode in ('uncached', 'cached'):
+            for endpoint, entry in report[mode].items():
+                print(f"{mode:9} {endpoint:17} {entry['requests']:5} requests  {entry['cpuMsPerRequest']:7.3f} ms "
+                      f"CPU/request  {entry['sentBytes']:9} of {entry['bodyBytes']:9} bytes sent  "
+                      f"{entry['notModified']:5} 304s")
+        for result in results:
+            print(f"{'ok  ' if result['passed'] else 'FAIL'} {result['check']}: {result['detail']}")
+    if not all(result['passed'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
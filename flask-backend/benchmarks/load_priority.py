@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Load-test the /submit priority lane: a small share of high-risk submissions
+mixed into rising low-risk load, with admission control on and off.
+
+Each client sends one submission after another. Every text gets a unique
+suffix, so it is scored rather than served from the score cache. A client
+turned away with 429 waits for its Retry-After, like the frontend does.
+Reported per concurrency level and priority class: client p50/p99 latency of
+served requests, how many normal ones were shed, and the server-side p99 and
+mean queue wait read from the admission histograms on /metrics. The server
+figures leave out time the load generator itself spends waiting for CPU, which
+dominates the client figures when both run on a small machine. With admission
+control the high-risk p99 should stay flat as the load rises.
+
+Run from the flask-backend directory:
+    python benchmarks/load_priority.py --levels 4 16 32 48 --duration 8
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import fake_supabase
+from admission import HIGH_PRIORITY, HighRiskPrefilter
+from corpus import realistic_corpus
+from load_test import percentile, start_backend
+
+
+def split_corpus(count):
+    """
+    Realistic texts split by the admission prefilter into high-risk and normal ones
+    """
+    prefilter = HighRiskPrefilter()
+    classes = {'high': [], 'normal': []}
+    for text in realistic_corpus(count):
+        classes['high' if prefilter.priority(text) == HIGH_PRIORITY else 'normal'].append(text)
+    return classes
+
+
+def scrape_admission(port):
+    """
+    The admission histograms from /metrics: ``{(metric, priority): {'buckets': {le: count}, 'sum': s, 'count': n}}``
+    """
+    text = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10).read().decode()
+    series = {}
+    pattern = re.compile(r'(admission_\w+_seconds)_(bucket|sum|count)\{priority="(\w+)"(?:,le="([^"]+)")?\} (\S+)')
+    for line in text.splitlines():
+        match = pattern.match(line)
+        if not match:
+            continue
+        metric, kind, priority, bound, value = match.groups()
+        entry = series.setdefault((metric, priority), {'buckets': {}, 'sum': 0.0, 'count': 0})
+        if kind == 'bucket':
+            entry['buckets'][float(bound)] = int(value)
+        else:
+            entry[kind] = float(value)
+    return series
+
+
+def histogram_delta(before, after, metric, priority):
+    """
+    Upper bucket bounds of the p50 and p99 of the observations made between two
+    scrapes, and their mean, in milliseconds
+    """
+    empty = {'buckets': {}, 'sum': 0.0, 'count': 0}
+    old, new = before.get((metric, priority), empty), after.get((metric, priority), empty)
+    count = new['count'] - old['count']
+    if not count:
+        return {'p50Ms': None, 'p99Ms': None, 'meanMs': None}
+    cumulative = sorted((bound, total - old['buckets'].get(bound, 0)) for bound, total in new['buckets'].items())
+
+    def bound_for(fraction):
+        return next(bound for bound, total in cumulative if total >= fraction * count) * 1000
+
+    return {'p50Ms': bound_for(0.50), 'p99Ms': bound_for(0.99),
+            'meanMs': round((new['sum'] - old['sum']) / count * 1000, 2)}
+
+
+def submit(connection, port, text, headers):
+    """
+    POST one text on a keep-alive connection. Returns ``(connection, status, retry_after)``,
+    with a fresh connection and a None status if the request failed.
+    """
+    try:
+        connection.request('POST', '/submit', body=json.dumps({'text': text}), headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return connection, response.status, float(response.getheader('Retry-After') or 0)
+    except (OSError, http.client.HTTPException):
+        connection.close()
+        return http.client.HTTPConnection('127.0.0.1', port, timeout=30), None, 0
+
+
+def run_level(port, texts, concurrency, duration, high_fraction):
+    samples = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client_loop(client):
+        rng = random.Random(client)
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        headers = {'Authorization': f"Bearer user-{client}", 'Content-Type': 'application/json'}
+        local_samples = []
+        sequence = 0
+        while time.perf_counter() < deadline:
+            priority = 'high' if rng.random() < high_fraction else 'normal'
+            text = f"{rng.choice(texts[priority])} ({client}-{sequence})"
+            sequence += 1
+            started = time.perf_counter()
+            connection, status, retry_after = submit(connection, port, text, headers)
+            local_samples.append((priority, time.perf_counter() - started, status))
+            if status == 429:
+                time.sleep(min(retry_after, max(0, deadline - time.perf_counter())))
+        connection.close()
+        with lock:
+            samples.extend(local_samples)
+
+    before = scrape_admission(port)
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client_loop, args=(client,)) for client in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    after = scrape_admission(port)
+
+    result = {'concurrency': concurrency}
+    for priority in ('high', 'normal'):
+        group = [sample for sample in samples if sample[0] == priority]
+        served = [latency for _, latency, status in group if status == 200]
+        result[priority] = {
+            'served': len(served),
+            'servedPerSecond': round(len(served) / elapsed, 1),
+            'shed': sum(1 for _, _, status in group if status == 429),
+            'errors': sum(1 for _, _, status in group if status not in (200, 429)),
+            'p50Ms': round((percentile(served, 0.50) or 0) * 1000, 1),
+            'p99Ms': round((percentile(served, 0.99) or 0) * 1000, 1),
+            'server': histogram_delta(before, after, 'admission_request_seconds', priority),
+            'queueWait': histogram_delta(before, after, 'admission_queue_wait_seconds', priority),
+        }
+    return result
+
+
+def format_ms(value, prefix=''):
+    return f"{'-':>8}" if value is None else f"{prefix + format(value, 'g'):>8}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--levels', type=int, nargs='+', default=[4, 16, 32, 48], help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=8.0, help='seconds per level')
+    parser.add_argument('--high-fraction', type=float, default=0.05, help='share of high-risk submissions')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='simulated Supabase round-trip')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    texts = split_corpus(4000)
+    supabase = fake_supabase.start(latency=args.latency_ms / 1000)
+    supabase_url = f"http://127.0.0.1:{supabase.server_port}"
+    configurations = {
+        'admission': {},
+        'no admission': {'ADMISSION_CONCURRENCY': '0'},
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, extra_env in configurations.items():
+            backend = start_backend('async', args.port, supabase_url, workdir, extra_env=extra_env)
+            try:
+                results[name] = [run_level(args.port, texts, level, args.duration, args.high_fraction)
+                                 for level in args.levels]
+            finally:
+                backend.terminate()
+                backend.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"POST /submit, async mode, {args.high_fraction:.0%} high-risk, {args.duration:.0f}s per level")
+    for name, levels in results.items():
+        print(f"\n{name}")
+        print(f"{'':>7} {'client p99 ms':>17} {'server p99 ms':>17} {'mean wait ms':>17}")
+        print(f"{'clients':>7} {'high':>8} {'normal':>8} {'high':>8} {'normal':>8} {'high':>8} {'normal':>8} "
+              f"{'normal/s':>9} {'shed':>6} {'errors':>7}")
+        for level in levels:
+            high, normal = level['high'], level['normal']
+            print(f"{level['concurrency']:>7} {high['p99Ms']:>8.1f} {normal['p99Ms']:>8.1f} "
+                  f"{format_ms(high['server']['p99Ms'], '<=')} {format_ms(normal['server']['p99Ms'], '<=')} "
+                  f"{format_ms(high['queueWait']['meanMs'])} {format_ms(normal['queueWait']['meanMs'])} "
+                  f"{normal['servedPerSecond']:>9.1f} {normal['shed']:>6} {high['errors'] + normal['errors']:>7}")
+    print("\nServer p99 is the upper bound of its histogram bucket.")
+
+
+if __name__ == '__main__':
+    main()
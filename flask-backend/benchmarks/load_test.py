@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Load-test /submit under the sync and async serving modes against a local
+Supabase stand-in, reporting requests/sec and latency percentiles per mode
+
+Run from the flask-backend directory:
+    python benchmarks/load_test.py --concurrency 32 --duration 10 --latency-ms 20
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import fake_supabase
+from corpus import SAMPLE_TEXTS
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def start_backend(mode, port, supabase_url, workdir, extra_env=None):
+    """
+    Start the backend under gunicorn in the given serving mode and wait until it answers
+    """
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        SERVING_MODE=mode,
+        SUPABASE_URL=supabase_url,
+        SUPABASE_KEY=fake_supabase.FAKE_KEY,
+        WRITE_BEHIND_SPOOL_DIR=os.path.join(workdir, f"spool-{mode}"),
+        ROLLUP_SNAPSHOT_PATH=os.path.join(workdir, f"rollups-{mode}.json"),
+        COLUMNAR_SNAPSHOT_PATH=os.path.join(workdir, f"columns-{mode}.npz"),
+        # Each client reuses one user and every client sends from 127.0.0.1, so the rate
+        # limits are off unless asked for
+        **{'SUBMIT_RATE_LIMIT': '0', 'HIGH_PRIORITY_RATE_LIMIT': '0', **(extra_env or {})}
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"backend in {mode} mode did not start")
+
+
+def summarize(latencies, errors, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'requestsPerSecond': len(latencies) / elapsed,
+        'p50Ms': (percentile(latencies, 0.50) or 0) * 1000,
+        'p95Ms': (percentile(latencies, 0.95) or 0) * 1000,
+        'p99Ms': (percentile(latencies, 0.99) or 0) * 1000,
+    }
+
+
+def send(connection, port, method, path, body, headers):
+    """
+    Send one request on a keep-alive connection. Returns ``(connection, status)``,
+    with a fresh connection and a None status if the request failed.
+    """
+    try:
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return connection, response.status
+    except (OSError, http.client.HTTPException):
+        connection.close()
+        return http.client.HTTPConnection('127.0.0.1', port, timeout=30), None
+
+
+def run_load(port, make_request, concurrency, duration):
+    """
+    Drive the backend from ``concurrency`` keep-alive clients for ``duration`` seconds.
+    ``make_request(client, sequence)`` returns ``(method, path, body, headers)``.
+    Results cover all requests, and each endpoint separately under ``endpoints``.
+    """
+    samples = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client_loop(client):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        sequence = 0
+        local_samples = []
+        while time.perf_counter() < deadline:
+            method, path, body, headers = make_request(client, sequence)
+            sequence += 1
+            started = time.perf_counter()
+            connection, status = send(connection, port, method, path, body, headers)
+            local_samples.append((f"{method} {path.split('?')[0]}", time.perf_counter() - started, status))
+        connection.close()
+        with lock:
+            samples.extend(local_samples)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client_loop, args=(client,)) for client in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return summarize_samples(samples, elapsed)
+
+
+def summarize_samples(samples, elapsed):
+    """
+    Summarize ``(endpoint, latency, status)`` samples overall and per endpoint.
+    Failed requests (no status, or 4xx/5xx) count as errors and not in the latencies.
+    """
+    def summarize_group(group):
+        latencies = [latency for _, latency, status in group if status is not None]
+        errors = sum(1 for _, _, status in group if status is None or status >= 400)
+        return summarize(latencies, errors, elapsed)
+
+    endpoints = {}
+    for sample in samples:
+        endpoints.setdefault(sample[0], []).append(sample)
+    result = summarize_group(samples)
+    result['endpoints'] = {endpoint: summarize_group(group) for endpoint, group in sorted(endpoints.items())}
+    return result
+
+
+def submit_request(unique_tokens):
+    def make_request(client, sequence):
+        # Unique tokens force a Supabase auth round-trip on every request
+        token = f"user-{client}-{sequence}" if unique_tokens else f"user-{client}"
+        body = json.dumps({'text': SAMPLE_TEXTS[sequence % len(SAMPLE_TEXTS)] or 'Nothing much today.'})
+        return 'POST', '/submit', body, {'Authorization': f"Bearer {token}", 'Content-Type': 'application/json'}
+    return make_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['sync', 'async'])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='simulated Supabase round-trip')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--cached-tokens', action='store_true', help='reuse one token per client')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    supabase = fake_supabase.start(latency=args.latency_ms / 1000)
+    supabase_url = f"http://127.0.0.1:{supabase.server_port}"
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in args.modes:
+            backend = start_backend(mode, args.port, supabase_url, workdir)
+            try:
+                results[mode] = run_load(args.port, submit_request(not args.cached_tokens),
+                                         args.concurrency, args.duration)
+            finally:
+                backend.terminate()
+                backend.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"POST /submit, {args.concurrency} clients, {args.duration:.0f}s, "
+          f"{args.latency_ms:.0f} ms Supabase latency")
+    print(f"{'mode':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, result in results.items():
+        print(f"{mode:>6} {result['requestsPerSecond']:>8.1f} {result['p50Ms']:>8.1f} "
+              f"{result['p99Ms']:>8.1f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,407 @@
+"""
+In-memory columnar snapshot of assessment metadata for ad-hoc analytics queries
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from rollups import EMOTIONS, RISK_LEVELS, parse_timestamp
+
+BUCKET_SECONDS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+MAX_TAG_BITS = 64
+# Tag masks using at most this many bits are histogrammed with bincount, wider ones with unique
+BINCOUNT_TAG_BITS = 20
+
+
+class QueryError(ValueError):
+    """
+    A query the snapshot cannot answer, reported back to the client
+    """
+
+
+class ColumnarSnapshot:
+    """
+    Assessment metadata held as NumPy columns, one entry per assessment:
+    creation time in epoch seconds (int64), risk level code (int8), tags as a
+    bitmask (uint64) and emotions (float32, one column per emotion). Raw text is
+    never loaded. Filters, per-bucket series and tag co-occurrence are answered
+    with vectorized passes over the columns.
+
+    Like the rollups, the columns are loaded from a snapshot file written by the
+    backfill command, or built by streaming the table once, and then kept
+    current from local submissions and a periodic sync that re-reads an
+    ``overlap`` window and skips ids already seen. The table is read with the
+    lock released, which is only taken to append each page, so ``add`` and
+    ``stats`` never wait on Supabase.
+    """
+
+    def __init__(self, fetch_rows, tags=(), snapshot_path=None, sync_interval=60, overlap=600,
+                 initial_capacity=1024):
+        self.fetch_rows = fetch_rows
+        self.snapshot_path = snapshot_path
+        self.sync_interval = sync_interval
+        self.overlap = overlap
+        self.last_sync = None
+        self.untracked_tags = 0
+        self._initial_capacity = initial_capacity
+        self._initial_tags = list(tags)
+        self._lock = threading.RLock()
+        # Taken by syncs and rebuilds, so only one reads the table at a time
+        self._refresh_lock = threading.RLock()
+        # Rows added while a rebuild reads the table, or None
+        self._pending = None
+        self._reset()
+
+    def _reset(self):
+        self.size = 0
+        self._created = np.zeros(self._initial_capacity, dtype=np.int64)
+        self._risk = np.zeros(self._initial_capacity, dtype=np.int8)
+        self._tags = np.zeros(self._initial_capacity, dtype=np.uint64)
+        self._emotions = np.zeros((len(EMOTIONS), self._initial_capacity), dtype=np.float32)
+        self._tag_bits = {}
+        for tag in self._initial_tags:
+            self._tag_bit(tag)
+        self._recent_ids = {}
+        self._watermark = None
+        self._initialized = False
+
+    def _tag_bit(self, tag):
+        bit = self._tag_bits.get(tag)
+        if bit is None and len(self._tag_bits) < MAX_TAG_BITS:
+            bit = self._tag_bits[tag] = len(self._tag_bits)
+        return bit
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        capacity = len(self._created)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._created = np.resize(self._created, capacity)
+        self._risk = np.resize(self._risk, capacity)
+        self._tags = np.resize(self._tags, capacity)
+        emotions = np.zeros((len(EMOTIONS), capacity), dtype=np.float32)
+        emotions[:, :self.size] = self._emotions[:, :self.size]
+        self._emotions = emotions
+
+    def _append(self, rows):
+        """
+        Add rows not seen yet as one block of column values
+        """
+        created, risk, tags, emotions = [], [], [], []
+        risk_codes = {level: code for code, level in enumerate(RISK_LEVELS)}
+        for row in rows:
+            row_id = row.get('id')
+            if row_id in self._recent_ids:
+                continue
+            created_at = int(parse_timestamp(row['created_at']).timestamp())
+            self._recent_ids[row_id] = created_at
+            if self._watermark is None or created_at > self._watermark:
+                self._watermark = created_at
+            created.append(created_at)
+            risk.append(risk_codes.get(row.get('risk_level'), -1))
+            mask = 0
+            for tag in set(row.get('tags') or ()):
+                bit = self._tag_bit(tag)
+                if bit is None:
+                    self.untracked_tags += 1
+                else:
+                    mask |= 1 << bit
+            tags.append(mask)
+            row_emotions = row.get('emotions') or {}
+            emotions.append([row_emotions.get(emotion) or 0.0 for emotion in EMOTIONS])
+        if not created:
+            return 0
+        self._reserve(len(created))
+        start, end = self.size, self.size + len(created)
+        self._created[start:end] = created
+        self._risk[start:end] = risk
+        self._tags[start:end] = np.array(tags, dtype=np.uint64)
+        self._emotions[:, start:end] = np.array(emotions, dtype=np.float32).T
+        self.size = end
+        self._keep_sorted(start, min(created))
+        return len(created)
+
+    def _keep_sorted(self, start, earliest):
+        # Rows are kept in time order so a date range is a slice. Rows from other
+        # processes land a little late, so only the short tail they fall into is re-sorted.
+        created = self._created
+        if not start or earliest >= created[start - 1]:
+            if np.all(created[start + 1:self.size] >= created[start:self.size - 1]):
+                return
+        position = int(np.searchsorted(created[:start], earliest, side='right'))
+        order = np.argsort(created[position:self.size], kind='stable') + position
+        created[position:self.size] = created[order]
+        self._risk[position:self.size] = self._risk[order]
+        self._tags[position:self.size] = self._tags[order]
+        self._emotions[:, position:self.size] = self._emotions[:, order]
+
+    def _prune_recent_ids(self):
+        if self._watermark is None:
+            return
+        cutoff = self._watermark - self.overlap
+        self._recent_ids = {row_id: created_at for row_id, created_at in self._recent_ids.items()
+                            if created_at >= cutoff}
+
+    def _ingest(self, rows, page_size=5000):
+        # The next page is read from the table with the lock released
+        page = []
+        for row in rows:
+            page.append(row)
+            if len(page) >= page_size:
+                with self._lock:
+                    self._append(page)
+                page = []
+        with self._lock:
+            self._append(page)
+            self._prune_recent_ids()
+
+    def add(self, row):
+        """
+        Add an assessment stored by this process
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(row)
+            # Until the columns are built, the next sync will pick the row up from the table
+            elif self._initialized:
+                self._append([row])
+
+    def rebuild(self):
+        """
+        Rebuild the columns from the whole assessments table
+        """
+        with self._refresh_lock:
+            rebuilt = ColumnarSnapshot(self.fetch_rows, self._initial_tags, overlap=self.overlap,
+                                       initial_capacity=self._initial_capacity)
+            with self._lock:
+                self._pending = []
+            try:
+                rebuilt._ingest(self.fetch_rows(None))
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                pending, self._pending = self._pending, None
+                for name in ('size', '_created', '_risk', '_tags', '_emotions', '_tag_bits', '_recent_ids',
+                             '_watermark'):
+                    setattr(self, name, getattr(rebuilt, name))
+                self.untracked_tags += rebuilt.untracked_tags
+                # Rows the read already returned are skipped by their id
+                self._append(pending)
+                self._prune_recent_ids()
+                self._initialized = True
+                self.last_sync = time.time()
+
+    def sync(self):
+        """
+        Pull in rows added since the last sync
+        """
+        with self._refresh_lock:
+            with self._lock:
+                since = None
+                if self._watermark is not None:
+                    since = datetime.fromtimestamp(self._watermark - self.overlap, tz=timezone.utc)
+            self._ingest(self.fetch_rows(since))
+            with self._lock:
+                self.last_sync = time.time()
+
+    def ensure_fresh(self):
+        # Only other refreshes wait here; add(), queries and stats() go on meanwhile
+        with self._refresh_lock:
+            if not self._initialized:
+                if not (self.snapshot_path and self.load(self.snapshot_path)):
+                    self.rebuild()
+                    return
+            if time.time() - self.last_sync >= self.sync_interval:
+                self.sync()
+
+    def save(self, path):
+        with self._lock:
+            tag_names = sorted(self._tag_bits, key=self._tag_bits.get)
+            recent_ids = list(self._recent_ids.items())
+            arrays = {
+                'created': self._created[:self.size],
+                'risk': self._risk[:self.size],
+                'tags': self._tags[:self.size],
+                'emotions': self._emotions[:, :self.size],
+                'tagNames': np.array(tag_names, dtype=str),
+                'recentIds': np.array([str(row_id) for row_id, _ in recent_ids], dtype=str),
+                'recentCreated': np.array([created_at for _, created_at in recent_ids], dtype=np.int64),
+                'watermark': np.array(-1 if self._watermark is None else self._watermark, dtype=np.int64)
+            }
+            # Written while locked, so no row lands between the columns and the watermark
+            temp_path = f"{path}.tmp.npz"
+            with open(temp_path, 'wb') as snapshot:
+                np.savez(snapshot, **arrays)
+        os.replace(temp_path, path)
+
+    def load(self, path):
+        """
+        Load columns saved by the backfill command. Returns False if there is no snapshot.
+        """
+        try:
+            data = np.load(path)
+        except FileNotFoundError:
+            return False
+        with self._lock, data:
+            self._reset()
+            for tag in data['tagNames']:
+                self._tag_bit(str(tag))
+            size = len(data['created'])
+            self._reserve(size)
+            self._created[:size] = data['created']
+            self._risk[:size] = data['risk']
+            self._tags[:size] = data['tags']
+            self._emotions[:, :size] = data['emotions']
+            self.size = size
+            self._recent_ids = dict(zip(data['recentIds'].tolist(), data['recentCreated'].tolist()))
+            watermark = int(data['watermark'])
+            self._watermark = None if watermark < 0 else watermark
+            self._initialized = True
+            # Catch up with everything written since the snapshot on first read
+            self.last_sync = 0
+        return True
+
+    def _tag_mask(self, tags):
+        mask = 0
+        for tag in tags:
+            bit = self._tag_bits.get(tag)
+            if bit is None:
+                raise QueryError(f"Unknown tag: {tag}")
+            mask |= 1 << bit
+        return np.uint64(mask)
+
+    def query(self, start=None, end=None, risk_levels=None, tags=None, tag_mode='all', bucket=None,
+              cooccurrence=False, max_buckets=1000):
+        """
+        Counts, risk and tag distributions and emotion averages of the assessments
+        created in ``[start, end)`` that match the risk level and tag filters,
+        optionally as a series of ``bucket`` periods and with a tag co-occurrence matrix
+        """
+        if tag_mode not in ('all', 'any'):
+            raise QueryError("tagMode must be 'all' or 'any'")
+        if bucket is not None and bucket not in BUCKET_SECONDS:
+            raise QueryError(f"bucket must be one of {', '.join(BUCKET_SECONDS)}")
+        unknown = [level for level in risk_levels or () if level not in RISK_LEVELS]
+        if unknown:
+            raise QueryError(f"Unknown risk levels: {', '.join(unknown)}")
+
+        with self._lock:
+            tag_names = sorted(self._tag_bits, key=self._tag_bits.get)
+            wanted = self._tag_mask(tags) if tags else None
+            created = self._created[:self.size]
+            low = int(np.searchsorted(created, int(start.timestamp()))) if start is not None else 0
+            high = int(np.searchsorted(created, int(end.timestamp()))) if end is not None else self.size
+            created = created[low:high]
+            risk = self._risk[low:high]
+            tag_masks = self._tags[low:high]
+            emotions = self._emotions[:, low:high]
+
+            selected = None
+            if risk_levels:
+                for level in set(risk_levels):
+                    matches = risk == RISK_LEVELS.index(level)
+                    selected = matches if selected is None else selected | matches
+            if wanted is not None:
+                matching = tag_masks & wanted
+                matches = (matching == wanted) if tag_mode == 'all' else (matching != 0)
+                selected = matches if selected is None else selected & matches
+            # Gathering by index is several times faster than boolean indexing
+            chosen = np.flatnonzero(selected) if selected is not None else None
+            if chosen is not None:
+                tag_masks = tag_masks.take(chosen)
+                chosen_risk = risk.take(chosen)
+            else:
+                chosen_risk = risk
+            count = len(tag_masks)
+
+            # Every distinct tag combination and how often it occurs, from which
+            # the per-tag counts and the co-occurrence matrix follow
+            if len(tag_names) <= BINCOUNT_TAG_BITS:
+                histogram = np.bincount(tag_masks.view(np.int64), minlength=1)
+                combinations = np.flatnonzero(histogram)
+                combination_counts = histogram[combinations]
+                combinations = combinations.astype(np.uint64)
+            else:
+                combinations, combination_counts = np.unique(tag_masks, return_counts=True)
+            bits = ((combinations[:, None] >> np.arange(len(tag_names), dtype=np.uint64)) & np.uint64(1)) \
+                .astype(np.int64)
+            tag_counts = combination_counts @ bits
+
+            if selected is None:
+                emotion_sums = emotions.sum(axis=1)
+            else:
+                emotion_sums = emotions @ selected.astype(np.float32)
+            result = {
+                'count': count,
+                'riskDistribution': {level: int(np.count_nonzero(chosen_risk == code))
+                                     for code, level in enumerate(RISK_LEVELS)},
+                'tagDistribution': {tag: int(value) for tag, value in zip(tag_names, tag_counts) if value},
+                # Rounded to hide float32 noise
+                'emotionAverages': {emotion: round(float(value) / max(1, count), 6)
+                                    for emotion, value in zip(EMOTIONS, emotion_sums)},
+            }
+            if cooccurrence:
+                matrix = bits.T @ (bits * combination_counts[:, None])
+                used = [i for i, value in enumerate(tag_counts) if value]
+                result['cooccurrence'] = {
+                    'tags': [tag_names[i] for i in used],
+                    'matrix': matrix[np.ix_(used, used)].tolist()
+                }
+            if bucket is not None:
+                result['series'] = self._series(created, risk, emotions, chosen, start,
+                                                BUCKET_SECONDS[bucket], max_buckets)
+        return result
+
+    def _series(self, created, risk, emotions, chosen, start, width, max_buckets):
+        if not len(created):
+            return []
+        origin = int(start.timestamp()) if start is not None else int(created[0])
+        # Buckets are aligned to UTC midnight (Monday for weeks)
+        epoch_offset = 4 * 86400 if width == BUCKET_SECONDS['week'] else 0
+        origin -= (origin - epoch_offset) % width
+        buckets = (int(created[-1]) - origin) // width + 1
+        if buckets > max_buckets:
+            raise QueryError(f"The range spans {buckets} buckets, the maximum is {max_buckets}")
+        if chosen is not None:
+            created = created.take(chosen)
+            risk = risk.take(chosen)
+            emotions = emotions.take(chosen, axis=1)
+            if not len(created):
+                return []
+        # The rows are in time order, so each bucket is a contiguous run found by
+        # binary search, and summing from each non-empty bucket's first row up to
+        # the next one's adds up exactly that bucket
+        edges = np.searchsorted(created, origin + width * np.arange(buckets + 1))
+        counts = np.diff(edges)
+        filled = np.flatnonzero(counts)
+        starts = edges[filled]
+        levels = np.stack([risk == code for code in range(len(RISK_LEVELS))]).view(np.int8)
+        risk_counts = np.add.reduceat(levels, starts, axis=1, dtype=np.int32).T.tolist()
+        emotion_sums = np.add.reduceat(emotions, starts, axis=1).T.tolist()
+        series = []
+        for i, bucket, risk_row, emotion_row in zip(filled.tolist(), counts[filled].tolist(), risk_counts, emotion_sums):
+            series.append({
+                'start': datetime.fromtimestamp(origin + i * width, tz=timezone.utc).isoformat(),
+                'count': bucket,
+                'riskDistribution': dict(zip(RISK_LEVELS, risk_row)),
+                'emotionAverages': {emotion: round(value / bucket, 6) for emotion, value in zip(EMOTIONS, emotion_row)}
+            })
+        return series
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rows': self.size,
+                'tags': len(self._tag_bits),
+                'untrackedTags': self.untracked_tags,
+                'memoryBytes': int(self._created.nbytes + self._risk.nbytes + self._tags.nbytes +
+                                   self._emotions.nbytes),
+                'lastSync': self.last_sync
+            }
@@ -0,0 +1,123 @@
+"""
+Negation and intensity around keyword hits, read from one tokenization of the text
+"""
+import bisect
+import re
+from itertools import accumulate
+
+# Words, with the apostrophes inside them ("can't", "j'ai"), and the punctuation that ends a clause. Captured,
+# so splitting on it keeps the tokens and what lies between them.
+_TOKEN = re.compile(r"([^\W_]+(?:['’][^\W_]+)*|[.!?;:,])")
+CLAUSE_BREAKS = frozenset('.!?;:,')
+
+
+def tokenize(text):
+    """
+    The tokens of ``text`` and where each starts
+    """
+    parts = _TOKEN.split(text)
+    # Separators and tokens alternate, so the offsets of the odd parts are where the tokens start
+    return parts[1::2], list(accumulate(map(len, parts), initial=0))[1:-1:2]
+
+
+class KeywordContext:
+    """
+    Weighs keyword hits of the ``groups`` that describe a state of mind by the
+    words around them, so "not hopeless" does not count as hopelessness and
+    "so sad" counts more than "sad":
+
+    - A hit is negated when one of ``negations`` (or a word ending in "n't")
+      is among the ``negation_window`` words before it. ``pseudo_negations``
+      like "can't stop" do not negate. A negated hit counts for nothing.
+    - A hit with one of ``intensifiers`` among the ``intensity_window`` words
+      on either side weighs ``intensifier_weight``, else one with a diminisher
+      weighs ``diminisher_weight``.
+
+    Neither window reaches past punctuation or one of ``scope_breaks``. Hits of
+    other groups always count once: those that name a topic ("no money" is
+    still about money), and the high-risk ones, which are never discounted.
+    """
+
+    def __init__(self, groups, negations, pseudo_negations=(), scope_breaks=(), intensifiers=(), diminishers=(),
+                 negation_window=3, intensity_window=2, intensifier_weight=1.5, diminisher_weight=0.5):
+        self.groups = frozenset(groups)
+        self.negations = frozenset(negations)
+        self.pseudo_negations = frozenset(tuple(phrase.split()) for phrase in pseudo_negations)
+        self.scope_breaks = frozenset(scope_breaks) | CLAUSE_BREAKS
+        self.intensifiers = frozenset(intensifiers)
+        self.diminishers = frozenset(diminishers)
+        self.negation_window = negation_window
+        self.intensity_window = intensity_window
+        self.intensifier_weight = intensifier_weight
+        self.diminisher_weight = diminisher_weight
+
+    def merged(self, negations=(), pseudo_negations=(), scope_breaks=(), intensifiers=(), diminishers=()):
+        """
+        A context with the words of other languages added
+        """
+        return KeywordContext(
+            self.groups, self.negations | set(negations),
+            [' '.join(phrase) for phrase in self.pseudo_negations] + list(pseudo_negations),
+            (self.scope_breaks - CLAUSE_BREAKS) | set(scope_breaks), self.intensifiers | set(intensifiers),
+            self.diminishers | set(diminishers), self.negation_window, self.intensity_window,
+            self.intensifier_weight, self.diminisher_weight
+        )
+
+    def _negates(self, tokens, index):
+        token = tokens[index]
+        if token not in self.negations and not token.endswith(("n't", "n’t")):
+            return False
+        return index + 1 == len(tokens) or (token, tokens[index + 1]) not in self.pseudo_negations
+
+    def _window(self, tokens, indexes):
+        for index in indexes:
+            if tokens[index] in self.scope_breaks:
+                return
+            yield index
+
+    def weigh(self, tokens, starts, start, end):
+        """
+        Whether the hit from ``start`` to ``end`` is negated, and its weight
+        """
+        # The hit's first token, which a stem starts inside of
+        first = max(bisect.bisect_right(starts, start) - 1, 0)
+        after = bisect.bisect_left(starts, end)
+        before = range(first - 1, max(first - 1 - self.negation_window, -1), -1)
+        if any(self._negates(tokens, index) for index in self._window(tokens, before)):
+            return True, 0
+        around = [tokens[index] for index in self._window(
+            tokens, range(first - 1, max(first - 1 - self.intensity_window, -1), -1))]
+        around += [tokens[index] for index in self._window(
+            tokens, range(after, min(after + self.intensity_window, len(tokens))))]
+        if not self.intensifiers.isdisjoint(around):
+            return False, self.intensifier_weight
+        if not self.diminishers.isdisjoint(around):
+            return False, self.diminisher_weight
+        return False, 1
+
+    def counts(self, text, hits):
+        """
+        The weighted number of distinct keywords per group among ``hits`` (from
+        ``KeywordMatcher.find_hits``) in ``text``. A keyword found more than once
+        weighs what its strongest occurrence does.
+        """
+        weights = {}
+        tokens = starts = None
+        for keyword, start, end, groups in hits:
+            contextual = groups & self.groups
+            for group in groups - contextual if contextual else groups:
+                weights[group, keyword] = 1
+            if not contextual:
+                continue
+            if tokens is None:
+                tokens, starts = tokenize(text)
+            negated, weight = self.weigh(tokens, starts, start, end)
+            if negated:
+                continue
+            for group in contextual:
+                weights[group, keyword] = max(weight, weights.get((group, keyword), 0))
+        counts = {}
+        for (group, _), weight in weights.items():
+            if weight:
+                counts[group] = counts.get(group, 0) + weight
+        return counts
@@ -0,0 +1,104 @@
+"""
+Helpers for the Supabase client and reading its tables
+"""
+import os
+import threading
+import time
+
+
+def observe_latency(client, histogram):
+    """
+    Record the latency of every PostgREST call made through ``client`` in
+    ``histogram``, labelled by method and table, e.g. ``'GET assessments'``.
+    Latency is measured up to the response headers.
+    """
+    def on_request(request):
+        request.extensions['started'] = time.perf_counter()
+
+    def on_response(response):
+        started = response.request.extensions.get('started')
+        if started is not None:
+            table = response.request.url.path.rsplit('/', 1)[-1]
+            histogram.observe(time.perf_counter() - started, operation=f"{response.request.method} {table}")
+
+    hooks = client.postgrest.session.event_hooks
+    client.postgrest.session.event_hooks = {
+        'request': hooks['request'] + [on_request],
+        'response': hooks['response'] + [on_response]
+    }
+
+
+def stream_pages(client, table, columns, page_size=1000, apply_filters=None, after_id=None):
+    """
+    Yield every matching row of a table one keyset page at a time, in id order,
+    so a large table is never loaded in a single response. ``columns`` must
+    include ``id``; ``apply_filters`` can add filters to each page's query and
+    ``after_id`` resumes after a row already seen.
+    """
+    last_id = after_id
+    while True:
+        query = client.table(table).select(columns)
+        if apply_filters:
+            query = apply_filters(query)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        rows = query.order('id').limit(page_size).execute().data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]['id']
+
+
+def stream_rows(client, table, columns, page_size=1000, apply_filters=None):
+    """
+    Yield every matching row of a table, read one keyset page at a time
+    """
+    for rows in stream_pages(client, table, columns, page_size, apply_filters):
+        yield from rows
+
+
+def order_by(query, ordering):
+    """
+    Sort on several columns at once, e.g. ``'created_at.desc,id.desc'``
+    """
+    query.params = query.params.add('order', ordering)
+    return query
+
+
+def or_filter(query, filters):
+    """
+    PostgREST ``or`` filter, e.g. ``'created_at.lt."2025-01-01",id.lt."abc"'``.
+    This postgrest-py version has no method for it.
+    """
+    query.params = query.params.add('or', f"({filters})")
+    return query
+
+
+class LazyClient:
+    """
+    Stands in for a client that is only created on first use, once per process,
+    so importing the app and forking workers do not pay for client set-up and a
+    forked worker never shares the parent's connections
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._client = self._factory()
+                    self._pid = os.getpid()
+        return self._client
+
+    @property
+    def created(self):
+        return self._pid == os.getpid()
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -0,0 +1,60 @@
+"""
+Gunicorn settings, choosing the serving mode from SERVING_MODE:
+  sync  - the Flask app on gunicorn's sync workers, one request per worker at a time,
+          or on threaded workers while the /submit admission gate is on
+  async - asgi.py on uvicorn workers, many in-flight requests per worker
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# The admission gate orders the submissions one process handles at the same time,
+# so it needs a thread for every slot and every place in its queues
+admission_slots = int(os.environ.get('ADMISSION_CONCURRENCY', 4))
+admission_threads = admission_slots + int(os.environ.get('ADMISSION_RESERVED', 2)) + \
+    int(os.environ.get('ADMISSION_MAX_QUEUE', 32)) + int(os.environ.get('ADMISSION_HIGH_MAX_QUEUE', 64))
+
+if os.environ.get('SERVING_MODE', 'sync') == 'async':
+    wsgi_app = 'asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app:app'
+    if admission_slots > 0:
+        worker_class = 'gthread'
+        threads = int(os.environ.get('GUNICORN_THREADS', admission_threads))
+
+
+def on_starting(server):
+    # A worker serving one request at a time never has two submissions to order,
+    # so the high-risk lane would do nothing
+    if admission_slots <= 0:
+        return
+    if server.cfg.worker_class_str == 'sync' or \
+            (server.cfg.worker_class_str == 'gthread' and server.cfg.threads <= admission_slots):
+        raise RuntimeError(f"The admission gate needs more than ADMISSION_CONCURRENCY={admission_slots} "
+                           f"requests in flight per worker, but the {server.cfg.worker_class_str} workers "
+                           f"run {server.cfg.threads}. Raise GUNICORN_THREADS, use SERVING_MODE=async, "
+                           "or set ADMISSION_CONCURRENCY=0")
+    if 'Uvicorn' in server.cfg.worker_class_str and int(os.environ.get('ASGI_THREADS', 64)) <= admission_slots:
+        raise RuntimeError(f"The admission gate needs ASGI_THREADS above ADMISSION_CONCURRENCY={admission_slots}")
+
+# Import the app once in the master, so every worker shares the pages holding the
+# lexicons and keyword tables instead of loading its own copy
+preload_app = os.environ.get('PRELOAD_APP', 'true').lower() in ('1', 'true', 'yes')
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # Share the Supabase library's pages too; each worker still creates its own client
+        import supabase  # noqa: F401
+    # Objects the workers inherit are moved out of the collector's reach; collections
+    # would otherwise write to them and copy the shared pages into every worker
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Warm up in the background; /ready answers 503 until it is done
+    import app
+    app.start_warmup()
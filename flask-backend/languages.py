@@ -0,0 +1,138 @@
+"""
+Language detection and the sentiment analyzer for texts that are not only in
+English. The French and Kinyarwanda tables themselves are part of the rules,
+see rules.py.
+"""
+import re
+import string
+import unicodedata
+
+from vaderSentiment.vaderSentiment import N_SCALAR, SentimentIntensityAnalyzer, negated
+
+ENGLISH = 'en'
+
+class _Folding(dict):
+    """
+    Translation table from a character to its unaccented form, filled in as
+    characters are first seen
+    """
+
+    def __missing__(self, code):
+        decomposed = unicodedata.normalize('NFKD', chr(code))
+        folded = self[code] = ''.join(char for char in decomposed if not unicodedata.combining(char))
+        return folded
+
+
+# Starts with the letters NFKD leaves alone, and the typographic apostrophe French keyboards produce
+_FOLDING = _Folding({ord(char): folded for char, folded in (('œ', 'oe'), ('Œ', 'OE'), ('æ', 'ae'), ('Æ', 'AE'),
+                                                            ('’', "'"))})
+
+
+def fold_accents(text):
+    """
+    The text without accents (é -> e, œ -> oe) and with plain apostrophes, so a
+    keyword matches whether or not it was typed with them
+    """
+    if text.isascii():
+        return text
+    return text.translate(_FOLDING)
+
+
+def _word_pattern(words):
+    # Longest first, so a word is never cut short by one of its prefixes
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+# Punctuation to split words on; apostrophes keep elided words with the word they are attached to ("j'ai")
+_PUNCTUATION = str.maketrans(dict(dict.fromkeys(string.punctuation.replace("'", '') + '«»“”…', ' '), **{'’': "'"}))
+_VOWELS = frozenset('aeiou')
+
+
+class LanguageDetector:
+    """
+    Finds which of ``languages`` besides English a lowercase text is written
+    in. The text is split into words once, and each language scores points
+    from its spec:
+
+    - ``markers``: common function words, one point each
+    - ``elisions``: elided words like ``j'``, one point each
+    - ``prefixes``: typical word beginnings, half a point per word of five or
+      more letters ending in a vowel, once a marker or elision was found
+    - ``accents``: accented letters, half a point per word containing one
+
+    A language is detected when it has at least one point and ``min_share``
+    points per word of the text, so a stray loanword in an English text does not count.
+    """
+
+    def __init__(self, languages, min_share=0.15):
+        self.min_share = min_share
+        self._specs = [
+            (code, frozenset(spec.markers), frozenset(spec.elisions), tuple(spec.prefixes), frozenset(spec.accents))
+            for code, spec in sorted(languages.items())
+        ]
+
+    def scores(self, text_lower):
+        """
+        Points per language found in the text, and the number of words it has
+        """
+        words = text_lower.translate(_PUNCTUATION).split()
+        points = {}
+        if not words:
+            return points, 0
+        elided = [word[:word.index("'") + 1] for word in words if "'" in word] if "'" in text_lower else []
+        accented = [] if text_lower.isascii() else [word for word in words if not word.isascii()]
+        for code, markers, elisions, prefixes, accents in self._specs:
+            score = float(sum(map(markers.__contains__, words)))
+            if elisions and elided:
+                score += sum(map(elisions.__contains__, elided))
+            # Checked word by word, so only for texts that already look like the language
+            if prefixes and score:
+                score += 0.5 * sum(1 for word in words if len(word) >= 5 and word.startswith(prefixes)
+                                   and word[-1] in _VOWELS)
+            if accents and accented:
+                score += 0.5 * sum(1 for word in accented if not accents.isdisjoint(word))
+            if score:
+                points[code] = score
+        return points, len(words)
+
+    def detect(self, text_lower):
+        """
+        The languages besides English the text is written in, as a sorted tuple
+        """
+        points, words = self.scores(text_lower)
+        if not points:
+            return ()
+        needed = max(1.0, self.min_share * words)
+        return tuple(code for code, score in points.items() if score >= needed)
+
+
+class MultilingualAnalyzer(SentimentIntensityAnalyzer):
+    """
+    VADER with the sentiment words of other languages added to its lexicon and
+    their negation words negating like "not" does. English words keep their
+    English valence where a word is in both lexicons.
+    """
+
+    def __init__(self, base, lexicon, negations, elisions=()):
+        self.lexicon = dict(lexicon)
+        self.lexicon.update(base.lexicon)
+        self.emojis = base.emojis
+        self.lexicon_full_filepath = ''
+        self.emoji_full_filepath = ''
+        self.negations = frozenset(negations)
+        # "j'ai", "n'ubwoba": split elided words off so the word after them is looked up
+        self._elision = re.compile(f"(?<![\\w'])({_word_pattern(elisions)})(?=\\w)", re.IGNORECASE) \
+            if elisions else None
+
+    def polarity_scores(self, text):
+        text = fold_accents(text)
+        if self._elision is not None:
+            text = self._elision.sub(r'\1 ', text)
+        return super().polarity_scores(text)
+
+    def _negation_check(self, valence, words_and_emoticons, start_i, i):
+        valence = SentimentIntensityAnalyzer._negation_check(valence, words_and_emoticons, start_i, i)
+        word = str(words_and_emoticons[i - (start_i + 1)]).lower()
+        if word in self.negations and not negated([word]):
+            valence = valence * N_SCALAR
+        return valence
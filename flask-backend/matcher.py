@@ -0,0 +1,204 @@
+"""
+Single-pass multi-keyword matcher for the assessment keyword tables
+"""
+import bisect
+import re
+
+# A keyword starting or ending with this may run on into a longer word on that side, like a stem
+STEM = '*'
+
+
+def plain_keyword(keyword):
+    """
+    The text of a keyword without its stem markers
+    """
+    return keyword.strip(STEM)
+
+
+def _trie_pattern(keywords):
+    """
+    Compile keywords into a trie-shaped regular expression so the regex engine
+    walks each candidate position once instead of once per keyword.
+    Optional suffixes are greedy, so a match is always the longest keyword
+    starting at that position.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def encode(node):
+        branches = [re.escape(char) + encode(child)
+                    for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + body + ')?' if '' in node else body
+
+    return re.compile(encode(trie))
+
+
+def _word_tables(keywords, word_start):
+    """
+    A pattern finding, at every position where one of ``keywords`` starts (only
+    at the start of a word if ``word_start``), the longest of them, and for each
+    keyword the keywords it starts with, itself included, longest first
+    """
+    pattern = _trie_pattern(keywords).pattern
+    pattern = f"(?<![^\\W_])(?=({pattern}))" if word_start else f"(?=({pattern}))"
+    longest_first = sorted(keywords, key=len, reverse=True)
+    prefixes = {keyword: tuple(other for other in longest_first if keyword.startswith(other)) for keyword in keywords}
+    return pattern, prefixes
+
+
+class KeywordMatcher:
+    """
+    Finds every keyword of a set of named keyword groups in one pass over the text.
+
+    ``find_keywords``, ``find_groups`` and ``contains_any`` keep the plain
+    substring semantics of ``keyword in text``, so a group is hit exactly when
+    one of its keywords would have been found by the equivalent
+    ``any(keyword in text for keyword in group)`` check.
+
+    ``find_hits`` only finds whole words: "sad" is not found in "saddle". A
+    keyword marked with ``*`` at its end, like ``stress*``, may run on into a
+    longer word ("stressed"), and one marked at its start may begin inside a word.
+    """
+
+    def __init__(self, groups):
+        self._index_groups(groups)
+        keywords = sorted(self.keyword_groups)
+        self._pattern = _trie_pattern(keywords)
+        self._word_patterns = [
+            _word_tables(sorted(keyword for keyword, variants in self._variants.items()
+                                if any(open_start == word_start for open_start, _, _ in variants)), not word_start)
+            for word_start in (False, True)
+        ]
+        self._compile_word_patterns()
+        # A hit always finds the longest keyword starting at its position. Every
+        # keyword lying wholly inside it is known up front; only keywords that
+        # start inside a hit and run past its end need another look at the text.
+        self._contained = {
+            keyword: frozenset(other for other in keywords if other in keyword)
+            for keyword in keywords
+        }
+        self._crossing = {}
+        for keyword in keywords:
+            crossing = []
+            for offset in range(1, len(keyword)):
+                tail = keyword[offset:]
+                # Keywords starting with the tail are a contiguous run of the sorted list
+                start = bisect.bisect_left(keywords, tail)
+                end = bisect.bisect_left(keywords, tail + '\U0010ffff', start)
+                candidates = frozenset(other for other in keywords[start:end] if len(other) > len(tail))
+                if candidates:
+                    crossing.append((offset, candidates))
+            if crossing:
+                self._crossing[keyword] = tuple(crossing)
+
+    def _index_groups(self, groups):
+        self.groups = {name: tuple(keywords) for name, keywords in groups.items()}
+        # Keyed by the keyword text without stem markers
+        self.keyword_groups = {}
+        variants = {}
+        for name, keywords in self.groups.items():
+            for keyword in keywords:
+                plain = plain_keyword(keyword)
+                self.keyword_groups.setdefault(plain, set()).add(name)
+                variants.setdefault(plain, {}).setdefault(
+                    (keyword.startswith(STEM), keyword.endswith(STEM)), set()).add(name)
+        # keyword -> ((open start, open end, groups), ...) for each way it is marked
+        self._variants = {
+            keyword: tuple((open_start, open_end, frozenset(names)) for (open_start, open_end), names in marks.items())
+            for keyword, marks in variants.items()
+        }
+
+    def _compile_word_patterns(self):
+        self._word_matchers = [(re.compile(pattern), prefixes) for pattern, prefixes in self._word_patterns
+                               if prefixes]
+
+    def state(self):
+        """
+        The precomputed tables, picklable, for ``from_state`` to restore without
+        recomputing them
+        """
+        return {
+            'groups': self.groups,
+            'pattern': self._pattern.pattern,
+            'contained': self._contained,
+            'crossing': self._crossing,
+            'word_patterns': self._word_patterns
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        matcher = cls.__new__(cls)
+        matcher._index_groups(state['groups'])
+        matcher._pattern = re.compile(state['pattern'])
+        matcher._contained = state['contained']
+        matcher._crossing = state['crossing']
+        matcher._word_patterns = state['word_patterns']
+        matcher._compile_word_patterns()
+        return matcher
+
+    def find_keywords(self, text):
+        """
+        Return the set of keywords that occur anywhere in ``text``
+        """
+        found = set()
+        if not self._contained:
+            return found
+        match = self._pattern.match
+        contained = self._contained
+        crossing = self._crossing
+        for hit in self._pattern.finditer(text):
+            keyword = hit.group()
+            if keyword not in found:
+                found |= contained[keyword]
+            for offset, candidates in crossing.get(keyword, ()):
+                # finditer resumes after this hit, so look for overlapping keywords here
+                if not candidates <= found:
+                    inner = match(text, hit.start() + offset)
+                    if inner:
+                        found |= contained[inner.group()]
+        return found
+
+    def contains_any(self, text):
+        """
+        Whether any keyword occurs in ``text``, stopping at the first one found
+        """
+        return bool(self._contained) and self._pattern.search(text) is not None
+
+    def find_groups(self, text):
+        """
+        Return the names of the groups with at least one keyword in ``text``
+        """
+        hits = set()
+        for keyword in self.find_keywords(text):
+            hits |= self.keyword_groups[keyword]
+        return hits
+
+    def find_hits(self, text):
+        """
+        Every occurrence of a keyword as a whole word (or as the stem it is
+        marked as) in ``text``, as ``(keyword, start, end, groups)`` in no
+        particular order, with the groups whose marking of the keyword matched there
+        """
+        hits = {}
+        length = len(text)
+        variants = self._variants
+        for pattern, prefixes in self._word_matchers:
+            for candidate in pattern.finditer(text):
+                start = candidate.start()
+                starts_word = start == 0 or not text[start - 1].isalnum()
+                for keyword in prefixes[candidate.group(1)]:
+                    end = start + len(keyword)
+                    ends_word = end == length or not text[end].isalnum()
+                    groups = frozenset().union(*(names for open_start, open_end, names in variants[keyword]
+                                                 if (open_start or starts_word) and (open_end or ends_word)))
+                    if groups:
+                        key = (keyword, start)
+                        hits[key] = hits[key] | groups if key in hits else groups
+        return [(keyword, start, start + len(keyword), groups) for (keyword, start), groups in hits.items()]
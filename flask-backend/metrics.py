@@ -0,0 +1,183 @@
+"""
+Low-overhead in-process metrics rendered in the Prometheus text format
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels
+    """
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram with optional labels
+    """
+    type = 'histogram'
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        self._observe(tuple(labels[name] for name in self.labelnames), value)
+
+    def _observe(self, key, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts, then the running sum and count
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe(key, time.perf_counter() - started)
+
+    def timed(self, **labels):
+        """
+        Decorator observing how long each call takes
+        """
+        key = tuple(labels[name] for name in self.labelnames)
+        observe = self._observe
+        clock = time.perf_counter
+
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                started = clock()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    observe(key, clock() - started)
+            return wrapper
+        return decorator
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(series) for key, series in self._values.items()}
+        samples = []
+        for key, series in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key, (('le', _format_value(float(bound))),), cumulative))
+            samples.append((f"{self.name}_sum", key, (), series[-2]))
+            samples.append((f"{self.name}_count", key, (), series[-1]))
+        return samples
+
+
+class GaugeFunction:
+    """
+    Gauge whose values are read from a callback at scrape time. The callback
+    returns a number, or a dict from label value tuples to numbers.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, key, (), value) for key, value in values.items() if value is not None]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'assessment_stage_seconds', 'Time spent in each assessment pipeline stage', ['stage']))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'http_requests_total', 'HTTP requests by endpoint, method and status', ['endpoint', 'method', 'status']))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'http_request_seconds', 'HTTP request latency by endpoint', ['endpoint']))
+ERRORS = REGISTRY.register(Counter(
+    'errors_total', 'Handled errors by exception class', ['exception']))
+SUPABASE_SECONDS = REGISTRY.register(Histogram(
+    'supabase_request_seconds', 'Supabase call latency by operation', ['operation']))
+ADMISSION_WAIT_SECONDS = REGISTRY.register(Histogram(
+    'admission_queue_wait_seconds', 'Time /submit requests waited for a processing slot, by priority class',
+    ['priority']))
+ADMISSION_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'admission_request_seconds', '/submit latency from admission to response, queue wait included, by priority class',
+    ['priority']))
+ADMISSION_REJECTIONS = REGISTRY.register(Counter(
+    'admission_rejections_total', '/submit requests turned away with 429, by reason', ['reason']))
+
+
+def record_error(error):
+    """
+    Count a handled exception by its class
+    """
+    ERRORS.inc(exception=type(error).__name__)
@@ -0,0 +1,201 @@
+"""
+Serialized, pre-compressed response bodies for the read endpoints dashboards
+poll, kept until the data behind them changes
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Both are optional: without orjson bodies are encoded with the json module, and
+# without brotli only gzip is offered
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first when a client accepts several
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def encode_json(data):
+    """
+    Compact UTF-8 JSON for ``data``, with orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+class Payload:
+    """
+    One serialized JSON body and its ETag. Each compressed form is made on the
+    first request that accepts it and kept for the requests after it. Bodies
+    under ``min_compress_size`` bytes are always sent as they are.
+    """
+
+    __slots__ = ('body', 'etag', 'created', 'min_compress_size', '_encoded', '_lock')
+
+    def __init__(self, data, min_compress_size=1024):
+        self.body = encode_json(data)
+        # Weak, since the gzip and brotli forms of the same body share it
+        self.etag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.created = time.monotonic()
+        self.min_compress_size = min_compress_size
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def negotiate(self, accept_encodings):
+        """
+        The encoding to send to a client with these accepted encodings (werkzeug's
+        ``request.accept_encodings``) and the body in it. The encoding is None for the body as it is.
+        """
+        if len(self.body) < self.min_compress_size:
+            return None, self.body
+        for encoding in ENCODINGS:
+            if accept_encodings.quality(encoding) > 0:
+                return encoding, self.encoded(encoding)
+        return None, self.body
+
+    def encoded(self, encoding):
+        body = self._encoded.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(encoding)
+                if body is None:
+                    body = self._encoded[encoding] = _compress(self.body, encoding)
+        return body
+
+
+class PayloadCache:
+    """
+    Payloads by owner (a user id, or a name for data shared by every admin)
+    and view (the query parameters that shape the body), expired after ``ttl``
+    seconds. The least recently used owners are evicted beyond ``max_owners``,
+    or once their uncompressed bodies take more than ``max_bytes``; compressed
+    forms add at most about as much again.
+
+    Two ways keep payloads current:
+
+    - ``invalidate(owner)`` drops an owner's payloads when their data is written.
+      A payload built from data read before the write is not stored: take
+      ``generation(owner)`` before reading and pass it to ``put``.
+    - A payload stored with a ``version`` is only returned for that version,
+      for data that carries its own version counter.
+
+    Writes made by other processes are only seen once ``ttl`` runs out.
+    """
+
+    def __init__(self, ttl=5.0, max_owners=10000, max_bytes=32 * 1024 * 1024, min_compress_size=1024,
+                 enabled=True):
+        self.ttl = ttl
+        self.max_owners = max_owners
+        self.max_bytes = max_bytes
+        self.min_compress_size = min_compress_size
+        self.enabled = enabled and ttl > 0
+        self.counts = {'hits': 0, 'misses': 0, 'invalidations': 0, 'notModified': 0, 'bytesBody': 0, 'bytesSent': 0}
+        # owner -> [generation, {view: (version, payload)}], least recently used first
+        self._owners = OrderedDict()
+        self._bytes = 0
+        self._generations = 0
+        self._lock = threading.Lock()
+
+    def _record(self, owner):
+        record = self._owners.get(owner)
+        if record is None:
+            # Numbered from one counter, so a dropped and recreated record never reuses a generation
+            self._generations += 1
+            record = self._owners[owner] = [self._generations, {}]
+            self._evict()
+        else:
+            self._owners.move_to_end(owner)
+        return record
+
+    def _evict(self):
+        while len(self._owners) > 1 and (len(self._owners) > self.max_owners or self._bytes > self.max_bytes):
+            _, (_, views) = self._owners.popitem(last=False)
+            self._bytes -= sum(len(stored.body) for _, stored in views.values())
+
+    def generation(self, owner):
+        with self._lock:
+            return self._record(owner)[0]
+
+    def get(self, owner, view, version=None):
+        """
+        The payload stored for this owner, view and version, or None
+        """
+        with self._lock:
+            record = self._owners.get(owner)
+            entry = record[1].get(view) if record else None
+            if entry is None or entry[0] != version or time.monotonic() - entry[1].created > self.ttl:
+                self.counts['misses'] += 1
+                return None
+            self._owners.move_to_end(owner)
+            self.counts['hits'] += 1
+            return entry[1]
+
+    def put(self, owner, view, data, generation=None, version=None):
+        """
+        Serialize ``data`` and store it, unless the owner's data was invalidated
+        since ``generation`` was taken. Returns the payload either way.
+        """
+        payload = Payload(data, self.min_compress_size)
+        with self._lock:
+            record = self._record(owner)
+            if generation is not None and record[0] != generation:
+                return payload
+            previous = record[1].pop(view, None)
+            if previous is not None:
+                self._bytes -= len(previous[1].body)
+            record[1][view] = (version, payload)
+            self._bytes += len(payload.body)
+            self._evict()
+        return payload
+
+    def invalidate(self, owner):
+        """
+        Drop every payload of ``owner``, and refuse ones built from data read before now
+        """
+        with self._lock:
+            record = self._owners.get(owner)
+            if record is None:
+                return
+            self._generations += 1
+            record[0] = self._generations
+            self._bytes -= sum(len(stored.body) for _, stored in record[1].values())
+            record[1] = {}
+            self.counts['invalidations'] += 1
+
+    def count_sent(self, payload, body, not_modified=False):
+        """
+        Record what one response sent, against sending the uncompressed body every time
+        """
+        with self._lock:
+            self.counts['bytesBody'] += len(payload.body)
+            self.counts['bytesSent'] += 0 if not_modified else len(body)
+            if not_modified:
+                self.counts['notModified'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counts['hits'] + self.counts['misses']
+            return dict(
+                self.counts,
+                enabled=self.enabled,
+                owners=len(self._owners),
+                bytes=self._bytes,
+                hitRate=self.counts['hits'] / lookups if lookups else 0.0,
+                bytesSaved=self.counts['bytesBody'] - self.counts['bytesSent']
+            )
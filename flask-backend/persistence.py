@@ -0,0 +1,257 @@
+"""
+Write-behind persistence for assessments: a bounded in-memory queue drained by a
+background worker, backed by an append-only spool file that survives restarts
+"""
+import fcntl
+import glob
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from metrics import record_error
+
+
+class WriteBehindQueue:
+    """
+    Accepts rows without waiting for the database and writes them in micro-batches
+    from a background thread.
+
+    Every accepted row is appended to this process's spool file before it is
+    queued, and acknowledged in the spool once written, so rows pending at a crash
+    or during an outage are replayed on the next start. Spool files are locked
+    while their process is alive; any unlocked spool file found at start-up
+    belonged to a process that is gone, and its rows are adopted.
+
+    Failed writes are retried with exponential backoff. Failing batches are halved
+    until a single row fails on its own, and a row that keeps failing
+    ``max_attempts`` times while other rows are written fine is moved to a
+    dead-letter file instead of blocking the queue.
+    The writer must be idempotent on the row ``id`` since a row can be written
+    again after a crash between the write and its acknowledgement.
+    """
+
+    def __init__(self, writer, spool_dir, max_pending=10000, batch_size=100,
+                 flush_interval=0.2, max_retry_delay=30.0, max_attempts=8, fsync=False):
+        self.writer = writer
+        self.spool_dir = spool_dir
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.fsync = fsync
+
+        self.written = 0
+        self.rejected = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0
+        self.last_flush_latency = None
+        self.max_flush_latency = 0.0
+        self._flush_latency_total = 0.0
+        self._flushes = 0
+
+        self._pending = OrderedDict()
+        self._attempts = {}
+        self._batch_limit = batch_size
+        self._retry_delay = 0.0
+        self._acked_since_compaction = 0
+        self._cond = threading.Condition()
+        self._spool = None
+        self._spool_path = None
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Started on first use, and again in a forked child, so each gunicorn worker owns its own spool
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pending.clear()
+            self._attempts.clear()
+            os.makedirs(self.spool_dir, exist_ok=True)
+            name = f"assessments-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"
+            # Lock the spool before it gets a name other processes would try to adopt
+            self._spool = open(os.path.join(self.spool_dir, '.' + name), 'a+', encoding='utf-8')
+            fcntl.flock(self._spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.rename(self._spool.name, os.path.join(self.spool_dir, name))
+            self._spool_path = os.path.join(self.spool_dir, name)
+            self._adopt_orphaned_spools()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _adopt_orphaned_spools(self):
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, 'assessments-*.jsonl'))):
+            if path == self._spool_path:
+                continue
+            try:
+                spool = open(path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                # Adopted by another process in the meantime
+                continue
+            with spool:
+                try:
+                    fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # Still owned by a live process
+                    continue
+                rows = _read_pending(spool)
+                for row in rows.values():
+                    self._pending[row['id']] = row
+                    self._append({'row': row})
+                self._sync()
+                os.remove(path)
+            if rows:
+                print(f"Recovered {len(rows)} unsaved assessments from {path}")
+
+    def _append(self, record):
+        self._spool.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def _sync(self):
+        self._spool.flush()
+        if self.fsync:
+            os.fsync(self._spool.fileno())
+
+    def enqueue(self, row):
+        """
+        Accept a row for writing. Returns False when the queue is full, in which
+        case the caller has to persist the row itself.
+        """
+        self._ensure_started()
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._append({'row': row})
+            self._sync()
+            self._pending[row['id']] = row
+            self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Give a few more rows the chance to join this batch
+                if len(self._pending) < self._batch_limit:
+                    self._cond.wait(timeout=self.flush_interval)
+                batch = list(itertools.islice(self._pending.values(), self._batch_limit))
+
+            started = time.perf_counter()
+            try:
+                self.writer(batch)
+            except Exception as e:
+                self._on_failure(batch, e)
+                time.sleep(self._retry_delay)
+                continue
+            self._on_success(batch, time.perf_counter() - started)
+
+    def _on_success(self, batch, latency):
+        with self._cond:
+            ids = [row['id'] for row in batch]
+            for row_id in ids:
+                self._pending.pop(row_id, None)
+                self._attempts.pop(row_id, None)
+            self._append({'ack': ids})
+            self._sync()
+            self.written += len(batch)
+            self._acked_since_compaction += len(batch)
+            self._flushes += 1
+            self._flush_latency_total += latency
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self._batch_limit = self.batch_size
+            self._retry_delay = 0.0
+            if not self._pending or self._acked_since_compaction >= self.max_pending:
+                self._compact()
+
+    def _on_failure(self, batch, error):
+        record_error(error)
+        print(f"Database error writing {len(batch)} assessments: {error}")
+        with self._cond:
+            self.failed_flushes += 1
+            self._retry_delay = min(self.max_retry_delay, max(0.5, self._retry_delay * 2))
+            if len(batch) > 1:
+                self._batch_limit = max(1, len(batch) // 2)
+                return
+            row = batch[0]
+            attempts, written_before = self._attempts.get(row['id'], (0, self.written))
+            self._attempts[row['id']] = (attempts + 1, written_before)
+            # Let the rows behind it go first
+            self._pending.move_to_end(row['id'])
+            # Only give up on a row that keeps failing while other rows are being written,
+            # so an outage never sends rows to the dead-letter file
+            if attempts + 1 >= self.max_attempts and self.written > written_before:
+                self._dead_letter(row, error)
+
+    def _dead_letter(self, row, error):
+        with open(os.path.join(self.spool_dir, 'dead-letter.jsonl'), 'a', encoding='utf-8') as dead:
+            dead.write(json.dumps({'row': row, 'error': str(error)}, separators=(',', ':')) + '\n')
+        self._pending.pop(row['id'], None)
+        self._attempts.pop(row['id'], None)
+        self._append({'ack': [row['id']]})
+        self._sync()
+        self.dead_lettered += 1
+        self._batch_limit = self.batch_size
+
+    def _compact(self):
+        """
+        Rewrite the spool with only the rows still pending
+        """
+        self._spool.seek(0)
+        self._spool.truncate()
+        for row in self._pending.values():
+            self._append({'row': row})
+        self._sync()
+        self._acked_since_compaction = 0
+
+    def flush(self, timeout=5.0):
+        """
+        Wait until every accepted row has been written, or the timeout passes
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._cond:
+                if not self._pending:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queueDepth': len(self._pending),
+                'maxPending': self.max_pending,
+                'written': self.written,
+                'rejected': self.rejected,
+                'failedFlushes': self.failed_flushes,
+                'deadLettered': self.dead_lettered,
+                'lastFlushLatency': self.last_flush_latency,
+                'avgFlushLatency': self._flush_latency_total / self._flushes if self._flushes else None,
+                'maxFlushLatency': self.max_flush_latency
+            }
+
+
+def _read_pending(spool):
+    """
+    Replay a spool file and return the rows that were never acknowledged
+    """
+    rows = OrderedDict()
+    for line in spool:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # A torn last line from a crash mid-write
+            continue
+        if 'row' in record:
+            rows[record['row']['id']] = record['row']
+        for row_id in record.get('ack', []):
+            rows.pop(row_id, None)
+    return rows
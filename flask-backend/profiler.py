@@ -0,0 +1,61 @@
+"""
+Opt-in sampling profiler for individual requests
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread at a fixed interval from a background
+    thread, so the profiled code runs unmodified. Stacks are counted in the
+    collapsed "outer;inner;leaf count" format read by flame graph tools.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def save(self, directory, label):
+        """
+        Write the collapsed stacks to a new file in ``directory`` and return its path
+        """
+        os.makedirs(directory, exist_ok=True)
+        safe_label = ''.join(char if char.isalnum() else '_' for char in label).strip('_') or 'request'
+        path = os.path.join(directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{safe_label}-{uuid.uuid4().hex[:8]}.folded")
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(self.collapsed())
+        return path
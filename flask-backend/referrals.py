@@ -0,0 +1,165 @@
+"""
+In-memory referral catalog indexed by risk category and tag
+"""
+import os
+import threading
+import time
+
+from metrics import record_error
+
+# Used when the catalog has no referrals for a risk level
+FALLBACK_REFERRALS = {
+    'high': [{
+        'name': 'Crisis Intervention Hotline',
+        'type': 'emergency',
+        'contact': '988 (Suicide & Crisis Lifeline)',
+        'description': 'Immediate crisis support available 24/7',
+        'category': 'high'
+    }, {
+        'name': 'University Emergency Counseling',
+        'type': 'urgent_care',
+        'contact': '+250 788 123 456',
+        'description': 'Emergency mental health services for students',
+        'category': 'high'
+    }],
+    'moderate': [{
+        'name': 'Student Counseling Services',
+        'type': 'counseling',
+        'contact': '+250 788 654 321',
+        'description': 'Professional counseling and support',
+        'category': 'moderate'
+    }],
+    'low': [{
+        'name': 'Wellness Resources',
+        'type': 'self_help',
+        'contact': 'Available online and on campus',
+        'description': 'Self-care tips and stress management resources',
+        'category': 'low'
+    }]
+}
+
+# Specialized fallback referrals added for moderate risk based on tags
+FALLBACK_TAG_REFERRALS = {
+    '#AcademicStress': [{
+        'name': 'Academic Support Center',
+        'type': 'academic_support',
+        'contact': 'academic.support@university.edu',
+        'description': 'Study skills and academic stress management',
+        'category': 'moderate'
+    }],
+    '#FinancialStress': [{
+        'name': 'Financial Aid Office',
+        'type': 'financial_support',
+        'contact': 'finaid@university.edu',
+        'description': 'Financial assistance and budgeting help',
+        'category': 'moderate'
+    }]
+}
+
+
+def _build_index(rows):
+    """
+    Split referrals into general ones per category and tag-specific ones per
+    (category, tag). Rows without tags apply to every submission in their category.
+    """
+    by_category = {}
+    by_tag = {}
+    for row in rows:
+        category = row.get('category')
+        tags = row.get('tags') or []
+        if tags:
+            for tag in tags:
+                by_tag.setdefault((category, tag), []).append(row)
+        else:
+            by_category.setdefault(category, []).append(row)
+    return by_category, by_tag
+
+
+class ReferralCatalog:
+    """
+    Loads every referral once, serves lookups from an immutable indexed snapshot,
+    and refreshes it in the background every ``refresh_interval`` seconds.
+
+    A failed refresh keeps serving the last good snapshot. Each process holds its
+    own catalog, so an explicit refresh only applies to the process handling it;
+    the others pick the change up on their next interval.
+    """
+
+    def __init__(self, loader, refresh_interval=300):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.loaded_at = None
+        self.last_error = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def refresh(self):
+        """
+        Reload the catalog now. Returns True if a new snapshot was installed.
+        """
+        try:
+            rows = self.loader()
+        except Exception as e:
+            self.last_error = str(e)
+            record_error(e)
+            print(f"Error refreshing referral catalog: {e}")
+            return False
+        self._snapshot = _build_index(rows or [])
+        self.loaded_at = time.time()
+        self.last_error = None
+        return True
+
+    def _refresh_forever(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            self.refresh()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A snapshot inherited from a preloading parent is kept, but refreshed
+            self.refresh()
+            # Started on first use so each gunicorn worker runs its own refresher after forking
+            if self.refresh_interval > 0:
+                self._thread = threading.Thread(target=self._refresh_forever, daemon=True)
+                self._thread.start()
+            self._pid = os.getpid()
+
+    def referrals_for(self, risk_level, tags):
+        """
+        Return the referrals for a risk level: the general ones for the category
+        plus any matching one of the detected tags
+        """
+        self._ensure_started()
+        snapshot = self._snapshot
+        referrals = []
+        if snapshot is not None:
+            by_category, by_tag = snapshot
+            referrals = list(by_category.get(risk_level, []))
+            for tag in tags:
+                for referral in by_tag.get((risk_level, tag), []):
+                    if referral not in referrals:
+                        referrals.append(referral)
+        if referrals:
+            return referrals
+
+        referrals = list(FALLBACK_REFERRALS.get(risk_level, FALLBACK_REFERRALS['low']))
+        if risk_level == 'moderate':
+            for tag in tags:
+                referrals.extend(FALLBACK_TAG_REFERRALS.get(tag, []))
+        return referrals
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'loaded': snapshot is not None,
+            'loadedAt': self.loaded_at,
+            'referrals': sum(len(rows) for rows in snapshot[0].values()) if snapshot else 0,
+            'tagReferrals': sum(len(rows) for rows in snapshot[1].values()) if snapshot else 0,
+            'lastError': self.last_error
+        }
@@ -0,0 +1,197 @@
+"""
+Bulk re-scoring of stored assessments with the current scoring rules
+"""
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis import scored_columns, scoring_version
+from db import stream_pages
+from vector_scoring import BatchScorer
+
+SCORED_COLUMNS = ('sentiment_score', 'emotions', 'risk_level', 'risk_factors', 'tags', 'confidence_score')
+# Upserted rows carry the required columns too, so the insert half of the upsert is valid
+RESCORE_COLUMNS = ', '.join(('id', 'user_id', 'text_input', 'created_at', 'rules_version') + SCORED_COLUMNS)
+DEFAULT_CHECKPOINT_PATH = os.environ.get(
+    'RESCORE_CHECKPOINT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rescore-checkpoint.json'))
+
+
+def _same(old, new):
+    # Stored floats may have been rounded by the column type
+    if isinstance(new, float):
+        return isinstance(old, (int, float)) and math.isclose(old, new, rel_tol=1e-6, abs_tol=1e-6)
+    if isinstance(new, dict):
+        return isinstance(old, dict) and old.keys() == new.keys() and all(_same(old[key], new[key]) for key in new)
+    return old == new
+
+
+def new_report(dry_run, version):
+    return {
+        'scoringVersion': version,
+        'dryRun': dry_run,
+        'lastId': None,
+        'scanned': 0,
+        'changed': 0,
+        'stamped': 0,
+        'written': 0,
+        'skipped': 0,
+        'fields': {column: 0 for column in SCORED_COLUMNS},
+        'riskTransitions': {},
+        'tagsAdded': {},
+        'tagsRemoved': {},
+        'samples': []
+    }
+
+
+class Rescorer:
+    """
+    Streams the assessments table in keyset pages, scores each page in vectorized
+    batches and upserts the rows whose score or rules version changed. The next page is read
+    and the previous page written while the current one is scored. Progress is
+    checkpointed after every written page so an interrupted run can resume.
+    """
+
+    def __init__(self, client, batch_size=1000, page_size=1000, write_chunk=500, dry_run=False,
+                 checkpoint_path=DEFAULT_CHECKPOINT_PATH, sample_size=20, scorer=None):
+        self.client = client
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.write_chunk = write_chunk
+        self.dry_run = dry_run
+        self.checkpoint_path = checkpoint_path
+        self.sample_size = sample_size
+        self.scorer = scorer or BatchScorer()
+        self.report = new_report(dry_run, scoring_version(self.scorer.rules))
+
+    def load_checkpoint(self):
+        """
+        Continue from the checkpoint of an earlier run with the same scoring version.
+        Returns whether there was one to continue from.
+        """
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as checkpoint:
+                saved = json.load(checkpoint)
+        except FileNotFoundError:
+            return False
+        if saved.get('scoringVersion') != self.report['scoringVersion']:
+            print(f"Ignoring checkpoint {self.checkpoint_path} for scoring version {saved.get('scoringVersion')}")
+            return False
+        # Counters added since the checkpoint was written start from zero
+        self.report = {**self.report, **saved, 'dryRun': self.dry_run}
+        return True
+
+    def save_checkpoint(self, report):
+        temporary = f"{self.checkpoint_path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as checkpoint:
+            json.dump(report, checkpoint)
+        os.replace(temporary, self.checkpoint_path)
+
+    def diff(self, row, columns):
+        """
+        Count the changes between a stored row and its new score columns and
+        return the names of the columns that changed
+        """
+        report = self.report
+        changed = [column for column in SCORED_COLUMNS if not _same(row.get(column), columns[column])]
+        if not changed:
+            return changed
+        report['changed'] += 1
+        for column in changed:
+            report['fields'][column] += 1
+        if 'risk_level' in changed:
+            transition = f"{row.get('risk_level')}->{columns['risk_level']}"
+            report['riskTransitions'][transition] = report['riskTransitions'].get(transition, 0) + 1
+        if 'tags' in changed:
+            old_tags = set(row.get('tags') or ())
+            new_tags = set(columns['tags'])
+            for tag in new_tags - old_tags:
+                report['tagsAdded'][tag] = report['tagsAdded'].get(tag, 0) + 1
+            for tag in old_tags - new_tags:
+                report['tagsRemoved'][tag] = report['tagsRemoved'].get(tag, 0) + 1
+        if len(report['samples']) < self.sample_size:
+            report['samples'].append({
+                'id': row['id'],
+                'changes': {column: {'old': row.get(column), 'new': columns[column]} for column in changed}
+            })
+        return changed
+
+    def rescore_page(self, rows):
+        """
+        Score one page and return the rows to write back
+        """
+        scorable = [row for row in rows if isinstance(row.get('text_input'), str)]
+        self.report['skipped'] += len(rows) - len(scorable)
+        updates = []
+        for start in range(0, len(scorable), self.batch_size):
+            batch = scorable[start:start + self.batch_size]
+            for row, scored in zip(batch, self.scorer.score(row['text_input'] for row in batch)):
+                columns = scored_columns(scored)
+                if not self.diff(row, columns):
+                    if row.get('rules_version') == columns['rules_version']:
+                        continue
+                    # Same score under the current rules: stamp their version on the row
+                    self.report['stamped'] += 1
+                updates.append({
+                    'id': row['id'],
+                    'user_id': row['user_id'],
+                    'text_input': row['text_input'],
+                    'created_at': row['created_at'],
+                    **columns
+                })
+        return updates
+
+    def write(self, updates):
+        for start in range(0, len(updates), self.write_chunk):
+            self.client.table('assessments').upsert(updates[start:start + self.write_chunk]).execute()
+
+    def run(self, resume=False, limit=None, progress=None):
+        """
+        Re-score every assessment (at most ``limit`` of them) and return the report
+        """
+        if resume and not self.dry_run:
+            self.load_checkpoint()
+        report = self.report
+        started = time.perf_counter()
+        already_scanned = report['scanned']
+        pages = stream_pages(self.client, 'assessments', RESCORE_COLUMNS,
+                             page_size=self.page_size, after_id=report['lastId'])
+        # One thread reads the next page while the other writes the previous one
+        with ThreadPoolExecutor(max_workers=2) as io:
+            next_page = io.submit(next, pages, None)
+            pending_write = None
+            while True:
+                rows = next_page.result()
+                if rows is None:
+                    break
+                if limit is not None:
+                    rows = rows[:max(0, limit - (report['scanned'] - already_scanned))]
+                    if not rows:
+                        break
+                next_page = io.submit(next, pages, None)
+                updates = self.rescore_page(rows)
+                report['scanned'] += len(rows)
+                report['lastId'] = rows[-1]['id']
+                if pending_write is not None:
+                    self._finish(*pending_write)
+                if not self.dry_run:
+                    report['written'] += len(updates)
+                    pending_write = (io.submit(self.write, updates), json.loads(json.dumps(report)))
+                if progress:
+                    progress(report, time.perf_counter() - started)
+            if pending_write is not None:
+                self._finish(*pending_write)
+
+        seconds = time.perf_counter() - started
+        report['seconds'] = round(seconds, 3)
+        report['rowsPerSecond'] = round((report['scanned'] - already_scanned) / seconds, 1) if seconds else None
+        if not self.dry_run and limit is None and os.path.exists(self.checkpoint_path):
+            # A finished run leaves nothing to resume
+            os.remove(self.checkpoint_path)
+        return report
+
+    def _finish(self, write, checkpoint):
+        write.result()
+        if self.checkpoint_path:
+            self.save_checkpoint(checkpoint)
@@ -0,0 +1,276 @@
+"""
+Resilient HTTP transport for the Supabase clients: pooled keep-alive
+connections, per-call timeouts, bounded retries with jitter, a circuit breaker
+and coalescing of identical in-flight reads
+"""
+import random
+import threading
+import time
+
+import httpx
+
+# Gateway errors and timeouts in front of Supabase; other statuses are answers
+RETRYABLE_STATUSES = (502, 503, 504)
+# PostgREST treats these as idempotent; POST is only safe to repeat as an upsert
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'PATCH', 'DELETE')
+# Errors raised before the request could have reached the server
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class SupabaseUnavailable(httpx.TransportError):
+    """
+    Supabase could not be reached: the circuit is open, or every attempt failed.
+    ``retry_after`` is a hint in whole seconds.
+    """
+
+    def __init__(self, message, retry_after=1, request=None):
+        super().__init__(message, request=request)
+        self.retry_after = retry_after
+
+
+def supabase_outage(error):
+    """
+    The ``SupabaseUnavailable`` behind an error, following the chain of errors
+    the client libraries wrap it in, or None
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, SupabaseUnavailable):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failed calls, so further calls
+    fail at once instead of waiting on a service that is down. After
+    ``reset_timeout`` seconds one trial call is let through (half-open); its
+    success closes the circuit and its failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Whether a call may go ahead now
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                self.trips += 1
+                self._trial = False
+
+    def retry_after(self):
+        """
+        Whole seconds until the next trial call
+        """
+        with self._lock:
+            if self.state != self.OPEN:
+                return 1
+            return max(1, int(self.reset_timeout - (self.clock() - self.opened_at)) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'open': int(self.state != self.CLOSED),
+                'consecutiveFailures': self.failures,
+                'trips': self.trips
+            }
+
+
+class _InFlight:
+    __slots__ = ('event', 'status', 'headers', 'body', 'extensions', 'error', 'followers')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+        self.followers = 0
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """
+    httpx transport in front of a keep-alive connection pool of ``pool_size``
+    connections.
+
+    - Reads get ``read_timeout`` and writes ``write_timeout`` seconds per attempt,
+      and one call never takes more than ``total_timeout`` seconds in all.
+    - Connection errors, timeouts and gateway errors are retried up to
+      ``retries`` times with full-jitter exponential backoff. Writes that are not
+      idempotent are only retried when the request never left this process.
+    - Every attempt is reported to the circuit breaker. While it is open, calls
+      raise ``SupabaseUnavailable`` without touching the network, as does a call
+      whose attempts all failed.
+    - Concurrent GETs with the same URL and headers share one upstream request.
+    """
+
+    def __init__(self, name, breaker=None, pool_size=20, keepalive_expiry=30.0, connect_timeout=2.0,
+                 read_timeout=5.0, write_timeout=10.0, pool_timeout=1.0, total_timeout=10.0, retries=2,
+                 backoff=0.05, max_backoff=1.0, coalesce=True, transport=None):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.pool_timeout = pool_timeout
+        self.total_timeout = total_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.coalesce = coalesce
+        self._transport = transport or httpx.HTTPTransport(limits=httpx.Limits(
+            max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=keepalive_expiry))
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.counts = {'requests': 0, 'retries': 0, 'failures': 0, 'rejected': 0, 'coalesced': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def handle_request(self, request):
+        self._count('requests')
+        if self.coalesce and request.method == 'GET':
+            return self._coalesced(request)
+        return self._send(request)
+
+    def _coalesced(self, request):
+        key = (str(request.url), tuple(sorted(request.headers.multi_items())))
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _InFlight()
+            else:
+                call.followers += 1
+                self.counts['coalesced'] += 1
+        if leader:
+            try:
+                response = self._send(request)
+                try:
+                    # The raw bytes, so the client decodes each copy as usual
+                    call.body = b''.join(response.iter_raw())
+                finally:
+                    response.close()
+                call.status, call.headers, call.extensions = response.status_code, response.headers, {
+                    key: value for key, value in response.extensions.items() if key in ('http_version', 'reason_phrase')}
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+                call.event.set()
+        else:
+            call.event.wait()
+        if call.error is not None:
+            if leader:
+                raise call.error
+            retry_after = getattr(call.error, 'retry_after', 1)
+            raise SupabaseUnavailable(str(call.error), retry_after, request=request) from call.error
+        return httpx.Response(call.status, headers=call.headers, stream=httpx.ByteStream(call.body),
+                              extensions=dict(call.extensions))
+
+    def _idempotent(self, request):
+        return request.method in IDEMPOTENT_METHODS or (
+            request.method == 'POST' and 'resolution=merge-duplicates' in request.headers.get('Prefer', ''))
+
+    def _send(self, request):
+        started = time.monotonic()
+        per_attempt = self.read_timeout if request.method in ('GET', 'HEAD') else self.write_timeout
+        idempotent = self._idempotent(request)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count('rejected')
+                raise SupabaseUnavailable(f"Supabase {self.name} circuit is open", self.breaker.retry_after(),
+                                          request=request)
+            remaining = self.total_timeout - (time.monotonic() - started)
+            timeout = max(0.001, min(per_attempt, remaining))
+            request.extensions['timeout'] = httpx.Timeout(
+                timeout, connect=min(timeout, self.connect_timeout), pool=min(timeout, self.pool_timeout)).as_dict()
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError as e:
+                failure, retryable, response = e, idempotent or isinstance(e, UNSENT_ERRORS), None
+            else:
+                if response.status_code not in RETRYABLE_STATUSES:
+                    self.breaker.success()
+                    return response
+                failure, retryable = f"HTTP {response.status_code}", idempotent
+                response.close()
+
+            self.breaker.failure()
+            self._count('failures')
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            attempt += 1
+            if not retryable or attempt > self.retries or time.monotonic() - started + delay >= self.total_timeout:
+                raise SupabaseUnavailable(f"Supabase {self.name} failed after {attempt} attempts: {failure}",
+                                          self.breaker.retry_after(), request=request) from (
+                    failure if isinstance(failure, Exception) else None)
+            self._count('retries')
+            time.sleep(delay)
+
+    def close(self):
+        self._transport.close()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            in_flight = len(self._in_flight)
+        return dict(counts, inFlightReads=in_flight, **self.breaker.stats())
+
+
+def install_transports(client, breaker_factory=CircuitBreaker, **options):
+    """
+    Route the auth and PostgREST calls of a supabase-py client through their own
+    ``ResilientTransport``, each with a circuit breaker from ``breaker_factory``
+    and built with ``options``. Returns the transports by name. Call before
+    adding event hooks to the PostgREST session, since it is replaced.
+    """
+    from gotrue.http_clients import SyncClient as AuthHttpClient
+    from postgrest.utils import SyncClient as RestHttpClient
+
+    transports = {name: ResilientTransport(name, breaker=breaker_factory(), **options) for name in ('rest', 'auth')}
+    session = client.postgrest.session
+    client.postgrest.session = RestHttpClient(base_url=session.base_url, headers=session.headers,
+                                              timeout=session.timeout, transport=transports['rest'])
+    session.close()
+    # supabase-py 1.0 has no option for the auth client's HTTP client
+    client.auth._http_client.close()
+    client.auth._http_client = AuthHttpClient(transport=transports['auth'])
+    return transports
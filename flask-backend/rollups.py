@@ -0,0 +1,262 @@
+"""
+Incremental per-day analytics rollups for the admin dashboard
+"""
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+RISK_LEVELS = ('low', 'moderate', 'high')
+EMOTIONS = ('joy', 'sadness', 'anger', 'fear', 'anxiety')
+
+
+def parse_timestamp(value):
+    """
+    Parse an ISO timestamp from Supabase or datetime.isoformat() into an aware
+    UTC datetime. Timestamps without an offset are taken to be UTC.
+    """
+    value = value.strip().replace(' ', 'T', 1)
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    # Python < 3.11 only accepts 3 or 6 fractional digits
+    value = re.sub(r'\.(\d+)', lambda m: '.' + (m.group(1) + '000000')[:6], value)
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _empty_bucket():
+    return {
+        'count': 0,
+        'risk': {level: 0 for level in RISK_LEVELS},
+        'tags': {},
+        'emotions': {emotion: 0.0 for emotion in EMOTIONS},
+        'pairs': {}
+    }
+
+
+class AnalyticsRollups:
+    """
+    Per-day buckets of risk distribution, tag counts, tag co-occurrence and
+    emotion sums, so analytics are read in O(buckets) instead of O(rows).
+
+    Buckets are built once from a snapshot file written by the backfill command,
+    or from a full streamed read of the table, and then kept current two ways:
+    every local /submit is added as it happens, and every ``sync_interval``
+    seconds rows written by other processes are pulled in. Each sync re-reads an
+    ``overlap`` window before the newest row seen, because write-behind storage
+    can land rows late, and the ids seen in that window are remembered so no row
+    is counted twice.
+
+    ``version`` counts the changes to the buckets, so a payload built from them
+    can be reused until it moves.
+
+    Rows are read from the table without holding the lock that ``add`` takes,
+    so submissions never wait on a sync. The lock is only taken to merge each
+    chunk of rows read. Rows added during a rebuild are held back and merged
+    into the rebuilt buckets.
+    """
+
+    def __init__(self, fetch_rows, snapshot_path=None, sync_interval=60, overlap=600):
+        self.fetch_rows = fetch_rows
+        self.snapshot_path = snapshot_path
+        self.sync_interval = sync_interval
+        self.overlap = timedelta(seconds=overlap)
+        self.last_sync = None
+        self.version = 0
+        self._days = {}
+        self._recent_ids = {}
+        self._watermark = None
+        self._initialized = False
+        # Rows added while a rebuild reads the table, or None
+        self._pending = None
+        self._lock = threading.RLock()
+        # Taken by syncs and rebuilds, so only one reads the table at a time
+        self._refresh_lock = threading.RLock()
+
+    def _add(self, row, created_at):
+        row_id = row.get('id')
+        if row_id in self._recent_ids:
+            return False
+        self._recent_ids[row_id] = created_at
+        self.version += 1
+
+        bucket = self._days.setdefault(created_at.date().isoformat(), _empty_bucket())
+        bucket['count'] += 1
+        if row.get('risk_level') in bucket['risk']:
+            bucket['risk'][row['risk_level']] += 1
+        tags = sorted(set(row.get('tags') or []))
+        for tag in tags:
+            bucket['tags'][tag] = bucket['tags'].get(tag, 0) + 1
+        for i, tag in enumerate(tags):
+            for other in tags[i + 1:]:
+                pair = f"{tag}|{other}"
+                bucket['pairs'][pair] = bucket['pairs'].get(pair, 0) + 1
+        for emotion, value in (row.get('emotions') or {}).items():
+            if emotion in bucket['emotions']:
+                bucket['emotions'][emotion] += value
+        return True
+
+    def _prune_recent_ids(self):
+        if self._watermark is None:
+            return
+        cutoff = self._watermark - self.overlap
+        self._recent_ids = {row_id: created_at for row_id, created_at in self._recent_ids.items()
+                            if created_at >= cutoff}
+
+    def _merge(self, rows):
+        with self._lock:
+            for row in rows:
+                created_at = parse_timestamp(row['created_at'])
+                self._add(row, created_at)
+                if self._watermark is None or created_at > self._watermark:
+                    self._watermark = created_at
+
+    def _ingest(self, rows, chunk_size=1000):
+        # The next rows are read from the table with the lock released
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                self._merge(chunk)
+                chunk = []
+        self._merge(chunk)
+
+    def add(self, row):
+        """
+        Count an assessment stored by this process
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(row)
+            # Until the rollups are built, the next sync will pick the row up from the table
+            elif self._initialized:
+                self._add(row, parse_timestamp(row['created_at']))
+
+    def rebuild(self):
+        """
+        Rebuild every bucket from the whole assessments table
+        """
+        with self._refresh_lock:
+            rebuilt = AnalyticsRollups(self.fetch_rows, overlap=self.overlap.total_seconds())
+            with self._lock:
+                self._pending = []
+            try:
+                rebuilt._ingest(self.fetch_rows(None))
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                pending, self._pending = self._pending, None
+                self._days = rebuilt._days
+                self._recent_ids = rebuilt._recent_ids
+                self._watermark = rebuilt._watermark
+                # Rows the read already returned are skipped by their id
+                for row in pending:
+                    self._add(row, parse_timestamp(row['created_at']))
+                self._prune_recent_ids()
+                self._initialized = True
+                self.version += 1
+                self.last_sync = time.time()
+
+    def sync(self):
+        """
+        Pull in rows added since the last sync
+        """
+        with self._refresh_lock:
+            with self._lock:
+                since = self._watermark - self.overlap if self._watermark else None
+            self._ingest(self.fetch_rows(since))
+            with self._lock:
+                self._prune_recent_ids()
+                self.last_sync = time.time()
+
+    def ensure_fresh(self):
+        # Only other refreshes wait here; add() and summary() go on meanwhile
+        with self._refresh_lock:
+            if not self._initialized:
+                if not (self.snapshot_path and self.load(self.snapshot_path)):
+                    self.rebuild()
+                    return
+            if time.time() - self.last_sync >= self.sync_interval:
+                self.sync()
+
+    def save(self, path):
+        with self._lock:
+            data = {
+                'days': self._days,
+                'watermark': self._watermark.isoformat() if self._watermark else None,
+                'recentIds': {row_id: created_at.isoformat() for row_id, created_at in self._recent_ids.items()}
+            }
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as snapshot:
+            json.dump(data, snapshot)
+        os.replace(temp_path, path)
+
+    def load(self, path):
+        """
+        Load buckets saved by the backfill command. Returns False if there is no snapshot.
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as snapshot:
+                data = json.load(snapshot)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            self._days = data['days']
+            self._watermark = parse_timestamp(data['watermark']) if data['watermark'] else None
+            self._recent_ids = {row_id: parse_timestamp(created_at)
+                                for row_id, created_at in data['recentIds'].items()}
+            self._initialized = True
+            self.version += 1
+            # Catch up with everything written since the snapshot on first read
+            self.last_sync = 0
+        return True
+
+    def summary(self, trend_days=30):
+        """
+        Build the /admin/analytics payload from the buckets
+        """
+        with self._lock:
+            days = sorted(self._days.items())
+            total = sum(bucket['count'] for _, bucket in days)
+            risk_distribution = {level: 0 for level in RISK_LEVELS}
+            tag_distribution = {}
+            emotion_sums = {emotion: 0.0 for emotion in EMOTIONS}
+            tag_correlations = {}
+            for _, bucket in days:
+                for level, count in bucket['risk'].items():
+                    risk_distribution[level] += count
+                for tag, count in bucket['tags'].items():
+                    tag_distribution[tag] = tag_distribution.get(tag, 0) + count
+                for emotion, value in bucket['emotions'].items():
+                    emotion_sums[emotion] += value
+                for pair, count in bucket['pairs'].items():
+                    tag, other = pair.split('|')
+                    tag_correlations.setdefault(tag, {})
+                    tag_correlations.setdefault(other, {})
+                    tag_correlations[tag][other] = tag_correlations[tag].get(other, 0) + count
+                    tag_correlations[other][tag] = tag_correlations[other].get(tag, 0) + count
+
+            recent_trends = []
+            for day, bucket in days[-trend_days:]:
+                count = max(1, bucket['count'])
+                recent_trends.append({
+                    'date': day,
+                    'total': bucket['count'],
+                    'riskDistribution': dict(bucket['risk']),
+                    'emotionAverages': {emotion: value / count for emotion, value in bucket['emotions'].items()}
+                })
+
+        return {
+            'totalAssessments': total,
+            'riskDistribution': risk_distribution,
+            'tagDistribution': tag_distribution,
+            'emotionTrends': {emotion: value / max(1, total) for emotion, value in emotion_sums.items()},
+            'recentTrends': recent_trends,
+            'tagCorrelations': tag_correlations
+        }
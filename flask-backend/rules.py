@@ -0,0 +1,467 @@
+"""
+Versioned scoring rules: the keyword tables and risk thresholds, read from a
+JSON file (plus one file per language besides English) and compiled into
+immutable snapshots that are swapped in when the files change
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from context import KeywordContext
+from languages import ENGLISH, LanguageDetector, fold_accents
+from matcher import STEM, KeywordMatcher, plain_keyword
+from metrics import record_error
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json')
+
+# Keyword groups the scoring code looks up by name
+REQUIRED_KEYWORDS = (
+    'high_risk', 'moderate_risk', 'stress', 'school', 'work', 'anxiety_symptoms', 'conflict', 'partner',
+    'performance', 'academic', 'joy', 'sadness', 'anger', 'fear', 'anxiety', 'anxiety_physical'
+)
+# Tags the scoring code adds from combinations of groups rather than from a keyword table
+DERIVED_TAGS = ('#WorkStress',)
+# Groups whose hits are never discounted by a negation ("never so hopeless" is still hopeless)
+# and whose keywords match inside longer words, as substrings ("self harming", "hopelessly")
+HIGH_RISK_GROUPS = frozenset(('high_risk', '#HighRisk'))
+REQUIRED_THRESHOLDS = {
+    'high': ('compound', 'negativeEmotion', 'stressTags', 'criticalTags'),
+    'severe': ('stressTags',),
+    'moderate': ('compound', 'negativeEmotion', 'stressTags', 'criticalTags'),
+    'low': ('stressTags',)
+}
+
+
+class RulesError(ValueError):
+    """
+    A rules file that cannot be read or is not valid
+    """
+
+
+def rules_path():
+    return os.environ.get('RULES_PATH', DEFAULT_RULES_PATH)
+
+
+def _read_document(path):
+    try:
+        with open(path, encoding='utf-8') as rules_file:
+            document = json.load(rules_file)
+    except (OSError, ValueError) as e:
+        raise RulesError(f"Cannot read rules file {path}: {e}") from e
+    if not isinstance(document, dict):
+        raise RulesError(f"Rules file {path} must hold a JSON object")
+    return document
+
+
+def read_rules(path):
+    """
+    The parsed rules document at ``path``, with the language files it lists
+    (relative to it) read into its ``languages``, so the version and digest
+    cover them too
+    """
+    document = _read_document(path)
+    files = document.get('languages', {})
+    if not isinstance(files, dict) or not all(isinstance(name, str) for name in files.values()):
+        raise RulesError("languages must map language codes to rules file names")
+    directory = os.path.dirname(os.path.abspath(path))
+    document['languages'] = {
+        code: dict(_read_document(os.path.join(directory, name)), file=name) for code, name in files.items()
+    }
+    return document
+
+
+def language_files(path, rules):
+    """
+    The language files read along with the rules file at ``path``
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    return [os.path.join(directory, tables.file) for tables in rules.languages.values()]
+
+
+def _keyword_list(name, keywords):
+    if not isinstance(keywords, list) or not keywords:
+        raise RulesError(f"{name} must be a non-empty list of keywords")
+    for keyword in keywords:
+        # Texts are lowercased before matching, so other keywords could never match
+        if not isinstance(keyword, str) or not keyword.strip() or keyword != keyword.lower():
+            raise RulesError(f"{name} has an invalid keyword {keyword!r}, keywords must be non-empty lowercase text")
+        plain = plain_keyword(keyword)
+        if not plain.strip() or STEM in plain or plain != plain.strip():
+            raise RulesError(f"{name} has an invalid keyword {keyword!r}, {STEM} may only mark a stem at either end")
+    return tuple(keywords)
+
+
+def keyword_groups(document):
+    """
+    Every keyword table of a rules document by group name, tags first, validated
+    """
+    tags = document.get('tags')
+    keywords = document.get('keywords')
+    if not isinstance(tags, dict) or not tags:
+        raise RulesError("tags must map tag names to keyword lists")
+    if not isinstance(keywords, dict):
+        raise RulesError("keywords must map group names to keyword lists")
+    groups = {}
+    for tag, tag_keywords in tags.items():
+        if not tag.startswith('#'):
+            raise RulesError(f"Tag {tag!r} must start with '#'")
+        groups[tag] = _keyword_list(tag, tag_keywords)
+    missing = [name for name in REQUIRED_KEYWORDS if name not in keywords]
+    if missing:
+        raise RulesError(f"keywords is missing {', '.join(missing)}")
+    for name, group_keywords in keywords.items():
+        if name.startswith('#'):
+            raise RulesError(f"Keyword group {name!r} must not start with '#'")
+        groups[name] = _keyword_list(name, group_keywords)
+    for name in HIGH_RISK_GROUPS & groups.keys():
+        groups[name] = _substrings(groups[name])
+    return groups
+
+
+def _substrings(keywords):
+    """
+    ``keywords`` marked as stems at both ends, so they match anywhere in a word
+    """
+    return tuple(dict.fromkeys(f"{STEM}{plain_keyword(keyword)}{STEM}" for keyword in keywords))
+
+
+def _word_list(name, words):
+    if not isinstance(words, list) or not all(isinstance(word, str) and word.strip() and word == word.lower()
+                                              for word in words):
+        raise RulesError(f"{name} must be a list of lowercase words")
+    return tuple(words)
+
+
+def _context_words(where, document):
+    """
+    The negation window words of a rules document: single words, except pseudo
+    negations, which are a negation word and the word after it
+    """
+    words = {}
+    for key in ('scopeBreaks', 'intensifiers', 'diminishers'):
+        words[key] = _word_list(f"{where}.{key}", document.get(key, []))
+        if any(len(word.split()) != 1 for word in words[key]):
+            raise RulesError(f"{where}.{key} must be single words")
+    words['pseudoNegations'] = _word_list(f"{where}.pseudoNegations", document.get('pseudoNegations', []))
+    if any(len(phrase.split()) != 2 for phrase in words['pseudoNegations']):
+        raise RulesError(f"{where}.pseudoNegations must be a negation word followed by one other word")
+    return words
+
+
+def _context(document, groups):
+    """
+    The negation and intensity rules, or None when the rules have no context
+    section or turn ``wordBoundaries`` off, which matches keywords as plain substrings
+    """
+    context = document.get('context')
+    if context is None:
+        return None
+    if not isinstance(context, dict):
+        raise RulesError("context must be an object")
+    if not context.get('wordBoundaries', True):
+        return None
+    names = context.get('groups')
+    if not isinstance(names, list) or not all(name in groups for name in names):
+        raise RulesError("context.groups must list keyword groups and tags")
+    if not HIGH_RISK_GROUPS.isdisjoint(names):
+        raise RulesError("context.groups must not list high_risk or #HighRisk, whose hits always count")
+    numbers = {}
+    for key, default in (('negationWindow', 3), ('intensityWindow', 2)):
+        numbers[key] = context.get(key, default)
+        if isinstance(numbers[key], bool) or not isinstance(numbers[key], int) or numbers[key] < 0:
+            raise RulesError(f"context.{key} must be a number of words")
+    for key, default in (('intensifierWeight', 1.5), ('diminisherWeight', 0.5)):
+        numbers[key] = context.get(key, default)
+        if isinstance(numbers[key], bool) or not isinstance(numbers[key], (int, float)) or numbers[key] <= 0:
+            raise RulesError(f"context.{key} must be a positive number")
+    words = _context_words('context', context)
+    return KeywordContext(
+        names, _word_list('context.negations', context.get('negations', [])), words['pseudoNegations'],
+        words['scopeBreaks'], words['intensifiers'], words['diminishers'], numbers['negationWindow'],
+        numbers['intensityWindow'], numbers['intensifierWeight'], numbers['diminisherWeight']
+    )
+
+
+class LanguageTables:
+    """
+    The tables of one language besides English, validated and with accents
+    folded away from everything matched against folded text
+    """
+
+    __slots__ = ('code', 'file', 'groups', 'sentiment', 'negations', 'context_words', 'markers', 'elisions',
+                 'prefixes', 'accents')
+
+    def __init__(self, code, document, groups):
+        if document.get('language') != code:
+            raise RulesError(f"The {code} rules file says it is for language {document.get('language')!r}")
+        if code == ENGLISH:
+            raise RulesError("English is the base language, its tables are in the main rules file")
+        where = f"languages.{code}"
+        self.code = code
+        self.file = document['file']
+        self.groups = {}
+        # In languages that inflect inside words every keyword is a stem
+        word_boundaries = document.get('wordBoundaries', True)
+        if not isinstance(word_boundaries, bool):
+            raise RulesError(f"{where}.wordBoundaries must be true or false")
+        for key in ('tags', 'keywords'):
+            tables = document.get(key, {})
+            if not isinstance(tables, dict):
+                raise RulesError(f"{where}.{key} must map group names to keyword lists")
+            for name, keywords in tables.items():
+                # Merged into the English groups, so every group must already exist
+                if name not in groups:
+                    raise RulesError(f"{where}.{key} has unknown group {name!r}")
+                keywords = [fold_accents(keyword) for keyword in _keyword_list(f"{where}.{name}", keywords)]
+                self.groups[name] = (_substrings(keywords) if not word_boundaries or name in HIGH_RISK_GROUPS
+                                     else tuple(dict.fromkeys(keywords)))
+        sentiment = document.get('sentiment', {})
+        if not isinstance(sentiment, dict):
+            raise RulesError(f"{where}.sentiment must map words to valences")
+        self.sentiment = {}
+        for word, valence in sentiment.items():
+            if not word or word != word.lower() or len(word.split()) != 1:
+                raise RulesError(f"{where}.sentiment has an invalid word {word!r}, words must be single lowercase words")
+            if isinstance(valence, bool) or not isinstance(valence, (int, float)) or not -4 <= valence <= 4:
+                raise RulesError(f"{where}.sentiment.{word} must be a valence from -4 to 4")
+            self.sentiment[fold_accents(word)] = valence
+        self.negations = tuple(fold_accents(word) for word in _word_list(f"{where}.negations",
+                                                                         document.get('negations', [])))
+        scored = [word for word in self.negations if word in self.sentiment]
+        if scored:
+            raise RulesError(f"{where} negation words must not have a sentiment: {', '.join(scored)}")
+        self.context_words = {key: tuple(fold_accents(word) for word in words)
+                              for key, words in _context_words(where, document).items()}
+        # Detection runs on the text as typed, so markers match with or without accents
+        markers = _word_list(f"{where}.markers", document.get('markers', []))
+        if any(len(word.split()) != 1 for word in markers):
+            raise RulesError(f"{where}.markers must be single words")
+        self.markers = tuple(dict.fromkeys(markers + tuple(fold_accents(word) for word in markers)))
+        self.elisions = _word_list(f"{where}.elisions", document.get('elisions', []))
+        self.prefixes = _word_list(f"{where}.prefixes", document.get('prefixes', []))
+        self.accents = document.get('accents', '')
+        if not isinstance(self.accents, str):
+            raise RulesError(f"{where}.accents must be a string of letters")
+        if not (self.markers or self.elisions or self.prefixes or self.accents):
+            raise RulesError(f"{where} needs markers, elisions, prefixes or accents to be detected by")
+
+
+def merged_groups(rules, codes):
+    """
+    The English keyword groups with those of the languages ``codes`` added, under the same names
+    """
+    groups = {name: list(keywords) for name, keywords in rules.groups.items()}
+    for code in codes:
+        for name, keywords in rules.languages[code].groups.items():
+            groups[name].extend(keywords)
+    return {name: tuple(dict.fromkeys(keywords)) for name, keywords in groups.items()}
+
+
+def _thresholds(document, groups):
+    thresholds = document.get('thresholds')
+    if not isinstance(thresholds, dict):
+        raise RulesError("thresholds must be an object")
+    compiled = {}
+    for level, names in REQUIRED_THRESHOLDS.items():
+        values = thresholds.get(level)
+        if not isinstance(values, dict):
+            raise RulesError(f"thresholds.{level} must be an object")
+        for name in names:
+            value = values.get(name)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise RulesError(f"thresholds.{level}.{name} must be a number")
+        compiled[level] = MappingProxyType({name: values[name] for name in names})
+    tag_sets = {}
+    for name in ('stressTags', 'criticalTags'):
+        listed = document.get(name)
+        if not isinstance(listed, list) or not all(isinstance(tag, str) for tag in listed):
+            raise RulesError(f"{name} must be a list of tag names")
+        unknown = [tag for tag in listed if tag not in groups and tag not in DERIVED_TAGS]
+        if unknown:
+            raise RulesError(f"{name} lists unknown tags {', '.join(unknown)}")
+        tag_sets[name] = frozenset(listed)
+    return MappingProxyType(compiled), tag_sets['stressTags'], tag_sets['criticalTags']
+
+
+class RuleSet:
+    """
+    One compiled, immutable version of the rules. Everything an English text
+    needs is built up front, so scoring it only reads from it. The merged tables
+    for other languages are built on first use by ``compiled``, so processes
+    that only see English never build them.
+    """
+
+    __slots__ = ('version', 'digest', 'groups', 'tags', 'matcher', 'high_risk_matcher', 'context', 'thresholds',
+                 'stress_tags', 'critical_tags', 'languages', 'detector', '_compiled', '_compile_lock')
+
+    def __init__(self, document, matcher=None):
+        version = document.get('version')
+        if not isinstance(version, str) or not version.strip():
+            raise RulesError("version must be a non-empty string")
+        groups = keyword_groups(document)
+        thresholds, stress_tags, critical_tags = _thresholds(document, groups)
+        if matcher is not None and matcher.groups != groups:
+            raise RulesError("The prebuilt matcher was built from other keyword tables")
+        languages = document.get('languages', {})
+        if not isinstance(languages, dict):
+            raise RulesError("languages must map language codes to rules documents")
+        languages = {code: LanguageTables(code, language, groups) for code, language in languages.items()}
+        set_ = object.__setattr__
+        set_(self, 'version', version)
+        set_(self, 'digest', hashlib.sha256(json.dumps(document, sort_keys=True).encode('utf-8')).hexdigest())
+        set_(self, 'groups', MappingProxyType(groups))
+        set_(self, 'tags', tuple(name for name in groups if name.startswith('#')))
+        set_(self, 'matcher', matcher or KeywordMatcher(groups))
+        # What the admission prefilter looks for: every keyword that alone makes a text high
+        # risk, in any language. Match it against folded lowercase text. It is matched as plain
+        # substrings, so negated and run-on mentions are let through to be scored too.
+        high_risk = set(groups['high_risk']) | set(groups.get('#HighRisk', ()))
+        for tables in languages.values():
+            high_risk |= set(tables.groups.get('high_risk', ())) | set(tables.groups.get('#HighRisk', ()))
+        set_(self, 'high_risk_matcher', KeywordMatcher({'high_risk': sorted(high_risk)}))
+        set_(self, 'context', _context(document, groups))
+        set_(self, 'thresholds', thresholds)
+        set_(self, 'stress_tags', stress_tags)
+        set_(self, 'critical_tags', critical_tags)
+        set_(self, 'languages', MappingProxyType(languages))
+        set_(self, 'detector', LanguageDetector(languages))
+        set_(self, '_compiled', {})
+        set_(self, '_compile_lock', threading.Lock())
+
+    def compiled(self, key, build):
+        """
+        The table ``build()`` returns, built once per rule set on first use and
+        cached under ``key``
+        """
+        table = self._compiled.get(key)
+        if table is None:
+            with self._compile_lock:
+                table = self._compiled.get(key)
+                if table is None:
+                    table = self._compiled[key] = build()
+        return table
+
+    def compiled_keys(self):
+        return list(self._compiled)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RuleSet is immutable")
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class RuleBook:
+    """
+    Holds the rules in effect and reloads them when the file at ``path`` or
+    one of its language files changes, checked every ``reload_interval`` seconds by a background thread.
+
+    A reload reads and compiles the whole file before replacing the current
+    snapshot with a single assignment, so requests never wait on a lock and a
+    request that took a snapshot scores with it from start to end. A file that
+    does not load, or that changes the rules without a new version, is logged and
+    the last good rules stay in effect. Each process holds its own rule book.
+    """
+
+    def __init__(self, path, rules, reload_interval=5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.loaded_at = time.time()
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_error = None
+        self.last_reload_seconds = None
+        self._rules = rules
+        self._signature = self._file_signatures()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def current(self):
+        """
+        The rules in effect. Take them once per request and keep using that snapshot.
+        """
+        if self._pid != os.getpid():
+            self._ensure_started()
+        return self._rules
+
+    def reload(self, force=False):
+        """
+        Load the file again if it changed since the last attempt, or always with
+        ``force``. Returns True if new rules were installed.
+        """
+        with self._lock:
+            signature = self._file_signatures()
+            if not force and signature == self._signature:
+                return False
+            self._signature = signature
+            started = time.perf_counter()
+            try:
+                document = read_rules(self.path)
+                current = self._rules
+                # Edits that leave the keyword tables alone keep the compiled matcher
+                same_tables = keyword_groups(document) == dict(current.groups)
+                rules = RuleSet(document, current.matcher if same_tables else None)
+                # The files a new version lists are the ones to watch from now on
+                self._signature = self._file_signatures(rules)
+                if rules.digest == current.digest:
+                    self.last_error = None
+                    return False
+                if rules.version == current.version:
+                    raise RulesError(f"The rules changed but their version is still {rules.version}")
+            except Exception as e:
+                self.failed_reloads += 1
+                self.last_error = str(e)
+                record_error(e)
+                print(f"Error reloading rules from {self.path}: {e}")
+                return False
+            self._rules = rules
+            self.last_reload_seconds = time.perf_counter() - started
+            self.loaded_at = time.time()
+            self.reloads += 1
+            self.last_error = None
+            print(f"Loaded rules version {rules.version} from {self.path}")
+            return True
+
+    def _file_signatures(self, rules=None):
+        paths = [self.path] + language_files(self.path, rules or self._rules)
+        return tuple(_file_signature(path) for path in paths)
+
+    def _reload_forever(self):
+        while True:
+            time.sleep(self.reload_interval)
+            self.reload()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # A reload running in the parent when it forked would leave the copy of its lock held
+            self._lock = threading.Lock()
+            # Started on first use so each gunicorn worker watches the file after forking
+            if self.reload_interval > 0:
+                self._thread = threading.Thread(target=self._reload_forever, daemon=True)
+                self._thread.start()
+            self._pid = os.getpid()
+
+    def stats(self):
+        rules = self._rules
+        return {
+            'version': rules.version,
+            'digest': rules.digest[:12],
+            'path': self.path,
+            'loadedAt': self.loaded_at,
+            'reloads': self.reloads,
+            'failedReloads': self.failed_reloads,
+            'lastReloadSeconds': self.last_reload_seconds,
+            'lastError': self.last_error
+        }
@@ -0,0 +1,104 @@
+"""
+Bounded content-addressed cache of scoring results for repeated submissions
+"""
+import hashlib
+import hmac
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """
+    Normalize only in ways that cannot change any score: surrounding whitespace
+    and line endings
+    """
+    return text.strip().replace('\r\n', '\n')
+
+
+class ScoreCache:
+    """
+    LRU cache of the pure scoring stage (tags, VADER scores, emotions, risk level
+    and factors), bounded by entry count and by the bytes of cached results.
+
+    Keys are HMAC-SHA256 digests of the normalized text and the scoring version,
+    under a random per-process key, so no raw text is held and digests cannot be
+    matched against guessed texts outside the process. Results are stored as JSON
+    so every hit returns a fresh copy.
+
+    Each call may name the scoring version of the rules it scores with, otherwise
+    ``version`` is used. ``set_version`` moves the default on once the rules
+    change. Entries of earlier versions are never hit again and age out.
+    """
+
+    def __init__(self, version, max_entries=10000, max_bytes=16 * 1024 * 1024):
+        self.version = version
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def set_version(self, version):
+        """
+        Make ``version`` the scoring version of calls that do not name one
+        """
+        with self._lock:
+            self.version = version
+
+    def key(self, text, version=None):
+        if version is None:
+            version = self.version
+        message = f"{version}\0{normalize_text(text)}".encode('utf-8')
+        return hmac.new(self._secret, message, hashlib.sha256).digest()
+
+    def get(self, text, version=None):
+        key = self.key(text, version)
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(payload)
+
+    def put(self, text, result, version=None):
+        payload = json.dumps(result, separators=(',', ':'))
+        if len(payload) > self.max_bytes:
+            return
+        key = self.key(text, version)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = payload
+            self._bytes += len(payload)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def get_or_compute(self, text, compute, version=None):
+        result = self.get(text, version)
+        if result is None:
+            result = compute(text)
+            self.put(text, result, version)
+        return result
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'size': len(self._entries),
+                'bytes': self._bytes,
+                'maxEntries': self.max_entries,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,101 @@
+"""
+Process pool that fans CPU-bound scoring of batch submissions out over the cores
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from analysis import score_text
+
+SCORING_WORKERS = int(os.environ.get('SCORING_WORKERS', os.cpu_count() or 1))
+# Seconds a batch may wait on the pool before its remaining texts are scored in-process
+SCORING_POOL_TIMEOUT = float(os.environ.get('SCORING_POOL_TIMEOUT', 30))
+
+# Created on first use so every gunicorn worker gets its own pool after forking
+_executor = None
+
+
+def new_executor(max_workers=SCORING_WORKERS):
+    """
+    A process pool whose workers are forked from a fork server, not from the
+    threaded gunicorn worker, so they never inherit a lock one of its
+    background threads held at the time. The fork server imports the scoring
+    tables once, and each worker starts from that copy.
+    """
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['analysis'])
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = new_executor()
+    return _executor
+
+
+def _drop_executor(executor, stuck=False):
+    """
+    Stop using the shared pool after it broke, or timed out with ``stuck`` workers, which are killed
+    """
+    global _executor
+    if executor is not _executor:
+        return
+    _executor = None
+    if stuck:
+        for process in list(executor._processes.values()):
+            process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _score_chunk(texts):
+    """
+    Score a chunk of texts in a worker process, capturing failures per text
+    """
+    results = []
+    for text in texts:
+        try:
+            results.append((score_text(text), None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def score_texts(texts, executor=None, timeout=SCORING_POOL_TIMEOUT):
+    """
+    Score texts in parallel and return one ``(result, error)`` pair per text, in order.
+    A failed text, or a worker crash, only fails the texts it affects. Once
+    ``timeout`` seconds have passed, the chunks still waiting are scored in this
+    process and the pool, which may be stuck, is replaced on the next call.
+    """
+    if not texts:
+        return []
+    executor = executor or get_executor()
+    workers = getattr(executor, '_max_workers', SCORING_WORKERS)
+    # A few chunks per worker keeps the cores busy without pickling texts one by one
+    chunk_size = max(1, -(-len(texts) // (workers * 4)))
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    futures = [executor.submit(_score_chunk, chunk) for chunk in chunks]
+    deadline = time.monotonic() + timeout
+
+    results = []
+    timed_out = False
+    for chunk, future in zip(chunks, futures):
+        if timed_out:
+            results.extend(_score_chunk(chunk))
+            continue
+        try:
+            results.extend(future.result(timeout=max(0.0, deadline - time.monotonic())))
+        except TimeoutError:
+            print(f"Scoring pool timed out after {timeout}s, scoring the rest of the batch in-process")
+            _drop_executor(executor, stuck=True)
+            timed_out = True
+            results.extend(_score_chunk(chunk))
+        except BrokenProcessPool as e:
+            _drop_executor(executor)
+            results.extend((None, f"BrokenProcessPool: {e}") for _ in chunk)
+        except Exception as e:
+            results.extend((None, f"{type(e).__name__}: {e}") for _ in chunk)
+    return results
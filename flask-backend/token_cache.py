@@ -0,0 +1,130 @@
+"""
+Bounded TTL/LRU cache for verified Supabase access tokens
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+
+class TokenCache:
+    """
+    Remembers the user behind recently verified access tokens so a repeat token
+    does not need another round-trip to the Supabase auth API.
+
+    Entries are keyed by a SHA-256 hash of the token, so raw tokens are never
+    held in memory. An entry expires after ``ttl`` seconds or at the token's own
+    ``exp`` claim, whichever comes first, and the least recently used entry is
+    evicted once ``maxsize`` entries are held. When ``jwt_secret`` is set, cache
+    hits are also checked locally for a valid signature and ``exp``.
+
+    While Supabase is unreachable, ``get(token, stale=True)`` also returns
+    entries up to ``stale_ttl`` seconds past their expiry, but never past the
+    token's own ``exp``.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, jwt_secret=None, stale_ttl=0, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.jwt_secret = jwt_secret
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def _verify_locally(self, token):
+        try:
+            jwt.decode(token, self.jwt_secret, algorithms=['HS256'],
+                       options={'verify_aud': False, 'require': ['exp']})
+            return True
+        except jwt.PyJWTError:
+            return False
+
+    def get(self, token, stale=False):
+        """
+        Return the cached user for ``token``, or None if it has to be verified again
+        """
+        key = self._key(token)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None or (entry[1] <= now and not stale):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry[1] <= now:
+                self.stale_hits += 1
+
+        if self.jwt_secret and not self._verify_locally(token):
+            self.invalidate(token)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry[0]
+
+    def peek(self, token):
+        """
+        The user cached for ``token`` if the entry is fresh, without counting a
+        lookup or checking the signature. Only for decisions that do not grant
+        access, like which rate limit to charge.
+        """
+        with self._lock:
+            entry = self._entries.get(self._key(token))
+        return entry[0] if entry is not None and entry[1] > self.clock() else None
+
+    def put(self, token, user):
+        """
+        Cache the user for a token that was just verified by Supabase
+        """
+        expires_at = self.clock() + self.ttl
+        usable_until = expires_at + self.stale_ttl
+        try:
+            # The signature was checked by Supabase, only the expiry is needed here
+            claims = jwt.decode(token, options={'verify_signature': False})
+            if 'exp' in claims:
+                expires_at = min(expires_at, float(claims['exp']))
+                usable_until = min(usable_until, float(claims['exp']))
+        except jwt.PyJWTError:
+            pass
+
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (user, expires_at, usable_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token):
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'staleHits': self.stale_hits,
+                'hitRate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,97 @@
+"""
+Anonymized request traces for replaying production traffic in benchmarks
+"""
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+
+from analysis import active_rules
+
+# Neutral words that pad anonymized texts out to their original length
+FILLER_WORDS = [
+    'i', 'feel', 'today', 'really', 'my', 'about', 'because', 'everything', 'the',
+    'and', 'with', 'was', 'of', 'it', 'that', 'this', 'week', 'again', 'just', 'think'
+]
+
+# Query parameters that only make sense against the database they were recorded on
+DROPPED_PARAMS = {'cursor'}
+
+
+def anonymize_text(text, rng=random):
+    """
+    Replace a submission with neutral filler of the same length that contains the
+    same detected keywords, so it exercises the same tags and risk rules without
+    any of the original wording
+    """
+    keywords = sorted(active_rules().matcher.find_keywords(text.lower()))
+    rng.shuffle(keywords)
+    words = []
+    length = 0
+    while keywords or length < len(text):
+        if keywords and (rng.random() < 0.3 or length >= len(text)):
+            word = keywords.pop()
+        else:
+            word = rng.choice(FILLER_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:max(len(text), length - 1)]
+
+
+class TraceRecorder:
+    """
+    Appends one JSON line per request to ``path``: wall-clock time, method, path,
+    query, status, an HMAC pseudonym of the user and an anonymized body. Raw
+    texts, tokens and user ids are never written. Several processes can share
+    one file since each record is a single short append.
+    """
+
+    def __init__(self, path, secret=None):
+        self.path = path
+        self.secret = (secret or os.urandom(32).hex()).encode('utf-8')
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def pseudonym(self, user_id):
+        return hmac.new(self.secret, str(user_id).encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+    def record(self, method, path, args, status, user_id=None, body=None):
+        entry = {
+            'ts': time.time(),
+            'method': method,
+            'path': path,
+            'query': {key: value for key, value in args.items() if key not in DROPPED_PARAMS},
+            'status': status,
+            'user': self.pseudonym(user_id) if user_id is not None else None,
+        }
+        if isinstance(body, dict):
+            if isinstance(body.get('text'), str):
+                entry['body'] = {'text': anonymize_text(body['text'])}
+            elif isinstance(body.get('texts'), list):
+                entry['body'] = {'texts': [anonymize_text(text) if isinstance(text, str) else text
+                                           for text in body['texts']]}
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._pid != os.getpid():
+                self._file = open(self.path, 'a', encoding='utf-8')
+                self._pid = os.getpid()
+            self._file.write(line)
+            self._file.flush()
+
+
+def load_trace(path):
+    """
+    Read a trace file and return its requests in time order, each with an
+    ``offset`` in seconds from the first request
+    """
+    with open(path, encoding='utf-8') as trace:
+        entries = [json.loads(line) for line in trace if line.strip()]
+    entries.sort(key=lambda entry: entry['ts'])
+    start = entries[0]['ts'] if entries else 0
+    for entry in entries:
+        entry['offset'] = entry['ts'] - start
+    return entries
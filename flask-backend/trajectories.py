@@ -0,0 +1,256 @@
+"""
+Per-user risk trajectories updated in O(1) per assessment
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from metrics import record_error
+from rollups import EMOTIONS, parse_timestamp
+
+ELEVATED_LEVELS = ('moderate', 'high')
+
+
+class UserTrajectory:
+    """
+    Running state of one user's assessments: a fast and a slow exponentially
+    weighted moving average of the compound score, a slow one per emotion, and
+    the times of the moderate and high results inside the escalation window.
+    Until it is seeded from stored history, ``pending`` holds the rows added to it.
+    """
+
+    __slots__ = ('tracked', 'compound_fast', 'compound_slow', 'emotions', 'elevated', 'recent',
+                 'seen', 'seen_limit', 'latest', 'synced_at', 'pending')
+
+    def __init__(self):
+        self.tracked = 0
+        self.compound_fast = None
+        self.compound_slow = None
+        self.emotions = {}
+        self.elevated = deque()
+        self.recent = {level: 0 for level in ELEVATED_LEVELS}
+        self.seen = {}
+        self.seen_limit = 64
+        self.latest = None
+        self.synced_at = 0.0
+        self.pending = []
+
+    def add(self, row, alpha_fast, alpha_slow, window):
+        """
+        Fold one stored assessment into the averages. Returns False for a row already counted.
+        """
+        row_id = row.get('id')
+        if row_id in self.seen:
+            return False
+        created_at = parse_timestamp(row['created_at'])
+        self.seen[row_id] = created_at
+        self.tracked += 1
+
+        compound = row.get('sentiment_score')
+        if isinstance(compound, (int, float)):
+            if self.compound_slow is None:
+                self.compound_fast = self.compound_slow = float(compound)
+            else:
+                self.compound_fast += alpha_fast * (compound - self.compound_fast)
+                self.compound_slow += alpha_slow * (compound - self.compound_slow)
+        for emotion, value in (row.get('emotions') or {}).items():
+            if emotion in EMOTIONS and isinstance(value, (int, float)):
+                current = self.emotions.get(emotion)
+                self.emotions[emotion] = value if current is None else current + alpha_slow * (value - current)
+
+        if row.get('risk_level') in ELEVATED_LEVELS:
+            entry = (created_at, row['risk_level'])
+            if not self.elevated or entry >= self.elevated[-1]:
+                self.elevated.append(entry)
+            else:
+                # Rows synced from other processes can arrive out of order
+                self.elevated.insert(bisect.bisect(self.elevated, entry), entry)
+            self.recent[row['risk_level']] += 1
+        if self.latest is None or created_at > self.latest:
+            self.latest = created_at
+        self.prune(window, self.latest)
+        if len(self.seen) > self.seen_limit:
+            # Only rows near the newest one can be read again by a refresh
+            cutoff = self.latest - window
+            self.seen = {row_id: seen_at for row_id, seen_at in self.seen.items() if seen_at >= cutoff}
+            self.seen_limit = max(64, 2 * len(self.seen))
+        return True
+
+    def prune(self, window, now):
+        """
+        Forget moderate and high results older than ``window`` before ``now``
+        """
+        cutoff = now - window
+        while self.elevated and self.elevated[0][0] < cutoff:
+            self.recent[self.elevated.popleft()[1]] -= 1
+
+
+class TrajectoryStore:
+    """
+    Keeps a ``UserTrajectory`` per recently active user, so trend questions are
+    answered without re-reading a user's history.
+
+    A user's trajectory is seeded from their latest ``seed_size`` assessments the
+    first time this process sees them. Older history barely moves the averages
+    (its weight has decayed to (1 - alpha) ** seed_size). After that every
+    assessment stored by this process is added as it happens, and assessments
+    stored by other processes are pulled in with a small read of the rows since
+    the newest one seen, at most every ``refresh_interval`` seconds per user.
+
+    ``record``, which /submit calls, never waits for those reads: they run on
+    ``executor``, and until a seed arrives the trajectory holds only the
+    assessments recorded since. ``trend`` waits for a seed or refresh that is due.
+    Escalation means at least ``escalation_threshold`` moderate or high results
+    within ``escalation_window``. The least recently used users are evicted once
+    ``max_users`` are held.
+    """
+
+    def __init__(self, fetch_recent, alpha_fast=0.5, alpha_slow=0.2, escalation_window=timedelta(days=7),
+                 escalation_threshold=3, trend_margin=0.15, seed_size=20, refresh_interval=60,
+                 overlap=timedelta(minutes=10), max_users=10000, clock=time.time, executor=None):
+        self.fetch_recent = fetch_recent
+        self.alpha_fast = alpha_fast
+        self.alpha_slow = alpha_slow
+        self.escalation_window = escalation_window
+        self.escalation_threshold = escalation_threshold
+        self.trend_margin = trend_margin
+        self.seed_size = seed_size
+        self.refresh_interval = refresh_interval
+        self.overlap = overlap
+        self.max_users = max_users
+        self.clock = clock
+        self.executor = executor or ThreadPoolExecutor(max_workers=2, thread_name_prefix='trajectories')
+        self.seeds = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self._users = OrderedDict()
+        # Users whose seed or refresh read is running
+        self._syncing = set()
+        self._lock = threading.Lock()
+
+    def _fresh(self, user_id, wait):
+        """
+        The user's trajectory, with a seed or a catch-up with other processes
+        started when due. With ``wait`` the read is done before returning,
+        otherwise it runs in the background and the trajectory is returned as it is.
+        """
+        now = self.clock()
+        with self._lock:
+            trajectory = self._users.get(user_id)
+            if trajectory is None:
+                trajectory = self._users[user_id] = UserTrajectory()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._users.move_to_end(user_id)
+            if now - trajectory.synced_at < self.refresh_interval or user_id in self._syncing:
+                return trajectory
+            self._syncing.add(user_id)
+            since = trajectory.latest - self.overlap if trajectory.pending is None and trajectory.latest else None
+        if wait:
+            return self._sync(user_id, since, now) or trajectory
+        self.executor.submit(self._sync, user_id, since, now)
+        return trajectory
+
+    def _sync(self, user_id, since, now):
+        """
+        Read the user's rows since ``since``, or their latest ones for a seed, into their trajectory
+        """
+        # Read outside the lock so one slow read does not hold up other users
+        try:
+            rows = sorted(self.fetch_recent(user_id, since, self.seed_size),
+                          key=lambda row: parse_timestamp(row['created_at']))
+        except Exception as e:
+            print(f"Error loading assessment trajectory: {e}")
+            record_error(e)
+            rows = None
+
+        with self._lock:
+            self._syncing.discard(user_id)
+            trajectory = self._users.get(user_id)
+            if trajectory is None:
+                return None
+            if rows is None:
+                # Tried again after the refresh interval; an unseeded trajectory keeps what was recorded
+                trajectory.synced_at = now
+                return trajectory
+            if trajectory.pending is not None:
+                # Stored history first, then what was recorded while it was read, so the averages see them in order
+                seeded = UserTrajectory()
+                seeded.pending = None
+                for row in rows + trajectory.pending:
+                    seeded.add(row, self.alpha_fast, self.alpha_slow, self.escalation_window)
+                trajectory = self._users[user_id] = seeded
+                self.seeds += 1
+            else:
+                for row in rows:
+                    trajectory.add(row, self.alpha_fast, self.alpha_slow, self.escalation_window)
+                self.refreshes += 1
+            trajectory.synced_at = now
+            return trajectory
+
+    def record(self, user_id, row):
+        """
+        Add an assessment stored by this process and return the user's updated
+        trend, without waiting on a read
+        """
+        trajectory = self._fresh(user_id, wait=False)
+        with self._lock:
+            # A seed may have replaced it meanwhile
+            trajectory = self._users.get(user_id, trajectory)
+            trajectory.add(row, self.alpha_fast, self.alpha_slow, self.escalation_window)
+            if trajectory.pending is not None:
+                trajectory.pending.append(row)
+            return self._summary(trajectory)
+
+    def trend(self, user_id):
+        """
+        The user's current trend
+        """
+        trajectory = self._fresh(user_id, wait=True)
+        with self._lock:
+            return self._summary(self._users.get(user_id, trajectory))
+
+    def _summary(self, trajectory):
+        # Results age out of the window even without new assessments
+        trajectory.prune(self.escalation_window, parse_timestamp(datetime.now().isoformat()))
+        direction = 'stable'
+        if trajectory.compound_slow is not None:
+            if trajectory.compound_fast < trajectory.compound_slow - self.trend_margin:
+                direction = 'worsening'
+            elif trajectory.compound_fast > trajectory.compound_slow + self.trend_margin:
+                direction = 'improving'
+        return {
+            'tracked': trajectory.tracked,
+            'sentimentAverage': trajectory.compound_slow,
+            'recentSentimentAverage': trajectory.compound_fast,
+            'direction': direction,
+            'emotionAverages': dict(trajectory.emotions),
+            'windowDays': self.escalation_window.total_seconds() / 86400,
+            'recentRisk': dict(trajectory.recent),
+            'escalating': len(trajectory.elevated) >= self.escalation_threshold,
+            'lastAssessmentAt': trajectory.latest.isoformat() if trajectory.latest else None
+        }
+
+    def escalation_factor(self, trend):
+        """
+        Risk factor describing an escalating trend, or None
+        """
+        if not trend['escalating']:
+            return None
+        count = sum(trend['recentRisk'].values())
+        return f"Escalating pattern: {count} moderate or high risk assessments in the last {trend['windowDays']:g} days"
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'maxUsers': self.max_users,
+                'seeds': self.seeds,
+                'refreshes': self.refreshes,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,320 @@
+"""
+Batch scoring with NumPy: VADER's lexicon lookup and rules applied to every token
+of a batch at once. Results are identical to scoring each text with score_text.
+"""
+import math
+import string
+
+import numpy as np
+from vaderSentiment.vaderSentiment import (
+    BOOSTER_DICT, C_INCR, N_SCALAR, NEGATE, SPECIAL_CASES, normalize
+)
+
+from analysis import TextFeatures, active_rules, analyzer, match_keywords, score_features, score_text
+
+# Words VADER's rules look for by name
+_RULE_WORDS = ('no', 'or', 'nor', 'kind', 'of', 'least', 'at', 'very', 'but',
+               'never', 'so', 'this', 'without', 'doubt')
+MAX_CACHED_TOKENS = 1_000_000
+
+
+class VectorSentiment:
+    """
+    VADER's ``polarity_scores`` for a batch of texts.
+
+    Each text is split into tokens exactly like VADER does and every token is
+    mapped to an id in a growing vocabulary with per-id lexicon, booster and
+    negation attributes. The valence rules, which only look up to three tokens
+    back and two ahead, then run as array operations over all tokens of the batch.
+    The float operations are applied in VADER's order and the per-text sums add
+    tokens one at a time like VADER's loops, so scores match to the last bit.
+    """
+
+    def __init__(self, lexicon, emojis):
+        self.lexicon = lexicon
+        self.emojis = {char: description for char, description in emojis.items() if len(char) == 1}
+        self._emoji_chars = frozenset(self.emojis)
+        # Id 0 stands for "no token here" before the start or after the end of a text
+        self._ids = {}
+        self._in_lexicon = [False]
+        self._valence = [0.0]
+        self._is_booster = [False]
+        self._booster = [0.0]
+        self._negates = [False]
+        self._arrays = None
+        # Raw token -> vocabulary id * 2 + ALL CAPS flag
+        self._codes = {}
+        self.rule = {word: self._intern(word) for word in _RULE_WORDS}
+        self.special_cases = [(tuple(self._intern(word) for word in phrase.split()), value)
+                              for phrase, value in SPECIAL_CASES.items()]
+        self.booster_phrases = [(tuple(self._intern(word) for word in phrase.split()), value)
+                                for phrase, value in BOOSTER_DICT.items() if ' ' in phrase]
+
+    def _intern(self, word):
+        word_id = self._ids.get(word)
+        if word_id is None:
+            word_id = self._ids[word] = len(self._valence)
+            self._in_lexicon.append(word in self.lexicon)
+            self._valence.append(self.lexicon.get(word, 0.0))
+            self._is_booster.append(word in BOOSTER_DICT)
+            self._booster.append(BOOSTER_DICT.get(word, 0.0))
+            self._negates.append(word in NEGATE or "n't" in word)
+            self._arrays = None
+        return word_id
+
+    def _vocabulary_arrays(self):
+        if self._arrays is None:
+            self._arrays = (np.array(self._in_lexicon, dtype=bool), np.array(self._valence),
+                            np.array(self._is_booster, dtype=bool), np.array(self._booster),
+                            np.array(self._negates, dtype=bool))
+        return self._arrays
+
+    def _replace_emojis(self, text):
+        # Same spacing rules as VADER's emoji pass
+        replaced = []
+        prev_space = True
+        for char in text:
+            description = self.emojis.get(char)
+            if description is not None:
+                if not prev_space:
+                    replaced.append(' ')
+                replaced.append(description)
+                prev_space = False
+            else:
+                replaced.append(char)
+                prev_space = char == ' '
+        return ''.join(replaced)
+
+    def _token_code(self, token):
+        # VADER strips surrounding punctuation unless that leaves two characters or fewer
+        stripped = token.strip(string.punctuation)
+        if len(stripped) > 2:
+            token = stripped
+        lower = token.lower()
+        code = (self._ids.get(lower) or self._intern(lower)) * 2 + token.isupper()
+        if len(self._codes) >= MAX_CACHED_TOKENS:
+            self._codes.clear()
+        self._codes[token] = code
+        return code
+
+    def polarity_scores(self, texts):
+        """
+        Return VADER's score dict for each text
+        """
+        cleaned = []
+        lengths = []
+        codes = []
+        cached = self._codes.get
+        token_code = self._token_code
+        for text in texts:
+            if not self._emoji_chars.isdisjoint(text):
+                text = self._replace_emojis(text)
+            text = text.strip()
+            row = [cached(token) or token_code(token) for token in text.split()]
+            cleaned.append(text)
+            lengths.append(len(row))
+            codes.extend(row)
+
+        # Each token is coded as its vocabulary id times two plus its ALL CAPS flag
+        codes = np.array(codes, dtype=np.int64)
+        ids = codes >> 1
+        lengths = np.array(lengths, dtype=np.int64)
+        sentiments = self._token_sentiments(ids, (codes & 1).astype(bool), lengths)
+        row_of_token = np.repeat(np.arange(len(lengths)), lengths)
+        rows_with_but = np.zeros(len(lengths), dtype=bool)
+        rows_with_but[row_of_token[ids == self.rule['but']]] = True
+        # bincount adds the weights one by one in token order, like VADER's loops
+        totals = np.bincount(row_of_token, weights=sentiments, minlength=len(lengths)).tolist()
+        positive = np.bincount(row_of_token, weights=np.where(sentiments > 0, sentiments + 1, 0.0),
+                               minlength=len(lengths)).tolist()
+        negative = np.bincount(row_of_token, weights=np.where(sentiments < 0, sentiments - 1, 0.0),
+                               minlength=len(lengths)).tolist()
+        neutral = np.bincount(row_of_token, weights=sentiments == 0, minlength=len(lengths)).tolist()
+
+        results = []
+        starts = (np.cumsum(lengths) - lengths).tolist()
+        for index, text in enumerate(cleaned):
+            if rows_with_but[index]:
+                start, end = starts[index], starts[index] + int(lengths[index])
+                row = _but_check(sentiments[start:end].tolist(), ids[start:end].tolist().index(self.rule['but']))
+                results.append(_score_valence(text, float(sum(row)), *analyzer._sift_sentiment_scores(row)))
+            elif lengths[index]:
+                results.append(_score_valence(text, totals[index], positive[index], negative[index],
+                                              int(neutral[index])))
+            else:
+                results.append(_score_valence(text, None, 0.0, 0.0, 0))
+        return results
+
+    def _token_sentiments(self, ids, upper, lengths):
+        in_lexicon, valence, is_booster, booster, negates = self._vocabulary_arrays()
+        rule = self.rule
+        count = len(ids)
+        if not count:
+            return np.zeros(0)
+        row = np.repeat(np.arange(len(lengths)), lengths)
+        position = np.arange(count) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        remaining = np.repeat(lengths, lengths) - position - 1
+
+        def before(k, values=ids):
+            shifted = np.zeros_like(values)
+            shifted[k:] = values[:-k]
+            return np.where(position >= k, shifted, 0)
+
+        def after(k):
+            shifted = np.zeros_like(ids)
+            shifted[:-k] = ids[k:]
+            return np.where(remaining >= k, shifted, 0)
+
+        def phrase_at(tokens, phrase):
+            matched = np.ones(count, dtype=bool)
+            for token_ids, word_id in zip(tokens, phrase):
+                matched &= token_ids == word_id
+            return matched
+
+        prev1, prev2, prev3 = before(1), before(2), before(3)
+        next1, next2 = after(1), after(2)
+        upper_before = {k: before(k, upper) for k in (1, 2, 3)}
+
+        # Some but not all tokens of the text are ALL CAPS
+        caps_count = np.bincount(row, weights=upper, minlength=len(lengths))
+        cap_diff = ((caps_count > 0) & (caps_count < lengths))[row]
+
+        lexical = in_lexicon[ids]
+        skipped = is_booster[ids] | ((ids == rule['kind']) & (next1 == rule['of']))
+        base = valence[ids]
+        v = base.copy()
+        # "no" directly before a lexicon word negates it instead of scoring itself
+        v = np.where((ids == rule['no']) & (next1 != 0) & in_lexicon[next1], 0.0, v)
+        no_before = (prev1 == rule['no']) | (prev2 == rule['no']) | \
+            ((prev3 == rule['no']) & ((prev1 == rule['or']) | (prev1 == rule['nor'])))
+        v = np.where(no_before, base * N_SCALAR, v)
+        caps = upper & cap_diff
+        v = np.where(caps, np.where(v > 0, v + C_INCR, v - C_INCR), v)
+
+        so_or_this = {k: (token == rule['so']) | (token == rule['this'])
+                      for k, token in ((1, prev1), (2, prev2))}
+        for k, previous in ((1, prev1), (2, prev2), (3, prev3)):
+            applies = (previous != 0) & ~in_lexicon[previous]
+            boosted = is_booster[previous]
+            scalar = np.where(boosted, booster[previous], 0.0)
+            scalar = np.where(boosted & (v < 0), scalar * -1, scalar)
+            boosted_caps = boosted & upper_before[k] & cap_diff
+            scalar = np.where(boosted_caps, np.where(v > 0, scalar + C_INCR, scalar - C_INCR), scalar)
+            if k == 2:
+                scalar = np.where(scalar != 0, scalar * 0.95, scalar)
+            elif k == 3:
+                scalar = np.where(scalar != 0, scalar * 0.9, scalar)
+            v = np.where(applies, v + scalar, v)
+
+            if k == 1:
+                amplified = np.zeros(count, dtype=bool)
+                unchanged = np.zeros(count, dtype=bool)
+            elif k == 2:
+                amplified = (prev2 == rule['never']) & so_or_this[1]
+                unchanged = (prev2 == rule['without']) & (prev1 == rule['doubt'])
+            else:
+                amplified = ((prev3 == rule['never']) & so_or_this[2]) | so_or_this[1]
+                unchanged = (prev3 == rule['without']) & ((prev2 == rule['doubt']) | (prev1 == rule['doubt']))
+            negated = ~amplified & ~unchanged & negates[previous]
+            v = np.where(applies & amplified, v * 1.25, v)
+            v = np.where(applies & negated, v * N_SCALAR, v)
+
+            if k == 3:
+                v = self._special_idioms(v, applies, ids, prev1, prev2, prev3, next1, next2, phrase_at)
+
+        least = (prev1 == rule['least']) & ~in_lexicon[prev1]
+        least_negates = least & (((position > 1) & (prev2 != rule['at']) & (prev2 != rule['very'])) |
+                                 (position == 1))
+        v = np.where(least_negates, v * N_SCALAR, v)
+        return np.where(lexical & ~skipped, v, 0.0)
+
+    def _special_idioms(self, v, applies, ids, prev1, prev2, prev3, next1, next2, phrase_at):
+        # The first matching window before the word wins, then windows after it override
+        matched = np.zeros(len(v), dtype=bool)
+        value = np.zeros(len(v))
+        for window in ((prev1, ids), (prev2, prev1, ids), (prev2, prev1), (prev3, prev2, prev1), (prev3, prev2)):
+            for phrase, phrase_value in self.special_cases:
+                if len(phrase) == len(window):
+                    hit = applies & ~matched & phrase_at(window, phrase)
+                    value = np.where(hit, phrase_value, value)
+                    matched |= hit
+        v = np.where(matched, value, v)
+        for window, present in (((ids, next1), next1 != 0), ((ids, next1, next2), next2 != 0)):
+            for phrase, phrase_value in self.special_cases:
+                if len(phrase) == len(window):
+                    v = np.where(applies & present & phrase_at(window, phrase), phrase_value, v)
+        for window in ((prev3, prev2, prev1), (prev3, prev2), (prev2, prev1)):
+            for phrase, phrase_value in self.booster_phrases:
+                if len(phrase) == len(window):
+                    v = np.where(applies & phrase_at(window, phrase), v + phrase_value, v)
+        return v
+
+
+def _but_check(sentiments, but_index):
+    # VADER's contrastive "but" rule, including its lookups by value
+    for sentiment in sentiments:
+        index = sentiments.index(sentiment)
+        if index < but_index:
+            sentiments.pop(index)
+            sentiments.insert(index, sentiment * 0.5)
+        elif index > but_index:
+            sentiments.pop(index)
+            sentiments.insert(index, sentiment * 1.5)
+    return sentiments
+
+
+def _score_valence(text, sum_s, pos_sum, neg_sum, neu_count):
+    # VADER's score_valence from the per-text sums, kept in its evaluation order;
+    # sum_s is None for a text without tokens
+    if sum_s is None:
+        return {'neg': 0.0, 'neu': 0.0, 'pos': 0.0, 'compound': 0.0}
+    punct_emph_amplifier = analyzer._punctuation_emphasis(text)
+    if sum_s > 0:
+        sum_s += punct_emph_amplifier
+    elif sum_s < 0:
+        sum_s -= punct_emph_amplifier
+    compound = normalize(sum_s)
+    if pos_sum > math.fabs(neg_sum):
+        pos_sum += punct_emph_amplifier
+    elif pos_sum < math.fabs(neg_sum):
+        neg_sum -= punct_emph_amplifier
+    total = pos_sum + math.fabs(neg_sum) + neu_count
+    return {
+        'neg': round(math.fabs(neg_sum / total), 3),
+        'neu': round(math.fabs(neu_count / total), 3),
+        'pos': round(math.fabs(pos_sum / total), 3),
+        'compound': round(compound, 4)
+    }
+
+
+class BatchScorer:
+    """
+    Scores batches of texts like ``score_text``, with VADER vectorized across
+    the batch, using ``rules`` or the rules active when it is created. Texts
+    detected as (partly) in another language than English are scored one by
+    one with ``score_text``.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules or active_rules()
+        self.matcher = self.rules.matcher
+        self.sentiment = VectorSentiment(analyzer.lexicon, analyzer.emojis)
+
+    def score(self, texts):
+        """
+        Return ``score_text(text)`` for every text
+        """
+        texts = list(texts)
+        detect = self.rules.detector.detect
+        english = [index for index, text in enumerate(texts) if not detect(text.lower())]
+        english_texts = [texts[index] for index in english]
+        matches = [match_keywords(text.lower(), self.matcher, self.rules.context) for text in english_texts]
+        sentiments = self.sentiment.polarity_scores(english_texts)
+        results = [None] * len(texts)
+        for index, text, (keywords, counts), sentiment in zip(english, english_texts, matches, sentiments):
+            results[index] = score_features(text, TextFeatures.precomputed(text, keywords, counts, sentiment,
+                                                                           self.rules))
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = score_text(texts[index], self.rules)
+        return results
@@ -17,6 +17,7 @@ export type Database = {
           id: string
           risk_factors: string[] | null
           risk_level: string
+          rules_version: string | null
           sentiment_score: number
           tags: string[] | null
           text_input: string
@@ -29,6 +30,7 @@ export type Database = {
           id?: string
           risk_factors?: string[] | null
           risk_level?: string
+          rules_version?: string | null
           sentiment_score?: number
           tags?: string[] | null
           text_input?: string
@@ -41,6 +43,7 @@ export type Database = {
           id?: string
           risk_factors?: string[] | null
           risk_level?: string
+          rules_version?: string | null
           sentiment_score?: number
           tags?: string[] | null
           text_input?: string
@@ -0,0 +1,3 @@
+-- Version of the scoring rules file each assessment was scored with
+ALTER TABLE public.assessments
+ADD COLUMN IF NOT EXISTS rules_version TEXT;